@@ -6,10 +6,13 @@ import hashlib
 from modules.bot import Bot
 from modules.cmd import Cmd
 from modules.channel import Channel
+from modules.database import transaction
 from modules.logger import Logger
 
+import asyncio
 import os
 import arel
+import tempfile
 from pathlib import Path
 
 from fastapi import FastAPI, APIRouter, HTTPException, Request, UploadFile, File
@@ -21,6 +24,10 @@ from json import dumps
 
 
 class Server(Bot):
+    # Uploads are read and hashed in chunks, bigger files are refused
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    MAX_UPLOAD_SIZE = 50 * 1024 * 1024
+
     def __init__(self, bot: Bot, app: FastAPI):
         self.bot = bot
         self.app = app
@@ -58,6 +65,13 @@ class Server(Bot):
             "/api/events/{type}/{id}", self.get_events, methods=["GET"]
         )
         self.router.add_api_route("/api/upload", self.upload, methods=["POST"])
+        self.router.add_api_route("/api/sfx/analyze", self.analyze_sfx, methods=["POST"])
+        self.router.add_api_route("/api/chat_queue", self.get_chat_queue, methods=["GET"])
+        self.router.add_api_route("/api/sfx_queue", self.get_sfx_queue, methods=["GET"])
+        self.router.add_api_route("/api/usage/{kind}", self.get_usage, methods=["GET"])
+        self.router.add_api_route(
+            "/api/usage/{kind}/{name}", self.get_usage_histogram, methods=["GET"]
+        )
 
         self.router.add_api_route("/chat", self.chat, methods=["GET"])
         self.router.add_api_route("/commands", self.commands, methods=["GET"])
@@ -155,6 +169,23 @@ class Server(Bot):
         else:
             return dumps({})
 
+    async def get_chat_queue(self, request: Request):
+        return dumps(self.bot.chat.metrics())
+
+    async def get_sfx_queue(self, request: Request):
+        metrics = self.bot.sfx.playback.metrics()
+        metrics["mixers"] = {name: mixer.metrics() for name, mixer in self.bot.sfx.mixers.items()}
+        return dumps(metrics)
+
+    async def get_usage(self, request: Request, kind: str):
+        return dumps(await self.bot.counters.totals(kind))
+
+    async def get_usage_histogram(
+        self, request: Request, kind: str, name: str, hours: int = 24
+    ):
+        hours = max(1, min(hours, 24 * 31))
+        return dumps(await self.bot.counters.histogram(kind, name, hours))
+
     # parse content from the twitch oath redirect
     async def get_oath(self, request: Request):
         message = {}
@@ -529,6 +560,8 @@ class Server(Bot):
             if key == "command":
                 # convert cmd to json
                 cmd = await self.bot.cmd.get_cmd(value)
+                if cmd is None:
+                    return {"error": f"command {value} not found"}
 
                 return dataclasses.asdict(cmd)
 
@@ -689,28 +722,34 @@ class Server(Bot):
 
     async def import_events(self, value):
         self.logger.debug(value)
-        result = await self.bot.gms.rpg.delete_all_rpg_events_by_id(value["rpg_id"])
 
-        self.logger.debug("Result -> {}".format(result))
-        if result.get("error"):
-            return result
+        # The old events are only replaced if every new one is valid
+        try:
+            async with transaction(self.bot.gms.rpg.connection):
+                result = await self.bot.gms.rpg.delete_all_rpg_events_by_id(value["rpg_id"])
 
-        for event in value["import-file"]:
-            ordered_dict = OrderedDict()
-            ordered_dict["rpg_id"] = value["rpg_id"]
-            ordered_dict["message"] = event["message"]
-            ordered_dict["type"] = event["type"]
-            ordered_dict["event"] = event["event"]
+                self.logger.debug("Result -> {}".format(result))
+                if result.get("error"):
+                    raise ValueError(result["error"])
 
-            # convert the ordered_dict to a regular dict
-            event = dict(ordered_dict)
+                for event in value["import-file"]:
+                    ordered_dict = OrderedDict()
+                    ordered_dict["rpg_id"] = value["rpg_id"]
+                    ordered_dict["message"] = event["message"]
+                    ordered_dict["type"] = event["type"]
+                    ordered_dict["event"] = event["event"]
 
-            self.logger.debug(f"Event -> {event}")
-            result = await self.bot.gms.rpg.add_rpg_event(event)
+                    # convert the ordered_dict to a regular dict
+                    event = dict(ordered_dict)
 
-            self.logger.debug("Result -> {}".format(result))
-            if result.get("error"):
-                return result
+                    self.logger.debug(f"Event -> {event}")
+                    result = await self.bot.gms.rpg.add_rpg_event(event)
+
+                    self.logger.debug("Result -> {}".format(result))
+                    if result.get("error"):
+                        raise ValueError(result["error"])
+        except ValueError as e:
+            return {"error": str(e)}
 
         return {"success": "Events imported successfully."}
 
@@ -729,30 +768,98 @@ class Server(Bot):
                     detail="Invalid file type. Please upload an audio file or an archive.",
                 )
 
-            contents = await file.read()
-            result = await self.upload_sound_file(contents)
+            result = await self.upload_sound_file(file)
             status = "error" if result.get("error") else "success"
             message[status] = result.get(status)
 
         return message
 
-    async def hash_file(self, content: bytes) -> str:
-        """Return the MD5 hash of a file."""
-        hasher = hashlib.md5(content)
-        return hasher.hexdigest()
+    async def upload_sound_file(self, file: UploadFile) -> dict:
+        """
+        Saves an uploaded sound file under the MD5 hash of its content.
+
+        The upload is read in chunks, each chunk is hashed and written to a
+        temporary file in a worker thread, and the temporary file is renamed
+        to its final name at once, so the event loop is never blocked and
+        memory use does not grow with the size of the file.
+        """
 
-    async def upload_sound_file(self, contents: bytes) -> dict:
         dest_folder = Path("data/sfx")
-        dest_folder.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(dest_folder.mkdir, parents=True, exist_ok=True)
+
+        hasher = hashlib.md5()
+        size = 0
+        spool = await asyncio.to_thread(
+            tempfile.NamedTemporaryFile, dir=dest_folder, suffix=".tmp", delete=False
+        )
+
+        try:
+            while chunk := await file.read(self.UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > self.MAX_UPLOAD_SIZE:
+                    return {"error": f"The file is bigger than {self.MAX_UPLOAD_SIZE // (1024 * 1024)} MB."}
 
-        hash_name = await self.hash_file(contents)
-        dest_path = dest_folder / hash_name
+                await asyncio.to_thread(self.spool_chunk, spool, hasher, chunk)
 
-        if not dest_path.exists():
-            dest_path.write_bytes(contents)
+            await asyncio.to_thread(spool.close)
+
+            hash_name = hasher.hexdigest()
+            dest_path = dest_folder / hash_name
+
+            if await asyncio.to_thread(self.move_upload, spool.name, dest_path):
+                await self.analyze_sound_file(hash_name, dest_path)
+        finally:
+            await asyncio.to_thread(self.discard_upload, spool)
 
         return {"success": hash_name}
 
+    @staticmethod
+    def spool_chunk(spool, hasher, chunk: bytes) -> None:
+        """Hashes and writes a chunk of an upload, runs in a worker thread."""
+
+        hasher.update(chunk)
+        spool.write(chunk)
+
+    @staticmethod
+    def move_upload(source: str, dest_path: Path) -> bool:
+        """Renames an upload to its final name unless the sound already exists."""
+
+        if dest_path.exists():
+            return False
+
+        os.replace(source, dest_path)
+        return True
+
+    @staticmethod
+    def discard_upload(spool) -> None:
+        """Removes the temporary file of an upload if it was not moved."""
+
+        spool.close()
+        if os.path.exists(spool.name):
+            os.remove(spool.name)
+
+    async def analyze_sound_file(self, hash_name: str, path: Path) -> None:
+        """Decodes a sound file once and saves its loudness gain."""
+
+        try:
+            buffer = await self.bot.sfx.pcm.get(hash_name, str(path))
+            result = await self.bot.sfx.loudness.analyze(hash_name, buffer)
+            self.logger.info(f"Analyzed {hash_name}: {result}")
+        except Exception as e:
+            self.logger.error(f"Error while analyzing {hash_name}: {e}")
+
+    async def analyze_sfx(self, request: Request) -> dict:
+        """Analyzes the sound files uploaded before loudness analysis."""
+
+        force = request.query_params.get("force") == "1"
+
+        try:
+            count = await self.bot.sfx.loudness.reanalyze(force=force)
+        except RuntimeError as e:
+            return {"error": str(e)}
+
+        return {"success": count}
+
     async def get_sfx_event(self, request: Request) -> dict:
         """Gets a sfx event."""
 
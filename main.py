@@ -2,6 +2,7 @@ from app.server import Server
 from modules.bot import Bot
 from modules.logger import Logger
 from modules.channel import ChannelCog
+from modules.database import Database
 
 from hypercorn.config import Config as HyperConfig
 from hypercorn.asyncio import serve
@@ -9,20 +10,20 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 
 import asyncio
-import aiosqlite
 import os
 import traceback
 
 logger = Logger(__name__)
 
 
-async def create_channel() -> ChannelCog:
+async def create_channel(database: Database) -> ChannelCog:
     """
     Creates a channel object.
 
     Parameters
     ----------
-    None
+    database : Database
+        The database engine.
 
     Returns
     -------
@@ -30,7 +31,7 @@ async def create_channel() -> ChannelCog:
         The channel object.
     """
 
-    connection_channel = await aiosqlite.connect("data/database/channel.sqlite")
+    connection_channel = await database.connect("channel")
     channel = ChannelCog(connection_channel)
     await channel.create_table()
 
@@ -42,7 +43,7 @@ async def create_channel() -> ChannelCog:
     return channel
 
 
-async def create_bot(channel: ChannelCog) -> Bot:
+async def create_bot(channel: ChannelCog, database: Database) -> Bot:
     """
     Creates a bot object.
 
@@ -50,6 +51,8 @@ async def create_bot(channel: ChannelCog) -> Bot:
     ----------
     channel : ChannelCog
         The channel object.
+    database : Database
+        The database engine.
 
     Returns
     -------
@@ -57,7 +60,7 @@ async def create_bot(channel: ChannelCog) -> Bot:
         The bot object.
     """
 
-    bot = Bot(channel)
+    bot = Bot(channel, database)
 
     try:
         await bot.__ainit__(channel)
@@ -145,11 +148,10 @@ async def main() -> None:
 
     load_dotenv()
 
-    os.makedirs("data/database")
-
+    database = Database("data/database")
 
-    channel = await create_channel()
-    bot = await create_bot(channel)
+    channel = await create_channel(database)
+    bot = await create_bot(channel, database)
 
     app = FastAPI()
     server: Server = Server(bot, app)
@@ -177,7 +179,10 @@ async def main() -> None:
 
     hyperconfig = create_hyperconfig()
 
-    await serve(app, hyperconfig)
+    try:
+        await serve(app, hyperconfig)
+    finally:
+        await bot.__aclose__()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+from modules.logger import Logger
+
+import aiosqlite
+
+
+class IdAllocator:
+    def __init__(self, connection: aiosqlite.Connection, table: str) -> None:
+        """
+        Initializes a new id allocator object.
+
+        The allocator reads the highest id of the table once and then hands
+        out the following ids from memory, so rows can be created without
+        asking the database for the next id.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database.
+        table : str
+            The table the ids are allocated for, its primary key must be "id".
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.table = table
+        self.last_id = None
+        self.logger = Logger(__name__)
+
+    async def seed(self) -> int:
+        """
+        Reads the highest id already used by the table.
+
+        AUTOINCREMENT tables never reuse the id of a deleted row, so the value
+        stored in sqlite_sequence is taken into account as well.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The highest id used so far.
+        """
+
+        async with self.connection.execute(
+            f"SELECT MAX(id) FROM {self.table}"
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        last_id = row[0] or 0
+
+        async with self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"
+        ) as cursor:
+            has_sequence = await cursor.fetchone() is not None
+
+        if has_sequence:
+            async with self.connection.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row and row[0]:
+                last_id = max(last_id, row[0])
+
+        # Never go backwards if the allocator is seeded a second time
+        self.last_id = max(last_id, self.last_id or 0)
+        self.logger.debug(f"{self.table} ids start after {self.last_id}.")
+        return self.last_id
+
+    def next(self) -> int:
+        """
+        Returns the next free id.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The next free id.
+        """
+
+        if self.last_id is None:
+            raise RuntimeError(f"The {self.table} id allocator has not been seeded.")
+
+        self.last_id += 1
+        return self.last_id
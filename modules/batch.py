@@ -0,0 +1,191 @@
+from modules.database import transaction
+from modules.logger import Logger
+
+import aiosqlite
+import asyncio
+import time
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        connection: aiosqlite.Connection,
+        query: str,
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_pending: int = 5000,
+    ) -> None:
+        """
+        Initializes a new batch writer object.
+
+        Rows are buffered in memory and written with a single executemany
+        inside one transaction, either once batch_size rows are pending or
+        every flush_interval seconds, whichever comes first.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database.
+        query : str
+            The INSERT statement executed for every buffered row.
+        batch_size : int
+            The number of pending rows that triggers an early flush.
+        flush_interval : float
+            The maximum time in seconds a row stays in the buffer.
+        max_pending : int
+            The number of pending rows above which put() waits for a flush.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.query = query
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.logger = Logger(__name__)
+
+        self.written = 0
+        self.dropped = 0
+
+        self._pending = []
+        self._task = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+
+    def start(self) -> None:
+        """
+        Starts the background flush task if it is not already running.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, row) -> None:
+        """
+        Adds a row to the buffer.
+
+        When the buffer is full this waits for the next flush, so producers
+        are slowed down instead of growing the buffer without bound.
+
+        Parameters
+        ----------
+        row : Union[tuple, dict]
+            The parameters of the query for one row.
+
+        Returns
+        -------
+        None
+        """
+
+        while len(self._pending) >= self.max_pending:
+            self._space.clear()
+            self._wakeup.set()
+            await self._space.wait()
+
+        self._pending.append(row)
+
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Writes every pending row to the database in one transaction.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of rows written.
+        """
+
+        async with self._lock:
+            if not self._pending:
+                self._space.set()
+                return 0
+
+            rows, self._pending = self._pending, []
+            self._space.set()
+            start = time.perf_counter()
+
+            try:
+                async with transaction(self.connection):
+                    await self.connection.executemany(self.query, rows)
+            except Exception as e:
+                self.dropped += len(rows)
+                self.logger.error(f"Error while flushing {len(rows)} rows: {e}")
+                return 0
+
+            self.written += len(rows)
+            self.logger.debug(
+                f"Flushed {len(rows)} rows in {(time.perf_counter() - start) * 1000:.1f} ms."
+            )
+            return len(rows)
+
+    async def close(self) -> None:
+        """
+        Stops the background task and flushes the remaining rows.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def _run(self) -> None:
+        """
+        Flushes the buffer until the writer is closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of pending rows.
+        """
+
+        return len(self._pending)
@@ -1,12 +1,20 @@
-import random
-import aiohttp
+import asyncio
 
 from modules.channel import ChannelCog
+from modules.chat import ChatScheduler, Priority
 from modules.cmd import CmdCog, Cmd
+from modules.cooldown import Cooldowns
+from modules.counters import UsageCounters
+from modules.database import Database
+from modules.followers import FollowerStream
+from modules.http import HttpClient
 from modules.games.common import GamesCog
 from modules.logger import Logger
+from modules.members import ChannelMembers
 from modules.message import MessageCog
+from modules.migrations import Migrator
 from modules.sfx import SFXCog
+from modules.template import FetchError, TemplateError
 from modules.user import UserCog
 
 from twitchio import ChannelFollowerEvent, Message
@@ -16,11 +24,10 @@ from twitchio.user import User
 from twitchio.ext import routines
 
 import os
-import aiosqlite
 
 
 class Bot(commands.Bot):
-    def __init__(self, channel_cog: ChannelCog) -> None:
+    def __init__(self, channel_cog: ChannelCog, database: Database) -> None:
         """
         Initializes a new bot object.
 
@@ -28,6 +35,8 @@ class Bot(commands.Bot):
         ----------
         channel_cog : ChannelCog
             The channel object.
+        database : Database
+            The database engine the connections are taken from.
 
         Returns
         -------
@@ -53,10 +62,15 @@ class Bot(commands.Bot):
         self.user_bots = None
         self.client_id = self.get_twitch_client_token()
 
-        self.channel_members = None
+        self.channel_members = ChannelMembers()
+        self.cooldowns = Cooldowns()
+        self.chat = ChatScheduler(self._send_chat)
+        self.followers_task = None
+        self.http_client = HttpClient(host_limits={"decapi.me": 4, "beta.decapi.me": 4})
         self.coin_name = channel_cog.channel.coin_name
         self.logger = Logger(__name__)
         self.server = None
+        self.database = database
 
     async def __ainit__(self, channel_cog: ChannelCog) -> None:
         """
@@ -94,13 +108,11 @@ class Bot(commands.Bot):
         None
         """
         self.connection_channel = channel_cog.connection
-        self.connection_cmd = await aiosqlite.connect("data/database/cmd.sqlite")
-        self.connection_message = await aiosqlite.connect(
-            "data/database/message.sqlite"
-        )
-        self.connection_user = await aiosqlite.connect("data/database/user.sqlite")
-        self.connection_sfx = await aiosqlite.connect("data/database/sfx.sqlite")
-        self.connection_games = await aiosqlite.connect("data/database/games.sqlite")
+        self.connection_cmd = await self.database.connect("cmd")
+        self.connection_message = await self.database.connect("message")
+        self.connection_user = await self.database.connect("user")
+        self.connection_sfx = await self.database.connect("sfx")
+        self.connection_games = await self.database.connect("games")
         self.logger.debug("Database connection established.")
 
     async def _ainit_database_classes(self, channel_cog: ChannelCog) -> None:
@@ -118,9 +130,10 @@ class Bot(commands.Bot):
         self.cnl : Channel = self.get_channel(self.channel_id)
         print(self.cnl, self.channel_id)
         self.channel = channel_cog
-        self.cmd = CmdCog(self.connection_cmd, self)
+        self.counters = UsageCounters(self.connection_cmd)
+        self.cmd = CmdCog(self.connection_cmd, self, self.counters)
         self.msg = MessageCog(self.connection_message)
-        self.usr = UserCog(channel_cog, self.connection_user)
+        self.usr = UserCog(channel_cog, self.connection_user, self.http_client)
         self.sfx = SFXCog(self.connection_sfx, self)
         self.gms = GamesCog(self.connection_games, self)
         self.logger.info("Database classes initialized.")
@@ -164,9 +177,21 @@ class Bot(commands.Bot):
         await self.sfx.create_table()
         await self.gms.create_table()
 
+        # bring existing databases up to the current schema
+        await Migrator(self.connection_cmd, "cmd").migrate()
+        await Migrator(self.connection_games, "games").migrate()
+        await Migrator(self.connection_message, "message").migrate()
+        await Migrator(self.connection_sfx, "sfx").migrate()
+        await Migrator(self.connection_user, "user").migrate()
+        self.counters.start()
+
         # if they are empty, add the default values
         await self.cmd.__ainit__()
+        await self.msg.__ainit__()
+        await self.usr.__ainit__()
         await self.gms.gambling.__ainit__()
+        self.cooldowns.restore(await self.usr.get_locks())
+        self.sfx.start_warm_up()
         self.logger.debug("Tables created.")
 
     async def __aclose__(self) -> None:
@@ -182,9 +207,25 @@ class Bot(commands.Bot):
         None
         """
 
-        await self.connection_channel.close()
-        await self.connection_user.close()
-        await self.connection_sfx.close()
+        if self.followers_task is not None:
+            self.followers_task.cancel()
+
+        if self.sfx.warm_task is not None:
+            self.sfx.warm_task.cancel()
+        for task in list(self.sfx.play_tasks):
+            task.cancel()
+        self.sfx.close_mixers()
+
+        await self.chat.close()
+
+        await self.cmd.__aclose__()
+        await self.counters.close()
+        await self.msg.__aclose__()
+        await self.usr.save_locks(self.cooldowns.pop_changes())
+        await self.usr.__aclose__()
+
+        await self.http_client.close()
+        await self.database.close()
 
     async def _ainit_user_commands(self) -> None:
         """
@@ -239,6 +280,9 @@ class Bot(commands.Bot):
         """
         self.income_routine.start()
         self.timeout_routine.start()
+        self.bot_list_routine.start(stop_on_error=False)
+        self.usage_routine.start(stop_on_error=False)
+        self.cooldown_routine.start(stop_on_error=False)
         self.logger.info("Routines initialized.")
 
     async def _get_channel_members(self) -> None:
@@ -302,7 +346,6 @@ class Bot(commands.Bot):
             if os.getenv("TWITCH_SECRET_TOKEN") and os.getenv("TWITCH_CLIENT_TOKEN"):
                 await self._get_channel_members()
                 await self._get_user_bots()
-                await self._update_user_database()
 
                 self.initialized = True
         except Exception as e:
@@ -387,9 +430,58 @@ class Bot(commands.Bot):
         self.active = True
         self.logger.info(f"Ready | {self.nick}")
         self.cnl = self.get_channel(self.channel_id)
-        await self.cnl.send("Bot is now online.")
+        self.chat.start()
+        await self.say("Bot is now online.")
         await self._ainit_routines()
 
+    async def event_userstate(self, user) -> None:
+        """
+        Event called when Twitch sends the state of the bot in the channel.
+
+        Parameters
+        ----------
+        user : twitchio.Chatter
+            The bot as a chatter of the channel.
+
+        Returns
+        -------
+        None
+        """
+        # Mods are allowed to send more messages per window
+        self.chat.is_mod = bool(getattr(user, "is_mod", False))
+
+    async def say(self, content: str, priority: Priority = Priority.REPLY) -> None:
+        """
+        Queues a message for the chat.
+
+        Parameters
+        ----------
+        content : str
+            The message.
+        priority : Priority
+            The lane of the message, moderation goes first and ads last.
+
+        Returns
+        -------
+        None
+        """
+        self.chat.put(content, priority)
+
+    async def _send_chat(self, content: str) -> None:
+        """
+        Sends one line to the chat, called by the chat scheduler.
+
+        Parameters
+        ----------
+        content : str
+            The line.
+
+        Returns
+        -------
+        None
+        """
+        await self.get_channel(self.channel_id).send(content)
+
     async def event_message(self, message: Message) -> None:
         """
         Event called when a message is sent in the chat.
@@ -410,9 +502,19 @@ class Bot(commands.Bot):
 
         if not await self.usr.get_user(name):
             await self.usr.add_user(name)
-            await self.usr.increment_user_message_count(name)
+
+        await self.usr.increment_user_message_count(name)
 
         self.logger.info(f"{name} -> {message.content}")
+
+        if (
+            name != self.bot_name.lower()
+            and message.content.startswith(self.prefix)
+            and not self.cooldowns.allow(name)
+        ):
+            self.logger.debug(f"{name} is sending commands too fast.")
+            return
+
         return await super().event_message(message)
 
     async def event_command_error(
@@ -493,6 +595,9 @@ class Bot(commands.Bot):
         """
         Gets the channel members.
 
+        The followers known from the last run are available at once, the
+        full list is then loaded in the background by stream_channel_members.
+
         Parameters
         ----------
         None
@@ -503,18 +608,74 @@ class Bot(commands.Bot):
         """
 
         try:
-            your_channel: [User] = await self.fetch_users([self.channel_id])
-            followers: [ChannelFollowerEvent] = await your_channel[
-                0
-            ].fetch_channel_followers(self.token)
-
             self.user = await self.fetch_users([self.channel_id])
             self.user = self.user[0]
-            self.channel_members = [
-                follower.user.name.lower() for follower in followers
-            ]
         except Exception as e:
             self.logger.error(f"Error while fetching channel members: {e}")
+            return
+
+        self.channel_members.update(await self.usr.get_follower_usernames())
+
+        if self.followers_task is None or self.followers_task.done():
+            self.followers_task = asyncio.create_task(self.stream_channel_members())
+
+    async def stream_channel_members(self, batch_size: int = 1000) -> None:
+        """
+        Loads the followers page by page and writes them in batches.
+
+        The cursor of the last written batch is saved, an interrupted load
+        resumes from it on the next start instead of from the first page.
+
+        Parameters
+        ----------
+        batch_size : int
+            The number of followers written at once.
+
+        Returns
+        -------
+        None
+        """
+
+        sync = self.usr.sync
+        income = self.usr.channel.channel.income
+        stream = FollowerStream(
+            self.http_client, self.client_id, self.token, str(self.user.id)
+        )
+
+        cursor = await sync.get_state("followers_cursor")
+        # Only a load started from the first page sees every follower
+        complete = cursor is None
+        seen = set()
+        batch = []
+
+        try:
+            async for usernames, cursor in stream.pages(after=cursor):
+                self.channel_members.update(usernames)
+                seen.update(usernames)
+                batch.extend(usernames)
+
+                if len(batch) >= batch_size or cursor is None:
+                    await sync.apply(batch, [], income)
+                    await sync.set_state("followers_cursor", cursor)
+                    batch = []
+
+            # The stream may end on a page that still had a cursor
+            if batch:
+                await sync.apply(batch, [], income)
+                await sync.set_state("followers_cursor", cursor)
+        except Exception as e:
+            self.logger.error(f"Error while fetching channel members: {e}")
+
+            # The saved cursor may have expired, the next start begins again
+            if not complete:
+                await sync.set_state("followers_cursor", None)
+            return
+
+        if complete:
+            self.channel_members.replace(seen)
+
+        await self._update_user_database()
+        self.logger.info(f"{len(self.channel_members)} channel members loaded.")
 
     async def get_top_chatter(self) -> str:
         """
@@ -642,75 +803,6 @@ class Bot(commands.Bot):
         await self.cmd.enable_cmd(cmd)
         self.add_command(commands.Command(cmd.name, self.template_command))
 
-    async def analyze_token(self, token: str) -> str:
-        """
-        Analyzes the token.
-
-        Parameters
-        ----------
-        token : str
-            The token.
-
-        Returns
-        -------
-        str
-            The analyzed token.
-        """
-
-        self.logger.debug(f"Analyzing token: {token}")
-
-        if token.startswith("$url"):
-            token = token.replace("$url(", "")
-            if token[-1] == ",":
-                token = token[:-1]
-            if token[-1] == ")":
-                token = token[:-1]
-
-            async with aiohttp.ClientSession() as session:
-                async with session.get(token) as response:
-                    return await response.text()
-
-        elif token.startswith("$random"):
-            token = token.replace("$random(", "")
-            token = token.split(")")[0]
-            token = token.split(",")
-
-            for value in token:
-                if not value.isdigit():
-                    return f"Invalid value: {value}"
-
-            i, j = (int(token[0], base=10), int(token[1], base=10))
-
-            if i > j:
-                return f"Invalid values: {i}, must be lower than {j}"
-
-            return str(random.randint(i, j))
-
-        return token
-
-    async def analyze_cmd_comtent(self, content: str) -> str:
-        """
-        Analyzes the command content.
-
-        Parameters
-        ----------
-        content : str
-            The content of the command.
-
-        Returns
-        -------
-        str
-            The analyzed content.
-        """
-
-        tokens = content.split(" ")
-
-        for token in tokens:
-            if token.startswith("$"):
-                content = content.replace(token, await self.analyze_token(token))
-
-        return content
-
     # create a generic template for adding your own commands
     async def template_command(self, ctx: commands.Context) -> None:
         """
@@ -730,24 +822,34 @@ class Bot(commands.Bot):
 
         self.logger.debug(f'User command named "{ctx.command.name}" called')
         cmd: Cmd = await self.cmd.get_cmd(ctx.command.name)
+        if cmd is None:
+            return
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send(f"Usage: !{cmd.name}")
+            await self.say(f"Usage: !{cmd.name}")
             return
         
         user = ctx.author.name.lower()
 
         if user not in self.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.say(f"{user} is not following the channel.")
             return
 
 
-        content = cmd.description
-
-        content = await self.analyze_cmd_comtent(content)
+        try:
+            template = self.cmd.get_template(cmd)
+            content = await template.render(self.http_client.get_text)
+        except FetchError as e:
+            self.logger.warning(f"Could not render {cmd.name}: {e}")
+            await self.say(f"Command !{cmd.name} is unavailable right now, try again later.")
+            return
+        except TemplateError as e:
+            self.logger.error(f"Invalid template for {cmd.name}: {e}")
+            await self.say(f"Command !{cmd.name} is misconfigured.")
+            return
 
         await self.cmd.increment_usage(ctx.command.name)
-        await ctx.send(f"{content}")
+        await self.say(f"{content}")
 
     @commands.command(name="balance")
     async def balance(self, ctx: commands.Context) -> None:
@@ -765,18 +867,18 @@ class Bot(commands.Bot):
         """
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send("Usage: !balance")
+            await self.say("Usage: !balance")
             return
 
         user = ctx.author.name.lower()
 
         if user not in self.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.say(f"{user} is not following the channel.")
             return
 
         await self.cmd.increment_usage(ctx.command.name)
 
-        await ctx.send(
+        await self.say(
             f"{user} has {await self.usr.get_balance(user)} {self.coin_name}"
         )
 
@@ -796,18 +898,18 @@ class Bot(commands.Bot):
         """
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send("Usage: !followdate")
+            await self.say("Usage: !followdate")
             return
 
         user = ctx.author.name.lower()
 
         if user not in self.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.say(f"{user} is not following the channel.")
             return
 
         await self.cmd.increment_usage(ctx.command.name)
 
-        await ctx.send(
+        await self.say(
             f"{user} has been following the channel since {await self.usr.get_followdate(user)}"
         )
 
@@ -827,17 +929,17 @@ class Bot(commands.Bot):
         """
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send("Usage: !followage")
+            await self.say("Usage: !followage")
             return
 
         user = ctx.author.name.lower()
 
         if user not in self.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.say(f"{user} is not following the channel.")
             return
 
         await self.cmd.increment_usage(ctx.command.name)
-        await ctx.send(
+        await self.say(
             f"{user} has been following the channel for {await self.usr.get_followage(user)}"
         )
 
@@ -857,16 +959,16 @@ class Bot(commands.Bot):
         """
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send("Usage: !topchatter")
+            await self.say("Usage: !topchatter")
             return
 
         user = await self.get_top_chatter()
         await self.cmd.increment_usage(ctx.command.name)
 
         if user:
-            await ctx.send(f"The top chatter is {user}")
+            await self.say(f"The top chatter is {user}")
         else:
-            await ctx.send("No top chatter found.")
+            await self.say("No top chatter found.")
 
     @commands.command(name="watchtime")
     async def watchtime(self, ctx: commands.Context) -> None:
@@ -884,16 +986,16 @@ class Bot(commands.Bot):
         """
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send("Usage: !watchtime")
+            await self.say("Usage: !watchtime")
             return
 
         user = ctx.author.name.lower()
 
         if user not in self.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.say(f"{user} is not following the channel.")
             return
 
-        await ctx.send(
+        await self.say(
             f"{user} has been watching the channel for {await self.usr.get_watchtime(user)}"
         )
 
@@ -912,11 +1014,11 @@ class Bot(commands.Bot):
         None
         """
         if ctx.author.name.lower() != self.channel.channel.streamer_channel:
-            await ctx.send("You do not have permission to use this command.")
+            await self.say("You do not have permission to use this command.")
             return
 
         if len(ctx.message.content.split()) != 3:
-            await ctx.send("Usage: !add <user> <number>")
+            await self.say("Usage: !add <user> <number>")
             return
 
         await self.cmd.increment_usage(ctx.command.name)
@@ -925,19 +1027,21 @@ class Bot(commands.Bot):
             user = ctx.message.content.split()[1].replace("@", "").lower()
             # check user exists
             if user not in self.channel_members:
-                await ctx.send(f"{user} is not following the channel.")
+                await self.say(f"{user} is not following the channel.")
                 return
 
             num = int(ctx.message.content.split()[2])
 
             if num < 0:
-                await ctx.send("Usage: !add <user> <number>")
+                await self.say("Usage: !add <user> <number>")
                 return
 
-            await self.usr.update_user_income(user, num)
-            await ctx.send(f"{user} has been awarded {num} {self.coin_name}")
+            await self.usr.update_user_income(user, num, reason="award")
+            await self.say(
+                f"{user} has been awarded {num} {self.coin_name}", Priority.MODERATION
+            )
         except ValueError:
-            await ctx.send("Usage: !add <user> <number>")
+            await self.say("Usage: !add <user> <number>")
 
     @routines.routine(seconds=600)
     async def income_routine(self) -> None:
@@ -953,8 +1057,56 @@ class Bot(commands.Bot):
         None
         """
         self.logger.info("Income routine called")
-        for user in self.channel_members:
-            await self.usr.increment_user_income(user, "10000")
+        if not self.channel_members:
+            return
+
+        await self.usr.pay_income(self.channel_members, self.usr.channel.channel.income)
+
+    @routines.routine(seconds=30, wait_first=True)
+    async def usage_routine(self) -> None:
+        """
+        Writes the usage of the commands counted in memory.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        await self.cmd.flush_usage()
+
+    @routines.routine(seconds=30, wait_first=True)
+    async def cooldown_routine(self) -> None:
+        """
+        Saves the cooldowns that changed, so they survive a restart.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        await self.usr.save_locks(self.cooldowns.pop_changes())
+
+    @routines.routine(hours=1)
+    async def bot_list_routine(self) -> None:
+        """
+        Refreshes the list of known bots once it is stale.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+        if await self.usr.bot_list.refresh():
+            await self._update_user_database()
 
     @routines.routine(seconds=600)
     async def timeout_routine(self) -> None:
@@ -970,4 +1122,7 @@ class Bot(commands.Bot):
         None
         """
         self.logger.info("Own advertising routine called")
-        await self.cnl.send("If you like the content, or have any questions, feel free to follow the channel and ask in the chat. I'm here to help you out. If you want to support the channel, you can do so by subscribing. Thank you for watching.")
\ No newline at end of file
+        await self.say(
+            "If you like the content, or have any questions, feel free to follow the channel and ask in the chat. I'm here to help you out. If you want to support the channel, you can do so by subscribing. Thank you for watching.",
+            Priority.AD,
+        )
\ No newline at end of file
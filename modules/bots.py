@@ -0,0 +1,162 @@
+from modules.http import HttpClient
+from modules.logger import Logger
+
+import asyncio
+import json
+import os
+import time
+
+
+class BotList:
+    URL = "https://api.twitchinsights.net/v1/bots/all"
+
+    def __init__(
+        self,
+        http: HttpClient,
+        path: str = "data/cache/bots.json",
+        max_age: float = 21600.0,
+    ) -> None:
+        """
+        Initializes a new known bots list object.
+
+        The usernames of the known bots are kept in a frozenset, so the check
+        done for every chat message and every join costs the same whatever
+        the size of the list. The list is saved on disk with the ETag of the
+        download, a refresh only downloads it again when it changed.
+
+        Parameters
+        ----------
+        http : HttpClient
+            The shared HTTP client.
+        path : str
+            The file the list is saved to.
+        max_age : float
+            The age in seconds after which the list is refreshed.
+
+        Returns
+        -------
+        None
+        """
+
+        self.http = http
+        self.path = path
+        self.max_age = max_age
+        self.logger = Logger(__name__)
+
+        self.names = frozenset()
+        self.etag = None
+        self.fetched = 0.0
+
+        self._lock = asyncio.Lock()
+
+    @property
+    def stale(self) -> bool:
+        """
+        Tells if the list is older than max_age.
+        """
+
+        return time.time() - self.fetched > self.max_age
+
+    async def load(self) -> None:
+        """
+        Loads the list saved by a previous refresh.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            data = await asyncio.to_thread(self._read)
+        except (OSError, ValueError) as e:
+            self.logger.error(f"Error while loading the bot list: {e}")
+            return
+
+        self.names = frozenset(data.get("names", []))
+        self.etag = data.get("etag")
+        self.fetched = data.get("fetched", 0.0)
+        self.logger.debug(f"Loaded {len(self.names)} known bots.")
+
+    async def refresh(self, force: bool = False) -> bool:
+        """
+        Downloads the list again if it is stale and changed upstream.
+
+        Parameters
+        ----------
+        force : bool
+            If True, the list is checked even if it is not stale.
+
+        Returns
+        -------
+        bool
+            True if the list changed, False otherwise.
+        """
+
+        async with self._lock:
+            if not force and self.names and not self.stale:
+                return False
+
+            headers = {"If-None-Match": self.etag} if self.etag and self.names else {}
+
+            async with self.http.request("GET", self.URL, headers=headers) as response:
+                if response.status == 304:
+                    self.fetched = time.time()
+                    await asyncio.to_thread(self._write)
+                    self.logger.debug("Bot list not modified.")
+                    return False
+
+                response.raise_for_status()
+                data = await response.json(content_type=None)
+                etag = response.headers.get("ETag")
+
+            self.names = frozenset(bot[0].lower() for bot in data.get("bots", []))
+            self.etag = etag
+            self.fetched = time.time()
+            await asyncio.to_thread(self._write)
+
+            self.logger.info(f"Bot list refreshed: {len(self.names)} known bots.")
+            return True
+
+    def _read(self) -> dict:
+        """
+        Reads the saved list, runs in a worker thread.
+        """
+
+        with open(self.path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write(self) -> None:
+        """
+        Saves the list atomically, runs in a worker thread.
+        """
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(
+                {"etag": self.etag, "fetched": self.fetched, "names": sorted(self.names)},
+                file,
+            )
+        os.replace(temporary, self.path)
+
+    def __contains__(self, username: str) -> bool:
+        """
+        Checks if a user is a known bot.
+        """
+
+        return username.lower() in self.names
+
+    def __len__(self) -> int:
+        """
+        Returns the number of known bots.
+        """
+
+        return len(self.names)
@@ -0,0 +1,183 @@
+from modules.logger import Logger
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+import asyncio
+import time
+
+
+class TTLCache:
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        negative_ttl: float = 10.0,
+        capacity: int = 1000,
+        is_negative: Callable[[Any], bool] = None,
+    ) -> None:
+        """
+        Initializes a new TTL cache object.
+
+        Values are kept for ttl seconds, the least recently used ones are
+        evicted once the cache holds more than capacity entries. Concurrent
+        lookups of the same missing key share a single fetch. Failed fetches,
+        and values is_negative flags, are kept for negative_ttl seconds so a
+        burst of identical requests does not hit the upstream again.
+
+        Parameters
+        ----------
+        ttl : float
+            The time in seconds a value is kept.
+        negative_ttl : float
+            The time in seconds a failure or negative value is kept.
+        capacity : int
+            The maximum number of entries.
+        is_negative : Callable[[Any], bool]
+            Tells if a fetched value is a negative answer, e.g. an error text.
+
+        Returns
+        -------
+        None
+        """
+
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.capacity = capacity
+        self.is_negative = is_negative
+        self.logger = Logger(__name__)
+
+        self.hits = 0
+        self.misses = 0
+
+        self.entries = OrderedDict()  # key -> (expires, value, exception)
+        self._inflight = {}  # key -> asyncio.Task
+
+    async def get(
+        self,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float = None,
+    ) -> Any:
+        """
+        Gets a value, fetching it if it is missing or expired.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the value.
+        fetch : Callable[[], Awaitable[Any]]
+            The coroutine function fetching the value.
+        ttl : float
+            The time in seconds the value is kept, defaults to the cache ttl.
+
+        Returns
+        -------
+        Any
+            The value, the exception of a failed fetch is raised again.
+        """
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.hits += 1
+                self.entries.move_to_end(key)
+                if entry[2] is not None:
+                    raise entry[2]
+                return entry[1]
+
+            del self.entries[key]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+            # The fetch runs in its own task, cancelling the caller that
+            # started it does not cancel the other waiters
+            task = self._inflight[key] = asyncio.create_task(self._load(key, fetch, ttl))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            task.add_done_callback(self._retrieve)
+
+        return await asyncio.shield(task)
+
+    async def _load(
+        self, key: Hashable, fetch: Callable[[], Awaitable[Any]], ttl: float
+    ) -> Any:
+        """
+        Fetches a value and caches it, or caches the failure.
+        """
+
+        try:
+            value = await fetch()
+        except Exception as e:
+            self.set(key, None, self.negative_ttl, e)
+            raise
+
+        if self.is_negative is not None and self.is_negative(value):
+            self.set(key, value, self.negative_ttl)
+        else:
+            self.set(key, value, self.ttl if ttl is None else ttl)
+
+        return value
+
+    @staticmethod
+    def _retrieve(task: asyncio.Task) -> None:
+        """
+        Marks the exception of a fetch as retrieved, every waiter may be gone.
+        """
+
+        if not task.cancelled():
+            task.exception()
+
+    def set(
+        self, key: Hashable, value: Any, ttl: float = None, exception: Exception = None
+    ) -> None:
+        """
+        Adds a value to the cache.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the value.
+        value : Any
+            The value.
+        ttl : float
+            The time in seconds the value is kept, defaults to the cache ttl.
+        exception : Exception
+            The exception to raise instead of returning the value, if any.
+
+        Returns
+        -------
+        None
+        """
+
+        ttl = self.ttl if ttl is None else ttl
+        self.entries[key] = (time.monotonic() + ttl, value, exception)
+        self.entries.move_to_end(key)
+
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Removes a value from the cache.
+
+        Parameters
+        ----------
+        key : Hashable
+            The key of the value.
+
+        Returns
+        -------
+        None
+        """
+
+        self.entries.pop(key, None)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of entries.
+        """
+
+        return len(self.entries)
@@ -1,4 +1,5 @@
 from typing import Union
+from modules.database import transaction
 from modules.logger import Logger
 from twitchio.ext import commands
 
@@ -187,8 +188,8 @@ class ChannelCog(commands.Cog):
             channel = dataclasses.asdict(channel)
 
         sql_query = f"UPDATE channel SET {', '.join(f'{key} = :{key}' for key in channel.keys())} WHERE id = :id"
-        await self.connection.execute(sql_query, channel)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, channel)
 
     def update_environment_variables(self, config: dict) -> None:
         """
@@ -250,22 +251,22 @@ class ChannelCog(commands.Cog):
         """
 
         try:
-            await self.connection.execute(
-                """
-                INSERT INTO channel (id, bot_name, streamer_channel, prefix, coin_name, income, timeout) VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    channel.id,
-                    channel.bot_name,
-                    channel.streamer_channel,
-                    channel.prefix,
-                    channel.coin_name,
-                    channel.income,
-                    channel.timeout,
-                ),
-            )
+            async with transaction(self.connection):
+                await self.connection.execute(
+                    """
+                    INSERT INTO channel (id, bot_name, streamer_channel, prefix, coin_name, income, timeout) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        channel.id,
+                        channel.bot_name,
+                        channel.streamer_channel,
+                        channel.prefix,
+                        channel.coin_name,
+                        channel.income,
+                        channel.timeout,
+                    ),
+                )
 
-            await self.connection.commit()
             self.logger.info("Channel added successfully.")
         except Exception as e:
             self.logger.error(f"Error while adding the channel: {e}")
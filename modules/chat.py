@@ -0,0 +1,251 @@
+from modules.logger import Logger
+
+from collections import deque
+from enum import IntEnum
+from typing import Awaitable, Callable
+
+import asyncio
+import time
+
+
+class Priority(IntEnum):
+    MODERATION = 0
+    GAME = 1
+    REPLY = 2
+    AD = 3
+
+
+class ChatScheduler:
+    # Twitch drops anything longer
+    MAX_LENGTH = 500
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        limit: int = 20,
+        mod_limit: int = 100,
+        window: float = 30.0,
+        dedupe_window: float = 10.0,
+        max_depth: int = 50,
+    ) -> None:
+        """
+        Initializes a new outbound chat scheduler.
+
+        Messages are queued in one lane per priority and sent by a single
+        task, never more than limit (mod_limit when the bot is a mod of the
+        channel) in any window of time. A message identical to one queued or
+        sent within dedupe_window seconds is dropped, and messages waiting in
+        the same lane are sent together as one chat line when they fit.
+
+        Parameters
+        ----------
+        send : Callable[[str], Awaitable[None]]
+            The coroutine function sending one chat line.
+        limit : int
+            The maximum number of lines per window for a regular account.
+        mod_limit : int
+            The maximum number of lines per window for a mod account.
+        window : float
+            The length in seconds of the sliding window.
+        dedupe_window : float
+            The time in seconds an identical message is dropped for.
+        max_depth : int
+            The maximum number of messages per lane, the oldest one is
+            dropped when a lane is full.
+
+        Returns
+        -------
+        None
+        """
+
+        self.send = send
+        self.limit = limit
+        self.mod_limit = mod_limit
+        self.window = window
+        self.dedupe_window = dedupe_window
+        self.max_depth = max_depth
+        self.logger = Logger(__name__)
+
+        self.is_mod = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.deduplicated = 0
+        self.coalesced = 0
+
+        self.lanes = {priority: deque() for priority in Priority}
+        self._recent = {}  # content -> time it was queued
+        self._sent_at = deque()
+        self._task = None
+        self._wakeup = asyncio.Event()
+
+    def put(self, content: str, priority: Priority = Priority.REPLY) -> bool:
+        """
+        Queues a message.
+
+        Parameters
+        ----------
+        content : str
+            The message.
+        priority : Priority
+            The lane of the message.
+
+        Returns
+        -------
+        bool
+            True if the message was queued, False if it was a duplicate.
+        """
+
+        content = str(content)[: self.MAX_LENGTH]
+        now = time.monotonic()
+
+        queued = self._recent.get(content)
+        if queued is not None and now - queued < self.dedupe_window:
+            self.deduplicated += 1
+            return False
+
+        if len(self._recent) > 4 * self.max_depth:
+            self._recent = {
+                key: value
+                for key, value in self._recent.items()
+                if now - value < self.dedupe_window
+            }
+        self._recent[content] = now
+
+        lane = self.lanes[priority]
+        if len(lane) >= self.max_depth:
+            lane.popleft()
+            self.dropped += 1
+
+        lane.append(content)
+        self._wakeup.set()
+        return True
+
+    def start(self) -> None:
+        """
+        Starts the background send task if it is not already running.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stops the background send task, queued messages are dropped.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        pending = sum(len(lane) for lane in self.lanes.values())
+        if pending:
+            self.logger.info(f"Dropped {pending} queued chat messages.")
+
+    def metrics(self) -> dict:
+        """
+        Gets the state of the queue.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            The depth of every lane and the message counters.
+        """
+
+        return {
+            "depth": {priority.name.lower(): len(lane) for priority, lane in self.lanes.items()},
+            "sent_in_window": len(self._sent_at),
+            "limit": self.mod_limit if self.is_mod else self.limit,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "deduplicated": self.deduplicated,
+            "coalesced": self.coalesced,
+        }
+
+    def _next(self) -> str:
+        """
+        Takes the next line to send from the highest priority lane.
+        """
+
+        for lane in self.lanes.values():
+            if not lane:
+                continue
+
+            content = lane.popleft()
+            while lane and len(content) + 3 + len(lane[0]) <= self.MAX_LENGTH:
+                content = f"{content} | {lane.popleft()}"
+                self.coalesced += 1
+
+            return content
+
+        return None
+
+    async def _acquire(self) -> None:
+        """
+        Waits until the sliding window has room for one more line.
+        """
+
+        while True:
+            now = time.monotonic()
+            while self._sent_at and now - self._sent_at[0] >= self.window:
+                self._sent_at.popleft()
+
+            limit = self.mod_limit if self.is_mod else self.limit
+            if len(self._sent_at) < limit:
+                self._sent_at.append(now)
+                return
+
+            await asyncio.sleep(self.window - (now - self._sent_at[0]))
+
+    async def _run(self) -> None:
+        """
+        Sends the queued messages until the scheduler is closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            while any(self.lanes.values()):
+                # Waiting first lets a burst pile up and be coalesced
+                await self._acquire()
+                content = self._next()
+
+                try:
+                    await self.send(content)
+                    self.sent += 1
+                except Exception as e:
+                    self.dropped += 1
+                    self.logger.error(f"Error while sending a chat message: {e}")
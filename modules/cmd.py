@@ -1,5 +1,9 @@
+from modules.counters import UsageCounters
+from modules.database import transaction
 from modules.logger import Logger
+from modules.template import Template, TemplateError
 
+from collections import Counter
 from twitchio.ext import commands
 from typing import Union
 
@@ -23,7 +27,9 @@ class Cmd:
 
 
 class CmdCog(commands.Cog):
-    def __init__(self, connection: aiosqlite.Connection, bot) -> None:
+    def __init__(
+        self, connection: aiosqlite.Connection, bot, counters: UsageCounters = None
+    ) -> None:
         """
         Initializes a new cmd cog object.
 
@@ -31,10 +37,11 @@ class CmdCog(commands.Cog):
         ----------
         connection : aiosqlite.Connection
             The connection to the database.
-        command : Cmd
-            The command object.
-        logger : Logger
-            The logger object.
+        bot : Bot
+            The bot object.
+        counters : UsageCounters
+            The usage counters, the source of the number of uses of every
+            cmd. Without them the uses are counted in the used column.
 
         Returns
         -------
@@ -43,7 +50,11 @@ class CmdCog(commands.Cog):
 
         self.bot = bot
         self.connection = connection
+        self.counters = counters
         self.command = None
+        self.templates = {}
+        self.registry = {}
+        self.usage = Counter()
         self.logger = Logger(__name__)
 
     async def __ainit__(self) -> None:
@@ -59,8 +70,51 @@ class CmdCog(commands.Cog):
         None
         """
 
+        await self.load()
         self.command = await self._fill_default_table()
 
+    async def __aclose__(self) -> None:
+        """
+        Closes the cmd cog object.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        await self.flush_usage()
+
+    async def load(self) -> None:
+        """
+        Loads every cmd in the registry.
+
+        The registry is the reference for the bot: it is read once here and
+        kept up to date by every method writing to the cmd table, so
+        answering a command does not read the database.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        async with self.connection.execute("SELECT * FROM cmd ORDER BY id") as cursor:
+            self.registry = {row[1]: Cmd(*row[1:]) for row in await cursor.fetchall()}
+
+        if self.counters is not None:
+            totals = await self.counters.totals("cmd")
+            for name, cmd in self.registry.items():
+                cmd.used = totals.get(name, 0)
+
+        self.logger.debug(f"Loaded {len(self.registry)} cmds.")
+
     async def create_table(self) -> None:
         """
         Creates the table.
@@ -161,22 +215,29 @@ class CmdCog(commands.Cog):
         if cmd.description == "":
             return {"error": "description must not be empty"}
 
-        await self.connection.execute(
-            "INSERT INTO cmd (name, description, usage, used, cost, status, aliases, category, dynamic, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ? , ?)",
-            (
-                cmd.name,
-                cmd.description,
-                cmd.usage,
-                cmd.used,
-                cmd.cost,
-                cmd.status,
-                cmd.aliases,
-                cmd.category,
-                cmd.dynamic,
-                cmd.text,
-            ),
-        )
-        await self.connection.commit()
+        try:
+            template = Template.compile(cmd.description)
+        except TemplateError as e:
+            return {"error": f"invalid description: {e}"}
+
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "INSERT INTO cmd (name, description, usage, used, cost, status, aliases, category, dynamic, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ? , ?)",
+                (
+                    cmd.name,
+                    cmd.description,
+                    cmd.usage,
+                    cmd.used,
+                    cmd.cost,
+                    cmd.status,
+                    cmd.aliases,
+                    cmd.category,
+                    cmd.dynamic,
+                    cmd.text,
+                ),
+            )
+        self.registry[cmd.name] = cmd
+        self.templates[cmd.name] = template
         self.logger.info(f"Added cmd -> {cmd.name}.")
 
         if not standard:
@@ -199,15 +260,16 @@ class CmdCog(commands.Cog):
             True if the cmd exists, False otherwise.
         """
 
-        async with self.connection.execute(
-            "SELECT name FROM cmd WHERE name = ?", (name,)
-        ) as cursor:
-            return bool(await cursor.fetchone())
+        return name in self.registry
 
     async def increment_usage(self, name: str):
         """
         Increments the usage of a cmd.
 
+        The use is counted once: by the usage counters when the cog has
+        them, otherwise in memory until flush_usage() adds it to the used
+        column.
+
         Parameters
         ----------
         name : str
@@ -218,11 +280,49 @@ class CmdCog(commands.Cog):
         None
         """
 
-        await self.connection.execute(
-            "UPDATE cmd SET used = used + 1 WHERE name = ?", (name,)
-        )
-        await self.connection.commit()
-        self.logger.debug(f"Incremented cmd usage -> {name}.")
+        cmd = self.registry.get(name)
+        if cmd is None:
+            return
+
+        cmd.used += 1
+
+        if self.counters is not None:
+            self.counters.hit("cmd", name)
+        else:
+            self.usage[name] += 1
+
+    async def flush_usage(self) -> int:
+        """
+        Writes the usage counted since the last flush.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of cmds updated.
+        """
+
+        if not self.usage:
+            return 0
+
+        usage, self.usage = self.usage, Counter()
+
+        try:
+            async with transaction(self.connection):
+                await self.connection.executemany(
+                    "UPDATE cmd SET used = used + ? WHERE name = ?",
+                    [(count, name) for name, count in usage.items()],
+                )
+        except Exception:
+            # Kept for the next flush
+            self.usage.update(usage)
+            raise
+
+        self.logger.debug(f"Flushed usage of {len(usage)} cmds.")
+        return len(usage)
 
     async def is_name_valid(self, name: str) -> bool:
         """
@@ -253,17 +353,39 @@ class CmdCog(commands.Cog):
         Returns
         -------
         Cmd
-            The cmd object.
+            The cmd object, None if it does not exist.
         """
 
-        self.logger.info(f"get_cmd -> {name}")
+        return self.registry.get(name)
 
-        async with self.connection.execute(
-            "SELECT * FROM cmd WHERE name = ?", (name,)
-        ) as cursor:
-            cmd = await cursor.fetchone()
+    def get_template(self, cmd: Cmd) -> Template:
+        """
+        Gets the compiled template of a cmd.
 
-        return Cmd(*cmd[1:])
+        The description is parsed on the first call only, the compiled form
+        is kept until the cmd is updated or deleted.
+
+        Parameters
+        ----------
+        cmd : Cmd
+            The cmd object.
+
+        Returns
+        -------
+        Template
+            The compiled template.
+
+        Raises
+        ------
+        TemplateError
+            If the description is not a valid template.
+        """
+
+        template = self.templates.get(cmd.name)
+        if template is None or template.source != cmd.description:
+            template = self.templates[cmd.name] = Template.compile(cmd.description)
+
+        return template
 
     async def get_user_cmds(self) -> list[Cmd]:
         """
@@ -275,12 +397,7 @@ class CmdCog(commands.Cog):
             The cmds.
         """
 
-        async with self.connection.execute(
-            "SELECT * FROM cmd WHERE dynamic = ?", (1,)
-        ) as cursor:
-            cmds = await cursor.fetchall()
-
-        return [Cmd(*cmd[1:]) for cmd in cmds]
+        return [cmd for cmd in self.registry.values() if cmd.dynamic]
 
     async def get_all_cmds(self) -> list[Cmd]:
         """
@@ -292,10 +409,7 @@ class CmdCog(commands.Cog):
             The cmds.
         """
 
-        async with self.connection.execute("SELECT * FROM cmd") as cursor:
-            cmds = await cursor.fetchall()
-
-        return [Cmd(*cmd[1:]) for cmd in cmds]
+        return list(self.registry.values())
 
     async def update_status(self, name: str, status: bool) -> None:
         """
@@ -316,11 +430,14 @@ class CmdCog(commands.Cog):
         # Convert the status to an integer
         status = 1 if status else 0
 
-        await self.connection.execute(
-            "UPDATE cmd SET status = ? WHERE name = ?", (status, name)
-        )
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "UPDATE cmd SET status = ? WHERE name = ?", (status, name)
+            )
+
+        if name in self.registry:
+            self.registry[name].status = status
 
-        await self.connection.commit()
         self.logger.info(f"Updated cmd status -> {name} -> {status}.")
 
         # delete command
@@ -375,23 +492,48 @@ class CmdCog(commands.Cog):
         if cmd.description == "":
             return {"error": "description must not be empty"}
 
-        await self.connection.execute(
-            "UPDATE cmd SET name = ?, description = ?, usage = ?, used = ?, cost = ?, status = ?, aliases = ?, category = ?, dynamic = ?, text = ? WHERE name = ?",
-            (
-                cmd.name,
-                cmd.description,
-                cmd.usage,
-                cmd.used,
-                cmd.cost,
-                cmd.status,
-                cmd.aliases,
-                cmd.category,
-                cmd.dynamic,
-                cmd.text,
-                name,
-            ),
-        )
-        await self.connection.commit()
+        try:
+            template = Template.compile(cmd.description)
+        except TemplateError as e:
+            return {"error": f"invalid description: {e}"}
+
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "UPDATE cmd SET name = ?, description = ?, usage = ?, cost = ?, status = ?, aliases = ?, category = ?, dynamic = ?, text = ? WHERE name = ?",
+                (
+                    cmd.name,
+                    cmd.description,
+                    cmd.usage,
+                    cmd.cost,
+                    cmd.status,
+                    cmd.aliases,
+                    cmd.category,
+                    cmd.dynamic,
+                    cmd.text,
+                    name,
+                ),
+            )
+
+        # The number of uses is never taken from the edited cmd, it keeps
+        # counting under the new name
+        previous = self.registry.get(name)
+        cmd.used = previous.used if previous is not None else 0
+
+        pending = self.usage.pop(name, 0)
+        if pending:
+            self.usage[cmd.name] += pending
+
+        if self.counters is not None and cmd.name != name:
+            await self.counters.rename("cmd", name, cmd.name)
+
+        self.registry = {
+            (cmd.name if key == name else key): (cmd if key == name else value)
+            for key, value in self.registry.items()
+        }
+        self.registry.setdefault(cmd.name, cmd)
+
+        self.templates.pop(name, None)
+        self.templates[cmd.name] = template
         self.logger.info(f"Updated cmd -> {cmd.name}.")
         return {"success": f"command {cmd.name} updated"}
 
@@ -417,8 +559,13 @@ class CmdCog(commands.Cog):
 
         self.bot.remove_command(name)
 
-        await self.connection.execute("DELETE FROM cmd WHERE name = ?", (name,))
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute("DELETE FROM cmd WHERE name = ?", (name,))
+        self.registry.pop(name, None)
+        # The pending uses belonged to the deleted row, there is nothing left
+        # to add them to
+        self.usage.pop(name, None)
+        self.templates.pop(name, None)
         self.logger.info(f"Deleted cmd -> {name}.")
         return {"success": f"command {name} deleted"}
 
@@ -432,12 +579,7 @@ class CmdCog(commands.Cog):
             The cmds.
         """
 
-        async with self.connection.execute(
-            "SELECT * FROM cmd WHERE dynamic = ?", (0,)
-        ) as cursor:
-            cmds = await cursor.fetchall()
-
-        return [Cmd(*cmd[1:]) for cmd in cmds]
+        return [cmd for cmd in self.registry.values() if not cmd.dynamic]
 
     async def get_all_dynamic_cmds(self) -> list:
         """
@@ -449,12 +591,7 @@ class CmdCog(commands.Cog):
             The cmds.
         """
 
-        async with self.connection.execute(
-            "SELECT * FROM cmd WHERE dynamic = ?", (1,)
-        ) as cursor:
-            cmds = await cursor.fetchall()
-
-        return [Cmd(*cmd[1:]) for cmd in cmds]
+        return [cmd for cmd in self.registry.values() if cmd.dynamic]
 
     @commands.command(name="about")
     async def about_bot(self, ctx: commands.Context):
@@ -474,7 +611,7 @@ class CmdCog(commands.Cog):
         link = " discord.gg/xxqtuubayy"
 
         await self.increment_usage(ctx.command.name)
-        await ctx.send(
+        await self.bot.say(
             f"DoggoBot has been created by Fumi/Namsku - If you want more info ping him on his Discord ({link})"
         )
 
@@ -494,7 +631,7 @@ class CmdCog(commands.Cog):
         """
 
         await self.increment_usage(ctx.command.name)
-        await ctx.send(f"Pong!")
+        await self.bot.say(f"Pong!")
 
     @commands.command(name="shoutout", aliases=["so"])
     async def shoutout(self, ctx: commands.Context) -> None:
@@ -512,7 +649,7 @@ class CmdCog(commands.Cog):
         """
 
         if len(ctx.message.content.split()) != 2:
-            await ctx.send("Usage: !so <user>")
+            await self.bot.say("Usage: !so <user>")
             return
 
         user = ctx.message.content.split()[1].lower().replace("@", "")
@@ -520,7 +657,7 @@ class CmdCog(commands.Cog):
 
         await self.increment_usage(ctx.command.name)
 
-        await ctx.send(
+        await self.bot.say(
             f" 📢 Please give a look to our >>> {user} <<< "
             f"Take a look at his twitch channel (twitch.tv/{str.lower(user)}) | Last stream was about {game}"
         )
@@ -539,7 +676,7 @@ class CmdCog(commands.Cog):
         -------
         None
         """
-        await ctx.send(
+        await self.bot.say(
             "📢 If you search a list of good mods/tools for RE, everything is on my discord (!socials for more info)"
         )
 
@@ -559,7 +696,7 @@ class CmdCog(commands.Cog):
         """
 
         await self.increment_usage(ctx.command.name)
-        await ctx.send("📢 The schedule is on the discord (!socials for more info)")
+        await self.bot.say("📢 The schedule is on the discord (!socials for more info)")
 
     @commands.command(name="help")
     async def help(self, ctx: commands.Context):
@@ -580,14 +717,14 @@ class CmdCog(commands.Cog):
         user = ctx.author.name.lower()
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
         # give the full list of commands that are currently available from the bot
         bot_list = list(sorted([f"!{cmd}" for cmd in self.bot.commands.keys()]))
 
         await self.increment_usage(ctx.command.name)
-        await ctx.send(f"📢 available commands: {' '.join(bot_list)}")
+        await self.bot.say(f"📢 available commands: {' '.join(bot_list)}")
 
     @commands.command(name="sfx")
     async def sound_effects(self, ctx: commands.Context):
@@ -608,10 +745,10 @@ class CmdCog(commands.Cog):
         user = ctx.author.name.lower()
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
-        await ctx.send("📢 The full list is on my discord (!socials for more info)")
+        await self.bot.say("📢 The full list is on my discord (!socials for more info)")
 
     @commands.command(name="clip")
     async def clip(self, ctx: commands.Context) -> None:
@@ -632,12 +769,12 @@ class CmdCog(commands.Cog):
             user = ctx.author.name.lower()
 
             if user not in self.bot.channel_members:
-                await ctx.send(f"{user} is not following the channel.")
+                await self.bot.say(f"{user} is not following the channel.")
                 return
         '''
 
         if len(ctx.message.content.split()) != 1:
-                await ctx.send("Usage: !clip")
+                await self.bot.say("Usage: !clip")
                 return
 
 
@@ -646,7 +783,7 @@ class CmdCog(commands.Cog):
 
         await self.increment_usage(ctx.command.name)
         self.logger.info(f"Clip created -> {dict} -> {ssss}")
-        await ctx.send(f"📢 Clip created -> {dict['edit_url'].replace('/edit','')}")
+        await self.bot.say(f"📢 Clip created -> {dict['edit_url'].replace('/edit','')}")
 
     async def _fill_default_table(self) -> None:
         """
@@ -0,0 +1,288 @@
+from modules.logger import Logger
+
+from datetime import datetime
+
+import heapq
+import time
+
+
+# Cooldown keys persisted in the lock columns of the users table, the gamble
+# command is the roll game and keeps its cooldown in gamble_lock
+LOCK_COLUMNS = {
+    "gamble": "gamble_lock",
+    "rpg": "rpg_lock",
+    "sfx": "sfx_lock",
+    "slots": "slots_lock",
+}
+
+
+class Cooldowns:
+    def __init__(self, rate: float = 0.5, burst: int = 5) -> None:
+        """
+        Initializes a new cooldown engine.
+
+        Every (user, key) pair has an expiry time, checking it is a dict
+        lookup. Expired entries are dropped in order from a heap, so memory
+        only holds the users on cooldown. On top of that, every user has a
+        token bucket limiting the rate of commands whatever their cooldown.
+
+        Changes of the keys listed in LOCK_COLUMNS are collected until
+        pop_changes() is called, so they can be saved lazily for a restart.
+
+        Parameters
+        ----------
+        rate : float
+            The number of commands per second a user gets back.
+        burst : int
+            The number of commands a user can send at once.
+
+        Returns
+        -------
+        None
+        """
+
+        self.rate = rate
+        self.burst = burst
+        self.logger = Logger(__name__)
+
+        self.expires = {}  # (username, key) -> expiry timestamp
+        self.buckets = {}  # username -> (tokens, timestamp)
+        self.changes = {}  # (username, key) -> expiry timestamp, None once expired
+
+        self._heap = []  # (expiry timestamp, username, key)
+
+    def remaining(self, username: str, key: str) -> float:
+        """
+        Gets the remaining cooldown of a user.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        key : str
+            The cooldown key, e.g. "slots".
+
+        Returns
+        -------
+        float
+            The remaining time in seconds, 0 if the user is not on cooldown.
+        """
+
+        expires = self.expires.get((username, key))
+        if expires is None:
+            return 0.0
+
+        return max(0.0, expires - time.time())
+
+    def check(self, username: str, key: str, duration: float) -> float:
+        """
+        Starts a cooldown unless the user is already on cooldown.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        key : str
+            The cooldown key, e.g. "slots".
+        duration : float
+            The cooldown in seconds, 0 for none.
+
+        Returns
+        -------
+        float
+            0 if the user can go on, the remaining time in seconds otherwise.
+        """
+
+        remaining = self.remaining(username, key)
+        if remaining > 0:
+            return remaining
+
+        if duration > 0:
+            self.start(username, key, time.time() + duration)
+
+        return 0.0
+
+    def start(self, username: str, key: str, expires: float) -> None:
+        """
+        Puts a user on cooldown until a given time.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        key : str
+            The cooldown key, e.g. "slots".
+        expires : float
+            The timestamp the cooldown ends at.
+
+        Returns
+        -------
+        None
+        """
+
+        self.prune()
+
+        self.expires[(username, key)] = expires
+        heapq.heappush(self._heap, (expires, username, key))
+
+        if key in LOCK_COLUMNS:
+            self.changes[(username, key)] = expires
+
+    def reset(self, username: str, key: str) -> None:
+        """
+        Ends a cooldown at once.
+
+        check() starts the cooldown right away, so a second command of the
+        user can not slip in while the first one runs. A command that fails
+        afterwards, e.g. for lack of funds, resets it.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        key : str
+            The cooldown key, e.g. "slots".
+
+        Returns
+        -------
+        None
+        """
+
+        # The heap entry is skipped by prune() once the expiry is gone
+        if self.expires.pop((username, key), None) is not None and key in LOCK_COLUMNS:
+            self.changes[(username, key)] = None
+
+    def allow(self, username: str) -> bool:
+        """
+        Takes a token from the bucket of a user.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        bool
+            True if the user had a token left, False if the command must be
+            dropped.
+        """
+
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(username, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+
+        if tokens < 1:
+            self.buckets[username] = (tokens, now)
+            return False
+
+        self.buckets[username] = (tokens - 1, now)
+        return True
+
+    def prune(self) -> None:
+        """
+        Drops the expired cooldowns.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        now = time.time()
+
+        while self._heap and self._heap[0][0] <= now:
+            expires, username, key = heapq.heappop(self._heap)
+
+            # The entry may have been restarted with a later expiry
+            if self.expires.get((username, key)) != expires:
+                continue
+
+            del self.expires[(username, key)]
+            if key in LOCK_COLUMNS:
+                self.changes[(username, key)] = None
+
+    def restore(self, locks: dict[tuple[str, str], str]) -> int:
+        """
+        Restores the cooldowns saved in the lock columns.
+
+        Parameters
+        ----------
+        locks : dict[tuple[str, str], str]
+            The saved value by username and key, "unlocked" or the end of the
+            cooldown in ISO format.
+
+        Returns
+        -------
+        int
+            The number of cooldowns still running.
+        """
+
+        now = time.time()
+        restored = 0
+
+        for (username, key), value in locks.items():
+            try:
+                expires = datetime.fromisoformat(value).timestamp()
+            except (TypeError, ValueError):
+                continue
+
+            if expires > now:
+                self.expires[(username, key)] = expires
+                heapq.heappush(self._heap, (expires, username, key))
+                restored += 1
+            else:
+                self.changes[(username, key)] = None
+
+        self.logger.debug(f"Restored {restored} cooldowns.")
+        return restored
+
+    def pop_changes(self) -> dict[tuple[str, str], str]:
+        """
+        Takes the changes of the persisted cooldowns since the last call.
+
+        Meant to be called periodically, the token buckets that refilled
+        since are dropped as well.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict[tuple[str, str], str]
+            The value to save by username and key, "unlocked" or the end of
+            the cooldown in ISO format.
+        """
+
+        self.prune()
+
+        # A bucket refilled to burst is the same as no bucket
+        if self.rate > 0:
+            now = time.monotonic()
+            refill = self.burst / self.rate
+            self.buckets = {
+                username: bucket
+                for username, bucket in self.buckets.items()
+                if now - bucket[1] < refill
+            }
+
+        changes, self.changes = self.changes, {}
+        return {
+            key: (
+                "unlocked"
+                if expires is None
+                else datetime.fromtimestamp(expires).isoformat(timespec="seconds")
+            )
+            for key, expires in changes.items()
+        }
+
+    def __len__(self) -> int:
+        """
+        Returns the number of running cooldowns.
+        """
+
+        return len(self.expires)
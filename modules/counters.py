@@ -0,0 +1,276 @@
+from modules.database import transaction
+from modules.logger import Logger
+
+from collections import Counter
+
+import aiosqlite
+import asyncio
+import time
+
+
+class UsageCounters:
+    def __init__(
+        self, connection: aiosqlite.Connection, flush_interval: float = 5.0
+    ) -> None:
+        """
+        Initializes a new usage counters object.
+
+        Uses of commands, sound effects and games are counted in memory per
+        (kind, name, hour) and added to the usage table by a single batched
+        upsert every flush_interval seconds, so counting a use never touches
+        the database.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database holding the usage table.
+        flush_interval : float
+            The time in seconds between two flushes.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.flush_interval = flush_interval
+        self.logger = Logger(__name__)
+
+        self._pending = Counter()
+        self._task = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    def hour(timestamp: float = None) -> int:
+        """
+        Returns the hour bucket of a timestamp, the current one by default.
+        """
+
+        return int((time.time() if timestamp is None else timestamp) // 3600)
+
+    def hit(self, kind: str, name: str, count: int = 1) -> None:
+        """
+        Counts a use.
+
+        Parameters
+        ----------
+        kind : str
+            The kind of the used thing, e.g. "cmd", "sfx" or "game".
+        name : str
+            The name of the used thing.
+        count : int
+            The number of uses.
+
+        Returns
+        -------
+        None
+        """
+
+        self._pending[(kind, name, self.hour())] += count
+
+    def start(self) -> None:
+        """
+        Starts the background flush task if it is not already running.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def flush(self) -> int:
+        """
+        Adds the pending counts to the usage table in one transaction.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of (kind, name, hour) rows written.
+        """
+
+        async with self._lock:
+            if not self._pending:
+                return 0
+
+            pending, self._pending = self._pending, Counter()
+
+            try:
+                async with transaction(self.connection):
+                    await self.connection.executemany(
+                        """
+                        INSERT INTO usage (kind, name, hour, count) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (kind, name, hour) DO UPDATE SET count = count + excluded.count
+                        """,
+                        [(*key, count) for key, count in pending.items()],
+                    )
+            except Exception as e:
+                # Kept for the next flush
+                self._pending.update(pending)
+                self.logger.error(f"Error while flushing {len(pending)} counters: {e}")
+                return 0
+
+            self.logger.debug(f"Flushed {len(pending)} counters.")
+            return len(pending)
+
+    async def rename(self, kind: str, old: str, new: str) -> None:
+        """
+        Moves the uses of a renamed thing to its new name.
+
+        Parameters
+        ----------
+        kind : str
+            The kind, e.g. "cmd".
+        old : str
+            The previous name.
+        new : str
+            The new name.
+
+        Returns
+        -------
+        None
+        """
+
+        async with self._lock:
+            for key in [key for key in self._pending if key[:2] == (kind, old)]:
+                self._pending[(kind, new, key[2])] += self._pending.pop(key)
+
+            async with transaction(self.connection):
+                await self.connection.execute(
+                    """
+                    INSERT INTO usage (kind, name, hour, count)
+                    SELECT kind, ?, hour, count FROM usage WHERE kind = ? AND name = ?
+                    ON CONFLICT (kind, name, hour) DO UPDATE SET count = count + excluded.count
+                    """,
+                    (new, kind, old),
+                )
+                await self.connection.execute(
+                    "DELETE FROM usage WHERE kind = ? AND name = ?", (kind, old)
+                )
+
+    async def close(self) -> None:
+        """
+        Stops the background task and flushes the pending counts.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def totals(self, kind: str) -> dict[str, int]:
+        """
+        Gets the number of uses of everything of a kind.
+
+        Parameters
+        ----------
+        kind : str
+            The kind, e.g. "cmd".
+
+        Returns
+        -------
+        dict[str, int]
+            The number of uses by name, pending counts included.
+        """
+
+        async with self.connection.execute(
+            "SELECT name, SUM(count) FROM usage WHERE kind = ? GROUP BY name", (kind,)
+        ) as cursor:
+            totals = Counter(dict(await cursor.fetchall()))
+
+        for (pending_kind, name, _), count in self._pending.items():
+            if pending_kind == kind:
+                totals[name] += count
+
+        return dict(totals.most_common())
+
+    async def histogram(self, kind: str, name: str, hours: int = 24) -> list[dict]:
+        """
+        Gets the uses of one thing per hour.
+
+        Parameters
+        ----------
+        kind : str
+            The kind, e.g. "cmd".
+        name : str
+            The name.
+        hours : int
+            The number of hours, ending with the current one.
+
+        Returns
+        -------
+        list[dict]
+            The start timestamp of every hour and its number of uses, the
+            oldest hour first.
+        """
+
+        last = self.hour()
+        first = last - hours + 1
+
+        async with self.connection.execute(
+            "SELECT hour, count FROM usage WHERE kind = ? AND name = ? AND hour >= ?",
+            (kind, name, first),
+        ) as cursor:
+            counts = Counter(dict(await cursor.fetchall()))
+
+        for (pending_kind, pending_name, hour), count in self._pending.items():
+            if pending_kind == kind and pending_name == name and hour >= first:
+                counts[hour] += count
+
+        return [
+            {"timestamp": hour * 3600, "count": counts[hour]}
+            for hour in range(first, last + 1)
+        ]
+
+    async def _run(self) -> None:
+        """
+        Flushes the counters until they are closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of pending counters.
+        """
+
+        return len(self._pending)
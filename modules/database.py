@@ -0,0 +1,284 @@
+from modules.logger import Logger
+
+from contextvars import ContextVar
+
+import aiosqlite
+import asyncio
+import os
+import weakref
+
+
+# The units of work held by the current task, inherited by the tasks it starts
+_held = ContextVar("held_units_of_work", default=frozenset())
+
+
+class UnitOfWork:
+    def __init__(self, connection: aiosqlite.Connection) -> None:
+        """
+        Initializes a new unit of work object.
+
+        A unit of work groups the statements executed inside it into a single
+        transaction, committed when the outermost block exits and rolled back
+        if it raises. Nested blocks entered by the same task become
+        savepoints, so a failing inner block only undoes its own statements.
+        Other tasks wait until the transaction is over before starting theirs.
+
+        Every write must go through a unit of work: a transaction left open
+        by a statement run outside of one is never committed on its behalf,
+        entering the unit raises instead. Nesting is tracked per task, a task
+        started inside a unit (create_task, gather) can not join it and would
+        wait for its own parent, so entering the unit from such a task raises
+        too. Reads do not take the lock and may see the rows of a transaction
+        that is later rolled back.
+
+        Use transaction() to get the unit of work shared by a connection.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.depth = 0
+        self.owner = None
+        self._token = None
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self) -> "UnitOfWork":
+        """
+        Starts a transaction, or a savepoint if one is already running.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        UnitOfWork
+            The unit of work.
+        """
+
+        task = asyncio.current_task()
+
+        if self.owner is task:
+            self.depth += 1
+            await self.connection.execute(f"SAVEPOINT unit_of_work_{self.depth}")
+            return self
+
+        if self in _held.get():
+            raise RuntimeError(
+                "transaction() entered from a task started inside a transaction of the same connection"
+            )
+
+        await self._lock.acquire()
+        self.owner = task
+
+        try:
+            # Committing would make the half-written statements of another
+            # coroutine permanent
+            if self.connection.in_transaction:
+                raise RuntimeError("a transaction was left open outside a unit of work")
+
+            await self.connection.execute("BEGIN")
+        except BaseException:
+            self.owner = None
+            self._lock.release()
+            raise
+
+        self._token = _held.set(_held.get() | {self})
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> bool:
+        """
+        Commits or rolls back the transaction or the savepoint.
+
+        Parameters
+        ----------
+        exc_type : type
+            The type of the exception raised in the block, if any.
+        exc : Exception
+            The exception raised in the block, if any.
+        traceback : traceback
+            The traceback of the exception, if any.
+
+        Returns
+        -------
+        bool
+            Always False, exceptions are never swallowed.
+        """
+
+        if self.depth > 0:
+            savepoint = f"unit_of_work_{self.depth}"
+            self.depth -= 1
+
+            if exc_type is not None:
+                await self.connection.execute(f"ROLLBACK TO {savepoint}")
+            await self.connection.execute(f"RELEASE {savepoint}")
+            return False
+
+        try:
+            if exc_type is not None:
+                await self.connection.rollback()
+            else:
+                await self.connection.commit()
+        finally:
+            _held.reset(self._token)
+            self.owner = None
+            self._lock.release()
+
+        return False
+
+
+_units = weakref.WeakKeyDictionary()
+
+
+def transaction(connection: aiosqlite.Connection) -> UnitOfWork:
+    """
+    Gets the unit of work shared by every user of a connection.
+
+    Parameters
+    ----------
+    connection : aiosqlite.Connection
+        The connection to the database.
+
+    Returns
+    -------
+    UnitOfWork
+        The unit of work, to be used with "async with".
+    """
+
+    unit = _units.get(connection)
+    if unit is None:
+        unit = _units[connection] = UnitOfWork(connection)
+
+    return unit
+
+
+class Database:
+    def __init__(
+        self,
+        folder: str = "data/database",
+        cache_size: int = 16384,
+        mmap_size: int = 268435456,
+    ) -> None:
+        """
+        Initializes a new database engine object.
+
+        The engine opens every database file of the bot once, with the same
+        tuned settings, and hands the shared connection to the cogs.
+
+        Parameters
+        ----------
+        folder : str
+            The folder containing the database files.
+        cache_size : int
+            The page cache size of every connection, in KiB.
+        mmap_size : int
+            The number of bytes of every file that are memory-mapped.
+
+        Returns
+        -------
+        None
+        """
+
+        self.folder = folder
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.connections = {}
+        self.logger = Logger(__name__)
+
+    def get_path(self, name: str) -> str:
+        """
+        Gets the path of a database file.
+
+        Parameters
+        ----------
+        name : str
+            The name of the database, e.g. "user".
+
+        Returns
+        -------
+        str
+            The path of the database file.
+        """
+
+        return os.path.join(self.folder, f"{name}.sqlite")
+
+    async def connect(self, name: str) -> aiosqlite.Connection:
+        """
+        Gets the connection to a database, opening it on first use.
+
+        Parameters
+        ----------
+        name : str
+            The name of the database, e.g. "user".
+
+        Returns
+        -------
+        aiosqlite.Connection
+            The connection to the database.
+        """
+
+        connection = self.connections.get(name)
+        if connection is not None:
+            return connection
+
+        os.makedirs(self.folder, exist_ok=True)
+        connection = await aiosqlite.connect(self.get_path(name))
+        await self.configure(connection)
+
+        self.connections[name] = connection
+        self.logger.debug(f"Database {name} opened.")
+        return connection
+
+    async def configure(self, connection: aiosqlite.Connection) -> None:
+        """
+        Applies the engine settings to a connection.
+
+        WAL lets the dashboard read while the bot writes and, with
+        synchronous=NORMAL, only syncs the disk on checkpoints instead of on
+        every commit.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to configure.
+
+        Returns
+        -------
+        None
+        """
+
+        await connection.execute("PRAGMA journal_mode = WAL")
+        await connection.execute("PRAGMA synchronous = NORMAL")
+        await connection.execute(f"PRAGMA cache_size = -{int(self.cache_size)}")
+        await connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        await connection.execute("PRAGMA temp_store = MEMORY")
+        await connection.execute("PRAGMA busy_timeout = 5000")
+
+    async def close(self) -> None:
+        """
+        Closes every open connection.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        for name, connection in self.connections.items():
+            try:
+                await connection.commit()
+                await connection.close()
+            except Exception as e:
+                self.logger.error(f"Error while closing database {name}: {e}")
+
+        self.connections = {}
@@ -0,0 +1,89 @@
+from modules.http import HttpClient
+from modules.logger import Logger
+
+from typing import AsyncIterator
+
+
+class FollowerStream:
+    URL = "https://api.twitch.tv/helix/channels/followers"
+
+    def __init__(
+        self,
+        http: HttpClient,
+        client_id: str,
+        token: str,
+        broadcaster_id: str,
+        page_size: int = 100,
+    ) -> None:
+        """
+        Initializes a new follower stream object.
+
+        The followers of a channel are read from the Helix API one page at a
+        time, every page is handed to the caller before the next one is
+        requested, so nothing waits for the full list and only one page is
+        held in memory.
+
+        Parameters
+        ----------
+        http : HttpClient
+            The shared HTTP client.
+        client_id : str
+            The Twitch client id.
+        token : str
+            The Twitch user access token, with or without the "oauth:" prefix.
+        broadcaster_id : str
+            The id of the channel.
+        page_size : int
+            The number of followers per page, at most 100.
+
+        Returns
+        -------
+        None
+        """
+
+        self.http = http
+        self.client_id = client_id
+        self.token = token.removeprefix("oauth:")
+        self.broadcaster_id = broadcaster_id
+        self.page_size = min(page_size, 100)
+        self.logger = Logger(__name__)
+
+    async def pages(self, after: str = None) -> AsyncIterator[tuple[list[str], str]]:
+        """
+        Yields the followers page by page.
+
+        Parameters
+        ----------
+        after : str
+            The cursor to resume from, None to start from the newest follower.
+
+        Returns
+        -------
+        AsyncIterator[tuple[list[str], str]]
+            The usernames of every page and the cursor of the next page, the
+            cursor is None for the last page.
+        """
+
+        headers = {
+            "Client-Id": self.client_id,
+            "Authorization": f"Bearer {self.token}",
+        }
+
+        while True:
+            params = {"broadcaster_id": self.broadcaster_id, "first": self.page_size}
+            if after:
+                params["after"] = after
+
+            async with self.http.request(
+                "GET", self.URL, headers=headers, params=params
+            ) as response:
+                response.raise_for_status()
+                body = await response.json()
+
+            after = body.get("pagination", {}).get("cursor")
+            usernames = [follower["user_login"].lower() for follower in body.get("data", [])]
+
+            yield usernames, after
+
+            if not after or not usernames:
+                return
@@ -1,4 +1,6 @@
 from collections import OrderedDict
+from modules.chat import Priority
+from modules.database import transaction
 from modules.logger import Logger
 from modules.games.gambling import GamblingCog
 from modules.games.rpg import RpgCog
@@ -10,6 +12,7 @@ from typing import Union
 
 
 import aiosqlite
+import math
 import random
 
 
@@ -197,8 +200,8 @@ class GamesCog(commands.Cog):
         sql_request = f"INSERT INTO game ({', '.join(game_attributes)}) VALUES ({', '.join(':' + attribute for attribute in game_attributes)})"
         parameters = tuple(game.values())
 
-        await self.connection.execute(sql_request, parameters)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_request, parameters)
 
         return {"success": f"game {game['name']} added successfully"}
 
@@ -222,8 +225,8 @@ class GamesCog(commands.Cog):
         sql_query = f"UPDATE game SET {', '.join(f'{key} = ?' for key in game.keys())} WHERE id = ?"
         parameters = tuple(list(game.values()) + [game["id"]])
 
-        await self.connection.execute(sql_query, parameters)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, parameters)
 
         return {"success": f"game {game['name']} updated successfully"}
 
@@ -241,9 +244,8 @@ class GamesCog(commands.Cog):
         None
         """
 
-        await self.connection.execute("DELETE FROM game WHERE id = ?", (game_id,))
-
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute("DELETE FROM game WHERE id = ?", (game_id,))
 
         return {"success": f"game {game_id} deleted successfully"}
 
@@ -264,9 +266,9 @@ class GamesCog(commands.Cog):
         if isinstance(game_name, dict):
             game_name = game_name["name"]
 
-        await self.connection.execute("DELETE FROM game WHERE name = ?", (game_name,))
+        async with transaction(self.connection):
+            await self.connection.execute("DELETE FROM game WHERE name = ?", (game_name,))
 
-        await self.connection.commit()
         self.logger.info(f"Deleted game -> {game_name}.")
 
         return {"success": f"game {game_name} deleted successfully"}
@@ -312,11 +314,11 @@ class GamesCog(commands.Cog):
 
         status = 1 if status else 0
 
-        await self.connection.execute(
-            "UPDATE game SET status = ? WHERE name = ?", (status, game_name)
-        )
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "UPDATE game SET status = ? WHERE name = ?", (status, game_name)
+            )
 
-        await self.connection.commit()
         self.logger.info(f"Updated game status -> {game_name} -> {status}.")
         return {"success": f"game {game_name} updated successfully"}
 
@@ -359,25 +361,46 @@ class GamesCog(commands.Cog):
         user = ctx.author.name.lower()
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
-        if await self.bot.usr.get_balance(user) < _rpg.cost:
-            await ctx.send(f"{user} does not have enough coins.")
+        rpg = await self.rpg.get_active_rpg()
+        if rpg is None:
+            await self.bot.say("No adventure is available right now.")
             return
 
-        _rpg = await self.rpg.get_all_active_rpg_events()
+        event = await self.rpg.get_random_event(rpg)
+        if event is None:
+            await self.bot.say("No adventure is available right now.")
+            return
 
-        if result["reward"] == 0:
-            result["reward"] = -_rpg.cost
+        remaining = self.bot.cooldowns.check(user, "rpg", rpg.timer)
+        if remaining:
+            await self.bot.say(f"{user} can go on an adventure again in {math.ceil(remaining)}s.")
+            return
 
-        if result["status"]:
-            await self.bot.usr.update_user_income(user, result["reward"])
-            await ctx.send(
-                f"{' '.join(result['spin'])} | {user} won {result['reward']} {self.bot.channel.channel.coin_name}!"
-            )
+        # The funds check and the payment are a single statement
+        balance = await self.bot.usr.adjust_balance(
+            user, -rpg.cost, required=rpg.cost, reason="rpg", game="rpg"
+        )
+
+        if balance is None:
+            self.bot.cooldowns.reset(user, "rpg")
+            await self.bot.say(f"{user} does not have enough coins.")
+            return
+
+        reward = self.rpg.get_reward(rpg, event)
+        if reward:
+            await self.bot.usr.adjust_balance(user, reward, floor=True, reason="rpg", game="rpg")
+
+        self.bot.counters.hit("game", "rpg")
+
+        message = event.message.format(user=user)
+        coin_name = self.bot.channel.channel.coin_name
+
+        if reward > rpg.cost:
+            await self.bot.say(f"{message} | {user} won {reward - rpg.cost} {coin_name}!", Priority.GAME)
+        elif reward == rpg.cost:
+            await self.bot.say(f"{message} | {user} got their {rpg.cost} {coin_name} back.", Priority.GAME)
         else:
-            await self.bot.usr.update_user_income(user, -result["reward"])
-            await ctx.send(
-                f"{' '.join(result['spin'])} | {user} lost {result['reward']} {self.bot.channel.channel.coin_name}!"
-            )
+            await self.bot.say(f"{message} | {user} lost {rpg.cost - reward} {coin_name}!", Priority.GAME)
@@ -1,9 +1,12 @@
+from modules.chat import Priority
+from modules.database import transaction
 from modules.logger import Logger
 
 from dataclasses import asdict, dataclass, fields
 from twitchio.ext import commands
 
 import aiosqlite
+import math
 import random
 import time
 
@@ -184,22 +187,22 @@ class GamblingCog(commands.Cog):
         None
         """
 
-        await self.connection.execute(
-            "INSERT INTO slots (cost, status, rng_manipulation, success_rate, reward_mushroom, reward_coin, reward_leaf, reward_diamond, jackpot, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                10000,
-                1,
-                0,
-                33,
-                1.5,
-                2.5,
-                5,
-                10,
-                7777777,
-                0,
-            ),
-        )
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "INSERT INTO slots (cost, status, rng_manipulation, success_rate, reward_mushroom, reward_coin, reward_leaf, reward_diamond, jackpot, time) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    10000,
+                    1,
+                    0,
+                    33,
+                    1.5,
+                    2.5,
+                    5,
+                    10,
+                    7777777,
+                    0,
+                ),
+            )
         self.logger.info("Slots table filled.")
 
     async def fill_default_roll_table(self):
@@ -215,18 +218,18 @@ class GamblingCog(commands.Cog):
         None
         """
 
-        await self.connection.execute(
-            "INSERT INTO roll (status, minimum_bet, maximum_bet, reward_critical_success, reward_critical_failure, time) VALUES (?, ?, ?, ?, ?, ?)",
-            (
-                1,
-                100,
-                777777,
-                7.777,
-                6.66,
-                0,
-            ),
-        )
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "INSERT INTO roll (status, minimum_bet, maximum_bet, reward_critical_success, reward_critical_failure, time) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    1,
+                    100,
+                    777777,
+                    7.777,
+                    6.66,
+                    0,
+                ),
+            )
         self.logger.info("Roll table filled.")
 
     async def get_roll(self) -> Roll:
@@ -344,8 +347,8 @@ class GamblingCog(commands.Cog):
         )
         parameters = tuple(roll_dict.values())
 
-        await self.connection.execute(sql_query, parameters)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, parameters)
 
         self.logger.info("Roll updated.")
 
@@ -369,8 +372,8 @@ class GamblingCog(commands.Cog):
         )
         parameters = tuple(slots_dict.values())
 
-        await self.connection.execute(sql_query, parameters)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, parameters)
 
         self.logger.info("Database info - Slots updated.")
 
@@ -641,27 +644,44 @@ class GamblingCog(commands.Cog):
         user = ctx.author.name.lower()
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
-        if await self.bot.usr.get_balance(user) < self.slots.cost:
-            await ctx.send(f"{user} does not have enough coins.")
+        remaining = self.bot.cooldowns.check(user, "slots", self.slots.time)
+        if remaining:
+            await self.bot.say(f"{user} can play slots again in {math.ceil(remaining)}s.")
             return
 
         result = await self.get_spin_result()
 
-        if result["reward"] == 0:
+        if not result["status"]:
             result["reward"] = -self.slots.cost
 
+        # The funds check and the payment are a single statement
+        balance = await self.bot.usr.adjust_balance(
+            user,
+            result["reward"],
+            required=self.slots.cost,
+            reason="slots",
+            game="slots",
+        )
+
+        if balance is None:
+            self.bot.cooldowns.reset(user, "slots")
+            await self.bot.say(f"{user} does not have enough coins.")
+            return
+
+        self.bot.counters.hit("game", "slots")
+
         if result["status"]:
-            await self.bot.usr.update_user_income(user, result["reward"])
-            await ctx.send(
-                f"{' '.join(result['spin'])} | {user} won {result['reward']} {self.bot.channel.channel.coin_name}!"
+            await self.bot.say(
+                f"{' '.join(result['spin'])} | {user} won {result['reward']} {self.bot.channel.channel.coin_name}!",
+                Priority.GAME,
             )
         else:
-            await self.bot.usr.update_user_income(user, -result["reward"])
-            await ctx.send(
-                f"{' '.join(result['spin'])} | {user} lost {result['reward']} {self.bot.channel.channel.coin_name}!"
+            await self.bot.say(
+                f"{' '.join(result['spin'])} | {user} lost {-result['reward']} {self.bot.channel.channel.coin_name}!",
+                Priority.GAME,
             )
 
     @commands.command(name="gamble")
@@ -680,70 +700,72 @@ class GamblingCog(commands.Cog):
         """
 
         if len(ctx.message.content.split()) != 2:
-            await ctx.send("Usage: !gamble <amount>")
+            await self.bot.say("Usage: !gamble <amount>")
             return
 
         user = ctx.author.name.lower()
         amount = ctx.message.content.split()[1]
 
         if not amount.isdigit():
-            await ctx.send("Usage: !gamble <amount>")
+            await self.bot.say("Usage: !gamble <amount>")
             return
 
         amount = int(amount, 10)
 
         if amount < 1:
-            await ctx.send("Usage: !gamble <amount>")
+            await self.bot.say("Usage: !gamble <amount>")
             return
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
-            return
-
-        if await self.bot.usr.get_balance(user) < amount:
-            await ctx.send(f"{user} does not have enough coins.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
         if self.roll.maximum_bet < amount:
-            await ctx.send(
+            await self.bot.say(
                 f"{user} cannot bet more than {self.roll.maximum_bet} coins."
             )
             return
 
         if self.roll.minimum_bet > amount:
-            await ctx.send(
+            await self.bot.say(
                 f"{user} cannot bet less than {self.roll.minimum_bet} coins."
             )
             return
 
+        remaining = self.bot.cooldowns.check(user, "gamble", self.roll.time)
+        if remaining:
+            await self.bot.say(f"{user} can gamble again in {math.ceil(remaining)}s.")
+            return
+
         rng = self.generate_random_number()
 
         # Critical Failure
         if rng == 0:
             # change amount has negative be sure it's integer without decimals
-            amount = self.roll.reward_critical_failure * amount
-            amount = int(-amount)
-
-            await self.bot.usr.update_user_income(user, amount)
-            await ctx.send(
-                f"{user} rolled an awful {rng} and lost {amount} {self.bot.channel.channel.coin_name}!"
-            )
+            delta = int(-self.roll.reward_critical_failure * amount)
+            message = f"{user} rolled an awful {rng} and lost {-delta} {self.bot.channel.channel.coin_name}!"
         elif rng == 100:
-            amount = int(self.roll.reward_critical_success * amount)
-            await self.bot.usr.update_user_income(user, amount)
-            await ctx.send(
-                f"{user} rolled a perfect {rng} and won {amount} {self.bot.channel.channel.coin_name}!"
-            )
+            delta = int(self.roll.reward_critical_success * amount)
+            message = f"{user} rolled a perfect {rng} and won {delta} {self.bot.channel.channel.coin_name}!"
         elif rng < 50:
-            await self.bot.usr.update_user_income(user, -amount)
-            await ctx.send(
-                f"{user} rolled a {rng} and lost {amount} {self.bot.channel.channel.coin_name}."
-            )
+            delta = -amount
+            message = f"{user} rolled a {rng} and lost {amount} {self.bot.channel.channel.coin_name}."
         elif rng == 50:
-            await ctx.send(f"{user} rolled a {rng} and nothing happened.")
+            delta = 0
+            message = f"{user} rolled a {rng} and nothing happened."
         else:
-            amount = int(2 * amount)
-            await self.bot.usr.update_user_income(user, amount)
-            await ctx.send(
-                f"{user} rolled a {rng} and won {amount} {self.bot.channel.channel.coin_name}!"
-            )
+            delta = int(2 * amount)
+            message = f"{user} rolled a {rng} and won {delta} {self.bot.channel.channel.coin_name}!"
+
+        # The funds check and the payment are a single statement
+        balance = await self.bot.usr.adjust_balance(
+            user, delta, floor=True, required=amount, reason="gamble", game="gamble"
+        )
+
+        if balance is None:
+            self.bot.cooldowns.reset(user, "gamble")
+            await self.bot.say(f"{user} does not have enough coins.")
+            return
+
+        self.bot.counters.hit("game", "gamble")
+        await self.bot.say(message, Priority.GAME)
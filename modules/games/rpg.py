@@ -1,9 +1,11 @@
 from collections import OrderedDict
+from modules.database import transaction
 from modules.logger import Logger
 from twitchio.ext import commands
 
 from dataclasses import asdict, dataclass
 import aiosqlite
+import random
 
 from typing import Union
 
@@ -147,8 +149,8 @@ class RpgCog(commands.Cog):
         rpg = asdict(rpg)
 
         sql_query = f"INSERT INTO rpg ({', '.join(rpg.keys())}) VALUES ({', '.join(':' + key for key in rpg.keys())})"
-        await self.connection.execute(sql_query, rpg)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, rpg)
 
         return {"success": f"RPG profile {rpg['name']} added successfully"}
 
@@ -192,8 +194,8 @@ class RpgCog(commands.Cog):
         rpg = asdict(rpg)
 
         sql_query = f"UPDATE rpg SET {', '.join(f'{key} = :{key}' for key in rpg.keys())} WHERE id = :id"
-        await self.connection.execute(sql_query, rpg)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, rpg)
 
         return {"success": f"rpg profile {rpg['name']} updated successfully"}
 
@@ -417,8 +419,8 @@ class RpgCog(commands.Cog):
             return {"error": "name not exists"}
 
         sql_query = "DELETE FROM rpg WHERE name = ?"
-        await self.connection.execute(sql_query, (name,))
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, (name,))
 
         return {"success": f"rpg profile {name} deleted successfully"}
 
@@ -448,8 +450,8 @@ class RpgCog(commands.Cog):
         rpg_event = asdict(rpg_event)
 
         sql_query = f"INSERT INTO rpg_event ({', '.join(rpg_event.keys())}) VALUES ({', '.join(':' + key for key in rpg_event.keys())})"
-        await self.connection.execute(sql_query, rpg_event)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, rpg_event)
 
         return {"success": f"RPG event {rpg_event['id']} added successfully"}
 
@@ -472,8 +474,8 @@ class RpgCog(commands.Cog):
             rpg_event = asdict(rpg_event)
 
         sql_query = f"UPDATE rpg_event SET {', '.join(f'{key} = :{key}' for key in rpg_event.keys())} WHERE id = :id"
-        await self.connection.execute(sql_query, rpg_event)
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, rpg_event)
 
         return {"success": f"rpg event {rpg_event['id']} updated successfully"}
 
@@ -502,8 +504,8 @@ class RpgCog(commands.Cog):
             id = id.id
 
         sql_query = "DELETE FROM rpg_event WHERE id = ?"
-        await self.connection.execute(sql_query, (id,))
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, (id,))
 
         return {"success": f"rpg event {id} deleted successfully"}
 
@@ -522,8 +524,8 @@ class RpgCog(commands.Cog):
             The result.
         """
         sql_query = "DELETE FROM rpg_event WHERE rpg_id = ?"
-        await self.connection.execute(sql_query, (rpg_id,))
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(sql_query, (rpg_id,))
 
         return {"success": f"all rpg events with rpg id {rpg_id} deleted successfully"}
 
@@ -622,17 +624,19 @@ class RpgCog(commands.Cog):
             ["You come across a tranquil village.", "Normal", "Win"],
         ]
 
-        for event in adventure_events:
-            # event is a list and need to be converted to a dict
-            event = {
-                "id": await self.get_last_event_id() + 1,
-                "rpg_id": rpg_id,
-                "message": event[0],
-                "type": event[1],
-                "event": event[2],
-            }
+        # A single transaction for the whole set instead of one per event
+        async with transaction(self.connection):
+            for event in adventure_events:
+                # event is a list and need to be converted to a dict
+                event = {
+                    "id": await self.get_last_event_id() + 1,
+                    "rpg_id": rpg_id,
+                    "message": event[0],
+                    "type": event[1],
+                    "event": event[2],
+                }
 
-            await self.add_rpg_event(RpgEvent(**event))
+                await self.add_rpg_event(RpgEvent(**event))
 
         return {"success": "default rpg events added successfully"}
 
@@ -856,14 +860,41 @@ class RpgCog(commands.Cog):
             else:
                 return {}
 
-    async def get_random_event(self, rpg_list) -> RpgEvent:
+    async def get_active_rpg(self) -> Rpg:
         """
-        Get a random event.
+        Get the rpg profile of an active rpg game.
 
         Parameters
         ----------
-        rpg_id : int
-            The id of the rpg.
+        None
+
+        Returns
+        -------
+        Rpg
+            The rpg profile, None if no rpg game is active.
+        """
+
+        sql_query = """
+            SELECT rpg.* FROM rpg
+            JOIN game ON game.name = rpg.name
+            WHERE game.category = 'rpg' AND game.status = 1
+            ORDER BY RANDOM() LIMIT 1
+        """
+        async with self.connection.execute(sql_query) as cursor:
+            content = await cursor.fetchone()
+            if content:
+                return Rpg(*content)
+            else:
+                return None
+
+    async def get_random_event(self, rpg: Rpg) -> RpgEvent:
+        """
+        Get a random event, its type drawn with the ratios of the rpg.
+
+        Parameters
+        ----------
+        rpg : Rpg
+            The rpg profile.
 
         Returns
         -------
@@ -871,14 +902,62 @@ class RpgCog(commands.Cog):
             The random event.
         """
 
+        ratios = {
+            "Normal": rpg.ratio_normal_event,
+            "Treasure": rpg.ratio_treasure_event,
+            "Monster": rpg.ratio_monster_event,
+            "Trap": rpg.ratio_trap_event,
+            "Boss": rpg.ratio_boss_event,
+        }
+        kinds = [kind for kind, ratio in ratios.items() if ratio > 0]
+        weights = [ratios[kind] for kind in kinds]
+
+        if kinds:
+            kind = random.choices(kinds, weights)[0]
+            sql_query = "SELECT * FROM rpg_event WHERE rpg_id = ? AND type = ? ORDER BY RANDOM() LIMIT 1"
+            async with self.connection.execute(sql_query, (rpg.id, kind)) as cursor:
+                content = await cursor.fetchone()
+                if content:
+                    return RpgEvent(*content)
+
         sql_query = "SELECT * FROM rpg_event WHERE rpg_id = ? ORDER BY RANDOM() LIMIT 1"
-        async with self.connection.execute(sql_query, (rpg_id,)) as cursor:
+        async with self.connection.execute(sql_query, (rpg.id,)) as cursor:
             content = await cursor.fetchone()
             if content:
                 return RpgEvent(*content)
             else:
                 return None
 
+    def get_reward(self, rpg: Rpg, event: RpgEvent) -> int:
+        """
+        Get the coins given back for an event, the cost is already paid.
+
+        Parameters
+        ----------
+        rpg : Rpg
+            The rpg profile.
+        event : RpgEvent
+            The event.
+
+        Returns
+        -------
+        int
+            The coins to add, negative when a boss takes more than the cost.
+        """
+
+        if event.event == "Tie":
+            return rpg.cost
+
+        if event.event == "Win":
+            if event.type == "Boss":
+                return int(rpg.cost * rpg.boss_bonus)
+            return int(rpg.cost * (1 + rpg.win_bonus / 100))
+
+        if event.type == "Boss":
+            return -int(rpg.cost * (rpg.boss_malus - 1))
+
+        return 0
+
     async def start_game(self) -> list:
             """
             Get all rpg events by active groups from the database.
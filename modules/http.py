@@ -0,0 +1,174 @@
+from modules.logger import Logger
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import aiohttp
+import asyncio
+
+
+class HttpClient:
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        timeout: float = 10.0,
+        dns_ttl: int = 300,
+        host_limits: dict[str, int] = None,
+    ) -> None:
+        """
+        Initializes a new HTTP client object.
+
+        Every outbound request of the bot goes through one aiohttp session,
+        so connections are kept alive and reused, DNS answers are cached and
+        a slow host can not hold more than its share of the pool.
+
+        Parameters
+        ----------
+        limit : int
+            The maximum number of open connections.
+        limit_per_host : int
+            The maximum number of open connections to the same host.
+        timeout : float
+            The maximum time in seconds a request can take.
+        dns_ttl : int
+            The time in seconds DNS answers are cached.
+        host_limits : dict[str, int]
+            The maximum number of concurrent requests for some hosts, e.g.
+            {"decapi.me": 4}.
+
+        Returns
+        -------
+        None
+        """
+
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.dns_ttl = dns_ttl
+        self.host_limits = host_limits or {}
+        self.logger = Logger(__name__)
+
+        self._session = None
+        self._semaphores = {}
+
+    def get_session(self) -> aiohttp.ClientSession:
+        """
+        Gets the shared session, creating it on first use.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        aiohttp.ClientSession
+            The session.
+        """
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout
+            )
+
+        return self._session
+
+    @asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs
+    ) -> AsyncIterator[aiohttp.ClientResponse]:
+        """
+        Sends a request, to be used with "async with".
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method, e.g. "GET".
+        url : str
+            The URL.
+        **kwargs
+            The arguments of aiohttp.ClientSession.request.
+
+        Returns
+        -------
+        AsyncIterator[aiohttp.ClientResponse]
+            The response.
+        """
+
+        host = urlsplit(url).hostname
+        semaphore = self._semaphores.get(host)
+        if semaphore is None and host in self.host_limits:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.host_limits[host])
+
+        if semaphore is None:
+            async with self.get_session().request(method, url, **kwargs) as response:
+                yield response
+            return
+
+        async with semaphore:
+            async with self.get_session().request(method, url, **kwargs) as response:
+                yield response
+
+    async def get_text(self, url: str, **kwargs) -> str:
+        """
+        Gets the body of a URL as text.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+        **kwargs
+            The arguments of aiohttp.ClientSession.request.
+
+        Returns
+        -------
+        str
+            The body of the response.
+        """
+
+        async with self.request("GET", url, **kwargs) as response:
+            return await response.text()
+
+    async def get_json(self, url: str, **kwargs):
+        """
+        Gets the body of a URL as JSON.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+        **kwargs
+            The arguments of aiohttp.ClientSession.request.
+
+        Returns
+        -------
+        Any
+            The decoded body of the response.
+        """
+
+        async with self.request("GET", url, **kwargs) as response:
+            return await response.json(content_type=None)
+
+    async def close(self) -> None:
+        """
+        Closes the shared session and its connections.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+        self._session = None
@@ -0,0 +1,317 @@
+from modules.batch import BatchWriter
+from modules.database import transaction
+from modules.logger import Logger
+
+import aiosqlite
+import asyncio
+import time
+
+
+class Ledger:
+    INSERT = """
+        INSERT INTO ledger (username, delta, reason, game, timestamp)
+        VALUES (:username, :delta, :reason, :game, :timestamp)
+    """
+
+    def __init__(
+        self,
+        connection: aiosqlite.Connection,
+        snapshot_interval: float = 3600.0,
+        keep: int = 48,
+    ) -> None:
+        """
+        Initializes a new coin ledger object.
+
+        Every balance change is appended to the ledger table through a batch
+        writer, rows are never updated nor deleted. Every snapshot_interval
+        seconds the balances are folded into a snapshot, built from the
+        previous snapshot and the ledger rows written since, so a balance at
+        any point in time only needs one snapshot row and the ledger tail.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the user database.
+        snapshot_interval : float
+            The time in seconds between two snapshots.
+        keep : int
+            The number of snapshots kept, older ones are deleted.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.snapshot_interval = snapshot_interval
+        self.keep = keep
+        self.logger = Logger(__name__)
+
+        self.writer = BatchWriter(
+            connection,
+            self.INSERT,
+            batch_size=200,
+            flush_interval=1.0,
+        )
+
+        self._task = None
+        self._closing = False
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        """
+        Starts the batch writer and the snapshot task.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self.writer.start()
+
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stops the snapshot task and writes the pending ledger rows.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.writer.close()
+
+    async def record(
+        self, username: str, delta: int, reason: str, game: str = None
+    ) -> None:
+        """
+        Appends a balance change to the ledger.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        delta : int
+            The amount added to the balance, negative if coins were removed.
+        reason : str
+            Why the balance changed, e.g. "income" or "slots".
+        game : str
+            The game that changed the balance, if any.
+
+        Returns
+        -------
+        None
+        """
+
+        if delta == 0:
+            return
+
+        await self.writer.put(
+            {
+                "username": username,
+                "delta": delta,
+                "reason": reason,
+                "game": game,
+                "timestamp": time.time(),
+            }
+        )
+
+    async def append(self, entries: list[tuple[str, int, str, str]]) -> None:
+        """
+        Writes balance changes to the ledger at once, without buffering.
+
+        Meant to be called inside the transaction changing the balances, so
+        the ledger rows are committed or rolled back together with them.
+
+        Parameters
+        ----------
+        entries : list[tuple[str, int, str, str]]
+            The username, delta, reason and game of every change.
+
+        Returns
+        -------
+        None
+        """
+
+        timestamp = time.time()
+
+        await self.connection.executemany(
+            self.INSERT,
+            [
+                {
+                    "username": username,
+                    "delta": delta,
+                    "reason": reason,
+                    "game": game,
+                    "timestamp": timestamp,
+                }
+                for username, delta, reason, game in entries
+                if delta != 0
+            ],
+        )
+
+    async def snapshot(self) -> int:
+        """
+        Builds a new snapshot from the previous one and the ledger tail.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The id of the new snapshot, None if nothing changed.
+        """
+
+        await self.writer.flush()
+        start = time.perf_counter()
+
+        async with transaction(self.connection):
+            async with self.connection.execute(
+                "SELECT id, ledger_id FROM balance_snapshot ORDER BY id DESC LIMIT 1"
+            ) as cursor:
+                previous = await cursor.fetchone() or (None, 0)
+
+            async with self.connection.execute("SELECT MAX(id) FROM ledger") as cursor:
+                ledger_id = (await cursor.fetchone())[0] or 0
+
+            if ledger_id <= previous[1]:
+                return None
+
+            async with self.connection.execute(
+                "INSERT INTO balance_snapshot (ledger_id, timestamp) VALUES (?, ?)",
+                (ledger_id, time.time()),
+            ) as cursor:
+                snapshot_id = cursor.lastrowid
+
+            await self.connection.execute(
+                """
+                INSERT INTO balance_snapshot_entry (snapshot_id, username, balance)
+                SELECT ?, username, SUM(balance) FROM (
+                    SELECT username, balance FROM balance_snapshot_entry WHERE snapshot_id = ?
+                    UNION ALL
+                    SELECT username, delta FROM ledger WHERE id > ? AND id <= ?
+                )
+                GROUP BY username
+                """,
+                (snapshot_id, previous[0], previous[1], ledger_id),
+            )
+
+            await self.connection.execute(
+                """
+                DELETE FROM balance_snapshot_entry WHERE snapshot_id IN (
+                    SELECT id FROM balance_snapshot ORDER BY id DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.keep,),
+            )
+            await self.connection.execute(
+                """
+                DELETE FROM balance_snapshot WHERE id IN (
+                    SELECT id FROM balance_snapshot ORDER BY id DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.keep,),
+            )
+
+        self.logger.debug(
+            f"Balance snapshot {snapshot_id} built in {(time.perf_counter() - start) * 1000:.1f} ms."
+        )
+        return snapshot_id
+
+    async def balance_as_of(self, username: str, timestamp: float) -> int:
+        """
+        Gets the balance a user had at a point in time.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        timestamp : float
+            The point in time, in seconds since the epoch.
+
+        Returns
+        -------
+        int
+            The balance of the user.
+        """
+
+        await self.writer.flush()
+
+        async with self.connection.execute(
+            """
+            SELECT id, ledger_id FROM balance_snapshot
+            WHERE timestamp <= ? ORDER BY id DESC LIMIT 1
+            """,
+            (timestamp,),
+        ) as cursor:
+            snapshot_id, ledger_id = await cursor.fetchone() or (None, 0)
+
+        async with self.connection.execute(
+            """
+            SELECT
+                COALESCE((
+                    SELECT balance FROM balance_snapshot_entry
+                    WHERE snapshot_id = :snapshot_id AND username = :username
+                ), 0)
+                + COALESCE((
+                    SELECT SUM(delta) FROM ledger
+                    WHERE username = :username AND id > :ledger_id AND timestamp <= :timestamp
+                ), 0)
+            """,
+            {
+                "snapshot_id": snapshot_id,
+                "username": username,
+                "ledger_id": ledger_id,
+                "timestamp": timestamp,
+            },
+        ) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def _run(self) -> None:
+        """
+        Builds a snapshot every snapshot_interval seconds until closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.snapshot_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            if self._closing:
+                break
+
+            try:
+                await self.snapshot()
+            except Exception as e:
+                self.logger.error(f"Error while building a balance snapshot: {e}")
@@ -0,0 +1,312 @@
+from modules.logger import Logger
+
+from concurrent.futures import ProcessPoolExecutor
+
+import asyncio
+import json
+import numpy as np
+import os
+import shutil
+import subprocess
+
+
+RATE = 48000
+CHANNELS = 2
+
+# Loudness every sound is brought to, in LUFS, and the highest peak allowed
+# after the gain, in dBFS
+TARGET = -16.0
+CEILING = -1.0
+MAX_GAIN = 12.0
+
+# K-weighting filter of ITU-R BS.1770 at 48 kHz: a high shelf then a high pass
+SHELF = ([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -1.69065929318241, 0.73248077421585])
+HIGH_PASS = ([1.0, -2.0, 1.0], [1.0, -1.99004745483398, 0.99007225036621])
+
+
+def k_weight(samples: np.ndarray) -> np.ndarray:
+    """
+    Applies the K-weighting filter in the frequency domain.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        The samples, one column per channel, between -1 and 1.
+
+    Returns
+    -------
+    np.ndarray
+        The filtered samples.
+    """
+
+    frames = len(samples)
+
+    # Padding keeps the tail of the filter from wrapping around
+    size = 1 << int(np.ceil(np.log2(frames + RATE // 2)))
+    delay = np.exp(-2j * np.pi * np.fft.rfftfreq(size))
+
+    response = np.ones_like(delay)
+    for b, a in (SHELF, HIGH_PASS):
+        response *= np.polyval(b[::-1], delay) / np.polyval(a[::-1], delay)
+
+    spectrum = np.fft.rfft(samples, size, axis=0) * response[:, None]
+    return np.fft.irfft(spectrum, size, axis=0)[:frames]
+
+
+def measure(samples: np.ndarray) -> dict:
+    """
+    Measures the integrated loudness and the peak of a sound.
+
+    The loudness is gated as in ITU-R BS.1770: 400 ms blocks overlapping by
+    75 %, the blocks under -70 LUFS then the blocks 10 LU under the average
+    are left out.
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        The 16 bits samples at 48 kHz, one column per channel.
+
+    Returns
+    -------
+    dict
+        The loudness in LUFS (None for silence), the peak in dBFS and the
+        gain in dB bringing the sound to TARGET without going over CEILING.
+    """
+
+    samples = samples.astype(np.float64) / 32768
+    frames = len(samples)
+
+    peak = float(np.abs(samples).max()) if samples.size else 0.0
+    if peak == 0:
+        return {"loudness": None, "peak": None, "gain": 0.0}
+
+    filtered = k_weight(samples)
+    energy = np.concatenate(([0.0], np.cumsum((filtered**2).sum(axis=1))))
+
+    block = min(int(0.4 * RATE), frames)
+    starts = np.arange(0, frames - block + 1, max(1, block // 4))
+    blocks = (energy[starts + block] - energy[starts]) / block
+
+    with np.errstate(divide="ignore"):
+        loudness = -0.691 + 10 * np.log10(blocks)
+
+    gated = loudness > -70
+    if not gated.any():
+        return {"loudness": None, "peak": round(20 * np.log10(peak), 2), "gain": 0.0}
+
+    relative = -0.691 + 10 * np.log10(blocks[gated].mean()) - 10
+    integrated = -0.691 + 10 * np.log10(blocks[gated & (loudness > relative)].mean())
+    peak = 20 * np.log10(peak)
+
+    gain = min(TARGET - integrated, CEILING - peak, MAX_GAIN)
+
+    return {
+        "loudness": round(float(integrated), 2),
+        "peak": round(float(peak), 2),
+        "gain": round(float(gain), 2),
+    }
+
+
+def analyze_file(source: str, ffmpeg: str = "ffmpeg") -> dict:
+    """
+    Decodes a sound file and measures it, runs in a worker process.
+
+    Parameters
+    ----------
+    source : str
+        The path of the sound file.
+    ffmpeg : str
+        The ffmpeg executable.
+
+    Returns
+    -------
+    dict
+        The measure, see measure().
+    """
+
+    process = subprocess.run(
+        [ffmpeg, "-i", source, "-loglevel", "panic", "-vn", "-f", "s16le",
+         "-ac", str(CHANNELS), "-ar", str(RATE), "pipe:1"],
+        stdout=subprocess.PIPE,
+        check=True,
+    )
+
+    samples = np.frombuffer(process.stdout, dtype=np.int16)
+    return measure(samples[: len(samples) - len(samples) % CHANNELS].reshape(-1, CHANNELS))
+
+
+class LoudnessIndex:
+    def __init__(self, directory: str = "data/sfx", ffmpeg: str = None) -> None:
+        """
+        Initializes a new loudness index.
+
+        The measure of every sound is saved next to it, as <hash>.json in the
+        sound folder, when it is uploaded. Gains are read once and kept in
+        memory, so applying them at play time costs nothing.
+
+        Parameters
+        ----------
+        directory : str
+            The folder of the sound files.
+        ffmpeg : str
+            The ffmpeg executable, found in the PATH by default.
+
+        Returns
+        -------
+        None
+        """
+
+        self.directory = directory
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.logger = Logger(__name__)
+
+        self.gains = {}  # hash -> linear gain
+
+    def path(self, key: str) -> str:
+        """
+        Returns the path of the measure of a sound.
+        """
+
+        return os.path.join(self.directory, f"{key}.json")
+
+    async def gain(self, key: str) -> float:
+        """
+        Gets the gain of a sound.
+
+        Parameters
+        ----------
+        key : str
+            The content hash of the sound file.
+
+        Returns
+        -------
+        float
+            The linear gain, 1 if the sound was never analyzed.
+        """
+
+        gain = self.gains.get(key)
+        if gain is None:
+            try:
+                result = await asyncio.to_thread(self._read, key)
+                gain = 10 ** (result["gain"] / 20)
+            except (OSError, ValueError, KeyError, TypeError):
+                gain = 1.0
+            self.gains[key] = gain
+
+        return gain
+
+    async def analyze(self, key: str, buffer) -> dict:
+        """
+        Measures already decoded samples and saves the result.
+
+        Parameters
+        ----------
+        key : str
+            The content hash of the sound file.
+        buffer : Union[bytes, mmap.mmap]
+            The decoded samples, 16 bits stereo at 48 kHz.
+
+        Returns
+        -------
+        dict
+            The measure, see measure().
+        """
+
+        samples = np.frombuffer(buffer, dtype=np.int16)
+        samples = samples[: len(samples) - len(samples) % CHANNELS].reshape(-1, CHANNELS)
+
+        result = await asyncio.to_thread(measure, samples)
+        await self.save(key, result)
+        return result
+
+    async def save(self, key: str, result: dict) -> None:
+        """
+        Saves the measure of a sound.
+
+        Parameters
+        ----------
+        key : str
+            The content hash of the sound file.
+        result : dict
+            The measure, see measure().
+
+        Returns
+        -------
+        None
+        """
+
+        await asyncio.to_thread(self._write, key, result)
+        self.gains[key] = 10 ** (result["gain"] / 20)
+
+    async def reanalyze(self, force: bool = False, workers: int = None) -> int:
+        """
+        Measures every sound of the folder in a pool of processes.
+
+        Parameters
+        ----------
+        force : bool
+            Measures the sounds already analyzed again.
+        workers : int
+            The number of processes, one per CPU by default.
+
+        Returns
+        -------
+        int
+            The number of sounds analyzed.
+        """
+
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg is required to analyze sounds")
+
+        keys = [
+            key
+            for key in await asyncio.to_thread(os.listdir, self.directory)
+            if "." not in key and (force or not os.path.exists(self.path(key)))
+        ]
+        if not keys:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        analyzed = 0
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        pool, analyze_file, os.path.join(self.directory, key), self.ffmpeg
+                    )
+                    for key in keys
+                ),
+                return_exceptions=True,
+            )
+
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error while analyzing {key}: {result}")
+                continue
+
+            await self.save(key, result)
+            analyzed += 1
+
+        self.logger.info(f"Analyzed {analyzed} of {len(keys)} sounds.")
+        return analyzed
+
+    def _read(self, key: str) -> dict:
+        """
+        Reads the measure of a sound, runs in a worker thread.
+        """
+
+        with open(self.path(key), "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _write(self, key: str, result: dict) -> None:
+        """
+        Saves the measure of a sound atomically, runs in a worker thread.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        temporary = f"{self.path(key)}.tmp"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        os.replace(temporary, self.path(key))
@@ -0,0 +1,154 @@
+from modules.logger import Logger
+
+from typing import Iterable, Iterator
+
+
+class ChannelMembers:
+    def __init__(self, usernames: Iterable[str] = ()) -> None:
+        """
+        Initializes a new channel members index.
+
+        The followers of the channel are kept in a set, so the follower check
+        done by every command costs the same whatever the size of the
+        channel. The index is shared by the bot and all the cogs.
+
+        Parameters
+        ----------
+        usernames : Iterable[str]
+            The usernames of the followers.
+
+        Returns
+        -------
+        None
+        """
+
+        self.members = {username.lower() for username in usernames}
+        self.logger = Logger(__name__)
+
+    def add(self, username: str) -> bool:
+        """
+        Adds a follower.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        bool
+            True if the user was not a follower yet, False otherwise.
+        """
+
+        username = username.lower()
+        if username in self.members:
+            return False
+
+        self.members.add(username)
+        return True
+
+    def discard(self, username: str) -> bool:
+        """
+        Removes a follower.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        bool
+            True if the user was a follower, False otherwise.
+        """
+
+        username = username.lower()
+        if username not in self.members:
+            return False
+
+        self.members.discard(username)
+        return True
+
+    def update(self, usernames: Iterable[str]) -> int:
+        """
+        Adds many followers at once.
+
+        Parameters
+        ----------
+        usernames : Iterable[str]
+            The usernames.
+
+        Returns
+        -------
+        int
+            The number of new followers.
+        """
+
+        size = len(self.members)
+        self.members.update(username.lower() for username in usernames)
+        return len(self.members) - size
+
+    def replace(self, usernames: Iterable[str]) -> tuple[set[str], set[str]]:
+        """
+        Replaces every follower, e.g. after fetching the full list again.
+
+        Parameters
+        ----------
+        usernames : Iterable[str]
+            The usernames of the followers.
+
+        Returns
+        -------
+        tuple[set[str], set[str]]
+            The new followers and the users that stopped following.
+        """
+
+        members = {username.lower() for username in usernames}
+        added, removed = members - self.members, self.members - members
+        self.members = members
+
+        self.logger.debug(
+            f"Channel members replaced: {len(members)} members, +{len(added)} -{len(removed)}."
+        )
+        return added, removed
+
+    def diff(self, usernames: Iterable[str]) -> tuple[set[str], set[str]]:
+        """
+        Compares the followers with another set of usernames.
+
+        Parameters
+        ----------
+        usernames : Iterable[str]
+            The usernames to compare with, e.g. the followers of the users
+            table.
+
+        Returns
+        -------
+        tuple[set[str], set[str]]
+            The followers missing from usernames and the usernames that are
+            not followers.
+        """
+
+        usernames = set(usernames)
+        return self.members - usernames, usernames - self.members
+
+    def __contains__(self, username: str) -> bool:
+        """
+        Checks if a user follows the channel.
+        """
+
+        return username in self.members
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Iterates over the followers.
+        """
+
+        return iter(self.members)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of followers.
+        """
+
+        return len(self.members)
@@ -1,3 +1,5 @@
+from modules.allocator import IdAllocator
+from modules.batch import BatchWriter
 from modules.logger import Logger
 
 from twitchio import Message as TwitchMessage
@@ -30,6 +32,71 @@ class MessageCog(commands.Cog):
         self.connection = connection
         self.logger = Logger(__name__)
         self.message = None  # Msg
+        self.ids = IdAllocator(connection, "message")
+        self.writer = BatchWriter(
+            connection,
+            """
+            INSERT INTO message(
+                id,
+                author,
+                content,
+                timestamp,
+                channel,
+                is_bot,
+                is_command,
+                is_subscriber,
+                is_vip,
+                is_mod,
+                is_turbo
+            )
+            VALUES (
+                :id,
+                :author,
+                :content,
+                :timestamp,
+                :channel,
+                :is_bot,
+                :is_command,
+                :is_subscriber,
+                :is_vip,
+                :is_mod,
+                :is_turbo
+            )
+            """,
+            batch_size=200,
+            flush_interval=1.0,
+        )
+
+    async def __ainit__(self) -> None:
+        """
+        Seeds the message ids and starts the message writer.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        await self.ids.seed()
+        self.writer.start()
+
+    async def __aclose__(self) -> None:
+        """
+        Flushes the pending messages and stops the message writer.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        await self.writer.close()
 
     async def set(self, message: TwitchMessage, bot) -> None:
         """
@@ -47,7 +114,7 @@ class MessageCog(commands.Cog):
 
         # Automatically set the message object with the new ID
         self.message = Msg(
-            id = await self.get_last_id() + 1,
+            id=self.ids.next(),
             author=(
                 message.author.name.lower() if message.author else bot.bot_name.lower()
             ),
@@ -97,7 +164,7 @@ class MessageCog(commands.Cog):
 
     async def add_message(self, message: TwitchMessage, bot) -> None:
         """
-        Adds a message to the database.
+        Adds a message to the write buffer, it is stored with the next batch.
 
         Parameters
         ----------
@@ -111,34 +178,9 @@ class MessageCog(commands.Cog):
 
         await self.set(message, bot)
 
-        await self.connection.execute(
-            """
-            INSERT INTO message(
-                author,
-                content,
-                timestamp,
-                channel,
-                is_bot,
-                is_command,
-                is_subscriber,
-                is_vip,
-                is_mod,
-                is_turbo
-            )
-            VALUES (
-                :author,
-                :content,
-                :timestamp,
-                :channel,
-                :is_bot,
-                :is_command,
-                :is_subscriber,
-                :is_vip,
-                :is_mod,
-                :is_turbo
-            )
-            """,
+        await self.writer.put(
             {
+                "id": self.message.id,
                 "author": self.message.author,
                 "content": self.message.content,
                 "timestamp": self.message.timestamp,
@@ -149,7 +191,7 @@ class MessageCog(commands.Cog):
                 "is_vip": self.message.is_vip,
                 "is_mod": self.message.is_mod,
                 "is_turbo": self.message.is_turbo,
-            },
+            }
         )
 
     async def get_last_id(self) -> int:
@@ -0,0 +1,247 @@
+from modules.logger import Logger
+
+import aiosqlite
+
+
+# Schema changes applied on top of the CREATE TABLE statements of the cogs.
+# Every database file stores the number of the last migration it received in
+# PRAGMA user_version, new migrations must be appended with the next number.
+# Migrations removing duplicate rows keep the oldest one, the coins of
+# duplicate users and the uses of duplicate commands are added to it first.
+# The other columns of the duplicates are dropped.
+MIGRATIONS = {
+    "cmd": [
+        (
+            1,
+            "unique command names",
+            """
+            UPDATE cmd
+            SET used = (SELECT SUM(used) FROM cmd AS duplicate WHERE duplicate.name = cmd.name)
+            WHERE id IN (SELECT MIN(id) FROM cmd GROUP BY name HAVING COUNT(*) > 1);
+            DELETE FROM cmd WHERE id NOT IN (SELECT MIN(id) FROM cmd GROUP BY name);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_cmd_name ON cmd (name);
+            """,
+        ),
+        (
+            2,
+            "hourly usage counters",
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                hour INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (kind, name, hour)
+            ) WITHOUT ROWID;
+            """,
+        ),
+        # The uses counted before the usage table existed go to hour 0
+        (
+            3,
+            "command uses counted in the usage table only",
+            """
+            INSERT INTO usage (kind, name, hour, count)
+            SELECT 'cmd', name, 0, used - counted FROM (
+                SELECT name, used, COALESCE(
+                    (SELECT SUM(count) FROM usage WHERE kind = 'cmd' AND usage.name = cmd.name), 0
+                ) AS counted
+                FROM cmd
+            )
+            WHERE used > counted
+            ON CONFLICT (kind, name, hour) DO UPDATE SET count = count + excluded.count;
+            """,
+        ),
+    ],
+    "games": [
+        (
+            1,
+            "index rpg events by rpg",
+            """
+            CREATE INDEX IF NOT EXISTS idx_rpg_event_rpg_id ON rpg_event (rpg_id);
+            """,
+        ),
+    ],
+    "message": [
+        (
+            1,
+            "index messages by author and timestamp",
+            """
+            CREATE INDEX IF NOT EXISTS idx_message_author ON message (author);
+            CREATE INDEX IF NOT EXISTS idx_message_timestamp ON message (timestamp);
+            """,
+        ),
+    ],
+    "sfx": [
+        (
+            1,
+            "unique sfx event names",
+            """
+            DELETE FROM sfx_event WHERE id NOT IN (SELECT MIN(id) FROM sfx_event GROUP BY name);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_sfx_event_name ON sfx_event (name);
+            CREATE INDEX IF NOT EXISTS idx_sfx_event_group_id ON sfx_event (group_id);
+            """,
+        ),
+        (
+            2,
+            "sfx group playback priority",
+            """
+            ALTER TABLE sfx_groups ADD COLUMN priority INTEGER NOT NULL DEFAULT 0;
+            """,
+        ),
+    ],
+    "user": [
+        (
+            1,
+            "unique usernames",
+            """
+            UPDATE users
+            SET income = (SELECT SUM(income) FROM users AS duplicate WHERE duplicate.username = users.username)
+            WHERE id IN (SELECT MIN(id) FROM users GROUP BY username HAVING COUNT(*) > 1);
+            DELETE FROM users WHERE id NOT IN (SELECT MIN(id) FROM users GROUP BY username);
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_users_username ON users (username);
+            """,
+        ),
+        (
+            2,
+            "coin ledger and balance snapshots",
+            """
+            CREATE TABLE IF NOT EXISTS ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                delta INTEGER NOT NULL,
+                reason TEXT NOT NULL,
+                game TEXT,
+                timestamp REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_ledger_username ON ledger (username, id);
+            CREATE TABLE IF NOT EXISTS balance_snapshot (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ledger_id INTEGER NOT NULL,
+                timestamp REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS balance_snapshot_entry (
+                snapshot_id INTEGER NOT NULL,
+                username TEXT NOT NULL,
+                balance INTEGER NOT NULL,
+                PRIMARY KEY (snapshot_id, username)
+            ) WITHOUT ROWID;
+            INSERT INTO ledger (username, delta, reason, game, timestamp)
+            SELECT username, income, 'opening', NULL, CAST(strftime('%s', 'now') AS REAL)
+            FROM users WHERE income != 0;
+            """,
+        ),
+        (
+            3,
+            "follower sync state",
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                name TEXT PRIMARY KEY,
+                value TEXT,
+                updated REAL NOT NULL
+            );
+            """,
+        ),
+        (
+            4,
+            "persisted follow dates",
+            """
+            CREATE TABLE IF NOT EXISTS followdate (
+                username TEXT PRIMARY KEY,
+                followdate TEXT NOT NULL,
+                fetched REAL NOT NULL
+            );
+            """,
+        ),
+    ],
+}
+
+
+class Migrator:
+    def __init__(self, connection: aiosqlite.Connection, name: str) -> None:
+        """
+        Initializes a new migrator object.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database.
+        name : str
+            The name of the database, as used in MIGRATIONS.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.name = name
+        self.logger = Logger(__name__)
+
+    async def get_version(self) -> int:
+        """
+        Gets the schema version of the database.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of the last migration applied.
+        """
+
+        async with self.connection.execute("PRAGMA user_version") as cursor:
+            row = await cursor.fetchone()
+
+        return row[0]
+
+    async def migrate(self) -> int:
+        """
+        Applies the migrations the database has not received yet.
+
+        Every migration runs in its own transaction together with the
+        version bump, a failing migration is rolled back and stops the
+        upgrade.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The schema version of the database after the upgrade.
+        """
+
+        version = await self.get_version()
+
+        # Finish any transaction left open, executescript would commit it anyway
+        await self.connection.commit()
+
+        for number, description, script in MIGRATIONS.get(self.name, []):
+            if number <= version:
+                continue
+
+            changes = self.connection.total_changes
+
+            try:
+                await self.connection.executescript(
+                    f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;"
+                )
+            except Exception as e:
+                if self.connection.in_transaction:
+                    await self.connection.execute("ROLLBACK")
+
+                self.logger.error(
+                    f"Migration {self.name} #{number} ({description}) failed: {e}"
+                )
+                raise
+
+            version = number
+            self.logger.info(
+                f"Migrated {self.name} to #{number}: {description} "
+                f"({self.connection.total_changes - changes} rows changed)."
+            )
+
+        return version
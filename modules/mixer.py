@@ -0,0 +1,270 @@
+from modules.logger import Logger
+
+from typing import Any, Callable
+
+import numpy as np
+import threading
+
+
+class Voice:
+    def __init__(self, mixer: "Mixer", done: Callable[[], Any] = None) -> None:
+        """
+        Initializes a new voice, one sound playing on a mixer at a time.
+
+        Parameters
+        ----------
+        mixer : Mixer
+            The mixer of the soundcard.
+        done : Callable[[], Any]
+            Called from the mixer thread once a sound ended or was stopped.
+
+        Returns
+        -------
+        None
+        """
+
+        self.mixer = mixer
+        self.samples = None
+        self.position = 0
+        self.gain = 1.0
+        self.done = done
+
+    def play(self, buffer, volume: float) -> None:
+        """
+        Starts a sound.
+
+        Parameters
+        ----------
+        buffer : Union[bytes, mmap.mmap]
+            The decoded samples, 16 bits stereo.
+        volume : float
+            The volume in percent.
+
+        Returns
+        -------
+        None
+        """
+
+        samples = np.frombuffer(buffer, dtype=np.int16)
+        self.samples = samples[: len(samples) - len(samples) % self.mixer.channels].reshape(
+            -1, self.mixer.channels
+        )
+        self.position = 0
+        self.gain = max(0, volume) / 100
+        self.mixer.add(self)
+
+    def stop(self) -> None:
+        """
+        Ends the sound at the next block.
+        """
+
+        self.position = len(self.samples) if self.samples is not None else 0
+
+
+class Mixer:
+    def __init__(
+        self,
+        open_stream: Callable[[], Any],
+        channels: int = 2,
+        rate: int = 48000,
+        block: int = 960,
+        release: float = 0.2,
+    ) -> None:
+        """
+        Initializes a new software mixer.
+
+        Every playing voice of a soundcard is summed into one block of
+        samples, written to a single output stream by one thread. Blocks have
+        a fixed size, the blocking write of the stream paces the thread, so
+        a new sound starts within one block. A limiter lowers the gain of a
+        block that would clip and lets it come back slowly.
+
+        Parameters
+        ----------
+        open_stream : Callable[[], Any]
+            Opens the output stream, it must have write(bytes) and close().
+        channels : int
+            The number of channels.
+        rate : int
+            The sample rate.
+        block : int
+            The number of frames per block, 960 is 20 ms at 48 kHz.
+        release : float
+            How fast the limiter gain comes back to 1, per block.
+
+        Returns
+        -------
+        None
+        """
+
+        self.open_stream = open_stream
+        self.channels = channels
+        self.rate = rate
+        self.block = block
+        self.release = release
+        self.logger = Logger(__name__)
+
+        self.limiter_gain = 1.0
+        self.blocks = 0
+        self.limited = 0
+
+        self.voices = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closing = False
+        self._thread = None
+        self._stream = None
+
+    def add(self, voice: Voice) -> None:
+        """
+        Adds a voice to the mix and starts the mixer thread if needed.
+
+        Parameters
+        ----------
+        voice : Voice
+            The voice.
+
+        Returns
+        -------
+        None
+        """
+
+        with self._lock:
+            if voice not in self.voices:
+                self.voices.append(voice)
+
+        if self._thread is None or not self._thread.is_alive():
+            self._closing = False
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+        self._wakeup.set()
+
+    def mix(self) -> bytes:
+        """
+        Mixes the next block of every voice.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        bytes
+            The block, None if no voice is playing.
+        """
+
+        with self._lock:
+            voices = list(self.voices)
+
+        if not voices:
+            return None
+
+        block = np.zeros((self.block, self.channels), dtype=np.float32)
+        ended = []
+
+        for voice in voices:
+            frames = voice.samples[voice.position : voice.position + self.block]
+            block[: len(frames)] += frames * np.float32(voice.gain)
+            voice.position += len(frames)
+
+            if voice.position >= len(voice.samples):
+                ended.append(voice)
+
+        if ended:
+            with self._lock:
+                self.voices = [voice for voice in self.voices if voice not in ended]
+
+        peak = float(np.abs(block).max())
+        target = min(1.0, 32767.0 / peak) if peak > 0 else 1.0
+
+        if target < self.limiter_gain:
+            self.limiter_gain = target
+            self.limited += 1
+        else:
+            self.limiter_gain += (target - self.limiter_gain) * self.release
+
+        block *= np.float32(self.limiter_gain)
+        np.clip(block, -32768, 32767, out=block)
+        self.blocks += 1
+
+        for voice in ended:
+            if voice.done is not None:
+                voice.done()
+
+        return block.astype(np.int16).tobytes()
+
+    def metrics(self) -> dict:
+        """
+        Gets the state of the mixer.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            The number of playing voices, mixed and limited blocks and the
+            current limiter gain.
+        """
+
+        return {
+            "voices": len(self.voices),
+            "blocks": self.blocks,
+            "limited": self.limited,
+            "limiter_gain": round(self.limiter_gain, 3),
+        }
+
+    def close(self) -> None:
+        """
+        Stops the mixer thread and closes the output stream.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self._closing = True
+        self._wakeup.set()
+
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        """
+        Writes the mixed blocks until the mixer is closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        try:
+            while not self._closing:
+                data = self.mix()
+
+                if data is None:
+                    self._wakeup.wait()
+                    self._wakeup.clear()
+                    continue
+
+                if self._stream is None:
+                    self._stream = self.open_stream()
+
+                self._stream.write(data)
+        except Exception as e:
+            self.logger.error(f"Error in the mixer: {e}")
+        finally:
+            if self._stream is not None:
+                self._stream.close()
+                self._stream = None
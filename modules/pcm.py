@@ -0,0 +1,223 @@
+from modules.logger import Logger
+
+from collections import OrderedDict
+
+import asyncio
+import mmap
+import os
+import shutil
+
+
+class PCMCache:
+    CHANNELS = 2
+    RATE = 48000
+
+    def __init__(
+        self,
+        directory: str = "data/cache/pcm",
+        budget: int = 128 * 1024 * 1024,
+        ffmpeg: str = None,
+    ) -> None:
+        """
+        Initializes a new decoded audio cache.
+
+        Sound files are decoded once by ffmpeg to raw 16 bits stereo PCM at
+        48 kHz, the format the mixer expects, and saved next to the
+        other caches under their content hash. Decoded files are memory
+        mapped, the samples stay in the page cache instead of the Python
+        heap, and the least recently played ones are unmapped once the
+        mapped size goes over budget.
+
+        Parameters
+        ----------
+        directory : str
+            The directory of the decoded files.
+        budget : int
+            The maximum number of mapped bytes.
+        ffmpeg : str
+            The ffmpeg executable, found in the PATH by default.
+
+        Returns
+        -------
+        None
+        """
+
+        self.directory = directory
+        self.budget = budget
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.logger = Logger(__name__)
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.entries = OrderedDict()  # key -> mmap.mmap
+        self._inflight = {}  # key -> asyncio.Task
+
+    def path(self, key: str) -> str:
+        """
+        Returns the path of the decoded file of a key.
+        """
+
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    async def get(self, key: str, source: str) -> mmap.mmap:
+        """
+        Gets the decoded samples of a sound, decoding it if needed.
+
+        Parameters
+        ----------
+        key : str
+            The content hash of the sound file.
+        source : str
+            The path of the sound file.
+
+        Returns
+        -------
+        mmap.mmap
+            The decoded samples.
+        """
+
+        buffer = self.entries.get(key)
+        if buffer is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return buffer
+
+        self.misses += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._load(key, source))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        return await asyncio.shield(task)
+
+    async def warm(self, sources: dict[str, str]) -> int:
+        """
+        Decodes and maps sounds ahead of their first use.
+
+        Parameters
+        ----------
+        sources : dict[str, str]
+            The path of the sound file by content hash, the most important
+            sounds first.
+
+        Returns
+        -------
+        int
+            The number of sounds in the cache.
+        """
+
+        for key, source in sources.items():
+            try:
+                await self.get(key, source)
+            except Exception as e:
+                self.logger.error(f"Error while decoding {source}: {e}")
+
+            if self.size >= self.budget:
+                break
+
+        return len(self.entries)
+
+    def discard(self, key: str) -> None:
+        """
+        Unmaps a sound, the voices still reading it keep their mapping.
+
+        Parameters
+        ----------
+        key : str
+            The content hash of the sound file.
+
+        Returns
+        -------
+        None
+        """
+
+        buffer = self.entries.pop(key, None)
+        if buffer is not None:
+            self.size -= len(buffer)
+
+    async def _load(self, key: str, source: str) -> mmap.mmap:
+        """
+        Maps the decoded file of a sound, decoding it first if needed.
+        """
+
+        path = self.path(key)
+
+        # An empty file cannot be mapped, it is decoded again
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            await self._decode(source, path)
+
+        buffer = await asyncio.to_thread(self._map, path)
+
+        self.entries[key] = buffer
+        self.size += len(buffer)
+
+        # Dropping the reference is enough, the mapping is closed once the
+        # voices still reading it are done
+        while self.size > self.budget and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+        return buffer
+
+    async def _decode(self, source: str, path: str) -> None:
+        """
+        Decodes a sound file with ffmpeg, the result replaces path at once.
+        """
+
+        if self.ffmpeg is None:
+            raise RuntimeError("ffmpeg is required to decode sounds")
+
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{path}.tmp"
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg,
+                "-y",
+                "-i",
+                source,
+                "-loglevel",
+                "panic",
+                "-vn",
+                "-f",
+                "s16le",
+                "-ac",
+                str(self.CHANNELS),
+                "-ar",
+                str(self.RATE),
+                temporary,
+            )
+        except OSError as e:
+            raise RuntimeError(f"ffmpeg could not be started: {e}")
+
+        if await process.wait() != 0:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise RuntimeError(f"ffmpeg could not decode {source}")
+
+        if not os.path.exists(temporary) or os.path.getsize(temporary) == 0:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise RuntimeError(f"ffmpeg decoded no samples from {source}")
+
+        os.replace(temporary, path)
+        self.logger.debug(f"Decoded {source} -> {path}")
+
+    @staticmethod
+    def _map(path: str) -> mmap.mmap:
+        """
+        Maps a decoded file read only, runs in a worker thread.
+        """
+
+        with open(path, "rb") as file:
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of mapped sounds.
+        """
+
+        return len(self.entries)
@@ -0,0 +1,274 @@
+from modules.logger import Logger
+
+from collections import deque
+from enum import Enum
+from typing import Any, Callable
+
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class Policy(str, Enum):
+    DROP = "drop"
+    QUEUE = "queue"
+    REPLACE = "replace"
+
+
+class Lane:
+    def __init__(self, name: str) -> None:
+        """
+        Initializes the players of one output device.
+
+        Parameters
+        ----------
+        name : str
+            The name of the device.
+
+        Returns
+        -------
+        None
+        """
+
+        self.name = name
+        self.free = deque()
+        self.busy = {}  # id(player) -> (player, started, priority)
+        self.waiters = []  # (priority, sequence, future)
+        self.created = 0
+
+
+class PlaybackScheduler:
+    def __init__(
+        self,
+        factory: Callable[[str], Any],
+        size: int = 20,
+        max_queue: int = 20,
+        max_wait: float = 10.0,
+        policy: Policy = Policy.QUEUE,
+    ) -> None:
+        """
+        Initializes a new playback scheduler.
+
+        Every soundcard has its own lane of players, created on demand up to
+        size and kept in a free list, so taking and giving back a player is
+        O(1). When every player of a lane is busy the policy decides: DROP
+        the new play, QUEUE it until a player is released, or REPLACE the
+        oldest play of the same or a lower priority. Waiting plays are served
+        by priority, lower values first, then in arrival order.
+
+        Parameters
+        ----------
+        factory : Callable[[str], Any]
+            Creates a player for a lane.
+        size : int
+            The maximum number of players per lane.
+        max_queue : int
+            The maximum number of waiting plays per lane.
+        max_wait : float
+            The time in seconds a play waits for a player before it is
+            dropped.
+        policy : Policy
+            What to do when every player of a lane is busy.
+
+        Returns
+        -------
+        None
+        """
+
+        self.factory = factory
+        self.size = size
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.policy = Policy(policy)
+        self.logger = Logger(__name__)
+
+        self.lanes = {}
+
+        self.played = 0
+        self.queued = 0
+        self.dropped = 0
+        self.replaced = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        self._sequence = itertools.count()
+
+    def lane(self, name: str) -> Lane:
+        """
+        Gets the lane of a soundcard, creating it on first use.
+        """
+
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = self.lanes[name] = Lane(name)
+        return lane
+
+    async def acquire(self, name: str, priority: int = 0) -> Any:
+        """
+        Takes a player of a lane.
+
+        Parameters
+        ----------
+        name : str
+            The soundcard.
+        priority : int
+            The priority of the play, lower values go first.
+
+        Returns
+        -------
+        Any
+            The player, None if the play is dropped.
+        """
+
+        lane = self.lane(name)
+
+        player = self._take(lane)
+        if player is not None:
+            return self._start(lane, player, priority, 0.0)
+
+        if self.policy == Policy.DROP:
+            return self._drop(lane, "no player left")
+
+        if self.policy == Policy.REPLACE:
+            victim = self._victim(lane, priority)
+            if victim is None:
+                return self._drop(lane, "no play to replace")
+
+            # The stopped player is handed over as soon as its thread ends
+            victim.stop()
+            lane.busy[id(victim)] = (victim, float("inf"), -1)
+            self.replaced += 1
+            priority = -1
+
+        if len(lane.waiters) >= self.max_queue:
+            return self._drop(lane, "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (priority, next(self._sequence), future)
+        heapq.heappush(lane.waiters, waiter)
+        self.queued += 1
+        start = time.monotonic()
+
+        try:
+            player = await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # Released to this play in the meantime, pass it on
+                self.release(name, future.result())
+            else:
+                future.cancel()
+                lane.waiters.remove(waiter)
+                heapq.heapify(lane.waiters)
+
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return self._drop(lane, "waited too long")
+
+        return self._start(lane, player, priority, time.monotonic() - start)
+
+    def release(self, name: str, player: Any) -> None:
+        """
+        Gives a player back once its play is over.
+
+        Parameters
+        ----------
+        name : str
+            The soundcard.
+        player : Any
+            The player.
+
+        Returns
+        -------
+        None
+        """
+
+        lane = self.lane(name)
+        lane.busy.pop(id(player), None)
+
+        while lane.waiters:
+            _, _, future = heapq.heappop(lane.waiters)
+            if not future.done():
+                future.set_result(player)
+                return
+
+        lane.free.append(player)
+
+    def metrics(self) -> dict:
+        """
+        Gets the state of the players and the counters.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        dict
+            The busy, free and waiting counts of every lane and the counters.
+        """
+
+        return {
+            "lanes": {
+                name: {
+                    "busy": len(lane.busy),
+                    "free": len(lane.free),
+                    "waiting": len(lane.waiters),
+                }
+                for name, lane in self.lanes.items()
+            },
+            "played": self.played,
+            "queued": self.queued,
+            "dropped": self.dropped,
+            "replaced": self.replaced,
+            "wait_average": self.wait_total / self.queued if self.queued else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+    def _take(self, lane: Lane) -> Any:
+        """
+        Takes a free player, creating one if the lane is not full.
+        """
+
+        if lane.free:
+            return lane.free.popleft()
+
+        if lane.created < self.size:
+            lane.created += 1
+            return self.factory(lane.name)
+
+        return None
+
+    def _start(self, lane: Lane, player: Any, priority: int, waited: float) -> Any:
+        """
+        Marks a player as busy.
+        """
+
+        lane.busy[id(player)] = (player, time.monotonic(), priority)
+        self.played += 1
+
+        if waited:
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+        return player
+
+    def _victim(self, lane: Lane, priority: int) -> Any:
+        """
+        Finds the oldest play of the same or a lower priority.
+        """
+
+        victims = [entry for entry in lane.busy.values() if entry[2] >= priority]
+        if not victims:
+            return None
+
+        return min(victims, key=lambda entry: entry[1])[0]
+
+    def _drop(self, lane: Lane, reason: str) -> None:
+        """
+        Counts a dropped play.
+        """
+
+        self.dropped += 1
+        self.logger.debug(f"Dropped a play on {lane.name}: {reason}.")
+        return None
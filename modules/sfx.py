@@ -1,7 +1,10 @@
+import asyncio
 import hashlib
+import math
 import zipfile
 import aiosqlite
 import os
+import pyaudio
 
 from pathlib import Path
 from contextlib import closing
@@ -9,7 +12,12 @@ from dataclasses import Field, asdict, dataclass
 
 from twitchio.ext import sounds, commands
 
+from modules.database import transaction
 from modules.logger import Logger
+from modules.loudness import LoudnessIndex
+from modules.mixer import Mixer, Voice
+from modules.pcm import PCMCache
+from modules.playback import PlaybackScheduler
 
 
 @dataclass
@@ -42,6 +50,7 @@ class SFXGroup:
     category: str
     description: str
     status: bool
+    priority: int = 0
 
 
 class SFXCog(commands.Cog):
@@ -50,11 +59,18 @@ class SFXCog(commands.Cog):
         self.logger = Logger(__name__)
         self.bot = bot
         self.sfx = {}
+        self.pcm = PCMCache()
+        self.loudness = LoudnessIndex()
+        self.warm_task = None
+        self.play_tasks = set()
+        self.group_priorities = None
         # self.load_sfx()
 
         # init the sounds extension
-        self.player = sounds.AudioPlayer(callback=self.create_reset_player(0))
-        self.testings = [sounds.AudioPlayer(callback=self.create_reset_player(i)) for i in range(20)]
+        self.player = sounds.AudioPlayer(callback=self.player_done)
+        self.audio = pyaudio.PyAudio()
+        self.mixers = {}
+        self.playback = PlaybackScheduler(self.create_player)
 
     async def create_table(self):
         """
@@ -134,26 +150,85 @@ class SFXCog(commands.Cog):
         user = ctx.author.name.lower()
 
         if user not in self.bot.channel_members:
-            await ctx.send(f"{user} is not following the channel.")
+            await self.bot.say(f"{user} is not following the channel.")
             return
 
         self.logger.debug(f'SFX event named "{ctx.command.name}" called')
         sfx: SFXEvent = await self.get_sfx_event_by_name(ctx.command.name)
 
         if len(ctx.message.content.split()) != 1:
-            await ctx.send(f"Usage: !{sfx.name}")
+            await self.bot.say(f"Usage: !{sfx.name}")
             return
 
-        i = await self.get_available_player()
-        self.logger.debug(f"Player {i} is available")
-        await self.play_sfx(sfx, self.testings[i])
+        remaining = self.bot.cooldowns.check(user, "sfx", sfx.cooldown)
+        if remaining:
+            await self.bot.say(f"{user} can play a sound again in {math.ceil(remaining)}s.")
+            return
+
+        # Waiting for a free player can take up to max_wait seconds, the chat
+        # handler returns at once
+        task = asyncio.create_task(self.queue_sfx(user, sfx))
+        self.play_tasks.add(task)
+        task.add_done_callback(self.play_tasks.discard)
+
+    async def queue_sfx(self, user: str, sfx: SFXEvent) -> None:
+        """
+        Waits for a player of the soundcard of a sfx event and plays it.
+
+        Parameters
+        ----------
+        user : str
+            The user who played the sound.
+        sfx : SFXEvent
+            The sfx event.
 
+        Returns
+        -------
+        None
+        """
 
-    async def get_available_player(self):
-        for i, player in enumerate(self.testings):
-            if not player._playing:
-                return i
-        return 0
+        priority = await self.get_group_priority(sfx.group_id)
+        player = await self.playback.acquire(sfx.soundcard, priority)
+        if player is None:
+            self.bot.cooldowns.reset(user, "sfx")
+            await self.bot.say(f"Too many sounds are playing, {sfx.name} was skipped.")
+            return
+
+        try:
+            await self.play_sfx(sfx, player)
+        except Exception as e:
+            self.playback.release(sfx.soundcard, player)
+            self.bot.cooldowns.reset(user, "sfx")
+            self.logger.error(f"Error while playing {sfx.name}: {e}")
+            return
+
+        self.bot.counters.hit("sfx", sfx.name)
+
+
+    async def player_done(self) -> None:
+        """
+        Called when the player listing the soundcards is done, never plays.
+        """
+
+    async def get_group_priority(self, group_id: int) -> int:
+        """
+        Gets the playback priority of a sfx group.
+
+        Parameters
+        ----------
+        group_id : int
+            The id of the group.
+
+        Returns
+        -------
+        int
+            The priority, lower values play first.
+        """
+        if self.group_priorities is None:
+            async with self.connection.execute("SELECT id, priority FROM sfx_groups") as cursor:
+                self.group_priorities = dict(await cursor.fetchall())
+
+        return self.group_priorities.get(group_id, 0)
 
 
     """
@@ -184,10 +259,6 @@ class SFXCog(commands.Cog):
         return zip_file_path
 
     async def import_sfx_full_config(self, zip_file_path):
-        # Erase the current profile
-        await self.connection.execute("DELETE FROM sfx")
-        await self.connection.commit()
-
         # Extract the zip file
         with closing(zipfile.ZipFile(zip_file_path, "r")) as zip_file:
             # Extract the sound files
@@ -196,8 +267,9 @@ class SFXCog(commands.Cog):
             # Read the SQL table data from the zip file
             table_data = zip_file.read("sfx_table.csv").decode("utf-8")
 
-        # Insert the SQL table data into the database
-        async with self.connection.cursor() as cursor:
+        # Replace the current profile with the SQL table data in one go
+        async with transaction(self.connection), self.connection.cursor() as cursor:
+            await cursor.execute("DELETE FROM sfx")
             for line in table_data.split("\n"):
                 if line:
                     values = line.split(",")
@@ -212,7 +284,6 @@ class SFXCog(commands.Cog):
                             values[6],
                         ),
                     )
-            await self.connection.commit()
 
     """
 
@@ -226,20 +297,20 @@ class SFXCog(commands.Cog):
         if check.get("error"):
             return check
 
-        await self.connection.execute(
-            "INSERT INTO sfx_event (sfx_id, group_id, name, file, volume, cost, cooldown, soundcard) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                sfxevent["sfx_id"],
-                sfxevent["sfx_group_id"],
-                sfxevent["name"],
-                sfxevent["file"],
-                sfxevent["volume"],
-                sfxevent["cost"],
-                sfxevent["cooldown"],
-                sfxevent["soundcard"],
-            ),
-        )
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(
+                "INSERT INTO sfx_event (sfx_id, group_id, name, file, volume, cost, cooldown, soundcard) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    sfxevent["sfx_id"],
+                    sfxevent["sfx_group_id"],
+                    sfxevent["name"],
+                    sfxevent["file"],
+                    sfxevent["volume"],
+                    sfxevent["cost"],
+                    sfxevent["cooldown"],
+                    sfxevent["soundcard"],
+                ),
+            )
 
         sfxevent = SFXEvent(
             await self.get_last_sfx_id(),
@@ -292,7 +363,7 @@ class SFXCog(commands.Cog):
         if check.get("error"):
             return check
 
-        async with self.connection.cursor() as cursor:
+        async with transaction(self.connection), self.connection.cursor() as cursor:
             await cursor.execute(
                 "UPDATE sfx_event SET volume = ?, cost = ?, cooldown = ?, soundcard = ? WHERE name = ?",
                 (
@@ -303,7 +374,6 @@ class SFXCog(commands.Cog):
                     sfx["name"],
                 ),
             )
-            await self.connection.commit()
 
         return {"success": "SFX Event updated successfully"}
 
@@ -362,8 +432,8 @@ class SFXCog(commands.Cog):
 
     async def delete_sfx_event(self, msg):
         name = msg["name"]
-        await self.connection.execute("DELETE FROM sfx_event WHERE id = ?", (name,))
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute("DELETE FROM sfx_event WHERE id = ?", (name,))
 
         return {"success": "SFX Event deleted successfully"}
 
@@ -379,12 +449,11 @@ class SFXCog(commands.Cog):
             value = list(self.player.devices.values())[0].name
         else:
             value = self.player.active_device
-        async with self.connection.cursor() as cursor:
+        async with transaction(self.connection), self.connection.cursor() as cursor:
             await cursor.execute(
                 "INSERT INTO sfx (id, group_id, volume, cost, cooldown, soundcard) VALUES (?, ?, ?, ?, ?, ?)",
                 (await self.get_last_sfx_id() + 1, group_id, 50, 0, 0, value),
             )
-            await self.connection.commit()
 
         return {"success": "SFX added successfully"}
 
@@ -393,7 +462,7 @@ class SFXCog(commands.Cog):
         if check.get("error"):
             return check
 
-        async with self.connection.cursor() as cursor:
+        async with transaction(self.connection), self.connection.cursor() as cursor:
             await cursor.execute(
                 "UPDATE sfx SET volume = ?, cost = ?, cooldown = ?, soundcard = ? WHERE id = ?",
                 (
@@ -404,7 +473,6 @@ class SFXCog(commands.Cog):
                     sfx["id"],
                 ),
             )
-            await self.connection.commit()
 
         return {"success": "SFX updated successfully"}
 
@@ -467,9 +535,8 @@ class SFXCog(commands.Cog):
 
     async def delete_sfx(self, msg):
         name = msg["name"]
-        async with self.connection.cursor() as cursor:
+        async with transaction(self.connection), self.connection.cursor() as cursor:
             await cursor.execute("DELETE FROM sfx WHERE name = ?", (name,))
-            await self.connection.commit()
 
         return {"success": "SFX deleted successfully"}
 
@@ -484,23 +551,29 @@ class SFXCog(commands.Cog):
 
         id = await self.get_last_sfx_group_id() + 1
 
-        async with self.connection.cursor() as cursor:
-            await cursor.execute(
-                "INSERT INTO sfx_groups (id, name, category, description, status) VALUES (?, ?, ?, ?, ?)",
-                (
-                    id,
-                    sfxgroup["name"],
-                    sfxgroup["category"],
-                    sfxgroup["description"],
-                    1,
-                ),
-            )
-            await self.connection.commit()
+        # The group and its base sfx are created together or not at all
+        try:
+            async with transaction(self.connection):
+                await self.connection.execute(
+                    "INSERT INTO sfx_groups (id, name, category, description, status, priority) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        id,
+                        sfxgroup["name"],
+                        sfxgroup["category"],
+                        sfxgroup["description"],
+                        1,
+                        int(sfxgroup.get("priority") or 0),
+                    ),
+                )
 
-        result = await self.add_sfx(id)
-        if result.get("error"):
-            return result
+                result = await self.add_sfx(id)
+                if result.get("error"):
+                    # Raising rolls the group back
+                    raise ValueError(result["error"])
+        except ValueError as e:
+            return {"error": str(e)}
 
+        self.group_priorities = None
         return {"success": "SFX Group added successfully"}
 
     async def check_sfxgroup_dict(self, sfxgroup: dict):
@@ -512,6 +585,8 @@ class SFXCog(commands.Cog):
             return {"error": "Category is required"}
         if not sfxgroup["description"]:
             return {"error": "Description is required"}
+        if not str(sfxgroup.get("priority") or 0).lstrip("-").isdigit():
+            return {"error": "Priority must be a number"}
 
         return {"success": "All values are valid"}
 
@@ -541,18 +616,12 @@ class SFXCog(commands.Cog):
             id = await cursor.fetchone()
             id = id[0] if id else 1
 
-        async with self.connection.cursor() as cursor:
+        async with transaction(self.connection), self.connection.cursor() as cursor:
             await cursor.execute("DELETE FROM sfx_groups WHERE name = ?", (name,))
-            await self.connection.commit()
-
-        async with self.connection.cursor() as cursor:
             await cursor.execute("DELETE FROM sfx WHERE group_id = ?", (id,))
-            await self.connection.commit()
-
-        async with self.connection.cursor() as cursor:
             await cursor.execute("DELETE FROM sfx_event WHERE group_id = ?", (id,))
-            await self.connection.commit()
 
+        self.group_priorities = None
         return {"success": "SFX Group deleted successfully"}
 
     async def get_sfx_from_group_name(self, name) -> SFX:
@@ -583,17 +652,131 @@ class SFXCog(commands.Cog):
     
     """
 
-    async def play_sfx(self, sfx: SFXEvent, player: sounds.AudioPlayer):
+    async def play_sfx(self, sfx: SFXEvent, voice: Voice):
         self.logger.debug(f'Playing SFX event "{sfx.name}"')
         filepath = "data/sfx/" + sfx.file
-        sound = sounds.Sound(source=filepath)
+
+        buffer = await self.pcm.get(sfx.file, filepath)
+        gain = await self.loudness.gain(sfx.file)
+
         self.logger.debug(f"data/sfx/{sfx.file}")
-        player.volume = sfx.volume
-        player.play(sound)
-
-    def create_reset_player(self, i):
-        async def reset_player():
-            self.testings[i].volume = 100
-            self.testings[i].stop()
-            self.logger.debug("SFX Player done")
-        return reset_player
+        voice.play(buffer, sfx.volume * gain)
+
+    def start_warm_up(self, limit: int = 20) -> None:
+        """
+        Decodes the most played sounds in the background.
+
+        Parameters
+        ----------
+        limit : int
+            The maximum number of sounds to decode.
+
+        Returns
+        -------
+        None
+        """
+        if self.warm_task is None or self.warm_task.done():
+            self.warm_task = asyncio.create_task(self.warm_up(limit))
+
+    async def warm_up(self, limit: int = 20) -> int:
+        """
+        Decodes the most played sounds ahead of their first use.
+
+        Parameters
+        ----------
+        limit : int
+            The maximum number of sounds to decode.
+
+        Returns
+        -------
+        int
+            The number of sounds in the decoded audio cache.
+        """
+        usage = await self.bot.counters.totals("sfx")
+
+        async with self.connection.execute("SELECT name, file FROM sfx_event") as cursor:
+            events = await cursor.fetchall()
+
+        events.sort(key=lambda event: usage.get(event[0], 0), reverse=True)
+
+        sources = {}
+        for _, file in events:
+            if len(sources) >= limit:
+                break
+            sources.setdefault(file, f"data/sfx/{file}")
+
+        count = await self.pcm.warm(sources)
+        self.logger.info(f"Decoded audio cache warmed up with {count} sounds.")
+        return count
+
+    def create_player(self, soundcard: str) -> Voice:
+        """
+        Creates a voice of the playback scheduler.
+
+        Parameters
+        ----------
+        soundcard : str
+            The name of the output device, the default one if not found.
+
+        Returns
+        -------
+        Voice
+            The voice, given back to the scheduler when a play ends.
+        """
+        voice = None
+        loop = asyncio.get_running_loop()
+
+        def release_voice():
+            # Called from the mixer thread
+            loop.call_soon_threadsafe(self.playback.release, soundcard, voice)
+
+        voice = Voice(self.get_mixer(soundcard), release_voice)
+        return voice
+
+    def get_mixer(self, soundcard: str) -> Mixer:
+        """
+        Gets the mixer of a soundcard, every sound played on it shares its
+        output stream.
+
+        Parameters
+        ----------
+        soundcard : str
+            The name of the output device, the default one if not found.
+
+        Returns
+        -------
+        Mixer
+            The mixer.
+        """
+        mixer = self.mixers.get(soundcard)
+        if mixer is not None:
+            return mixer
+
+        index = None
+        for device in self.player.devices.values():
+            if device.name == soundcard:
+                index = device.index
+                break
+
+        def open_stream():
+            return self.audio.open(
+                format=pyaudio.paInt16,
+                channels=PCMCache.CHANNELS,
+                rate=PCMCache.RATE,
+                output=True,
+                output_device_index=index,
+                frames_per_buffer=960,
+            )
+
+        mixer = self.mixers[soundcard] = Mixer(
+            open_stream, channels=PCMCache.CHANNELS, rate=PCMCache.RATE
+        )
+        return mixer
+
+    def close_mixers(self) -> None:
+        """
+        Stops every mixer and closes their output streams.
+        """
+        for mixer in self.mixers.values():
+            mixer.close()
+        self.mixers.clear()
@@ -0,0 +1,277 @@
+from modules.database import transaction
+from modules.logger import Logger
+
+from typing import Iterable
+
+import aiosqlite
+import hashlib
+import time
+
+
+class FollowerSync:
+    def __init__(self, connection: aiosqlite.Connection, store, ledger) -> None:
+        """
+        Initializes a new follower sync engine.
+
+        The sync reads the flags of every user with one SELECT, computes the
+        users to add and the flags to change with set lookups, and writes
+        everything with a single bulk upsert. The result of the last sync is
+        kept in the sync_state table, so a sync with the same followers,
+        bots and mods is skipped without touching the users table.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the user database.
+        store : UserStore
+            The user store, kept in sync with the written flags.
+        ledger : Ledger
+            The coin ledger, receiving the opening balance of new users.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.store = store
+        self.ledger = ledger
+        self.logger = Logger(__name__)
+
+    async def get_state(self, name: str) -> str:
+        """
+        Gets a value saved by a previous sync.
+
+        Parameters
+        ----------
+        name : str
+            The name of the value.
+
+        Returns
+        -------
+        str
+            The value, None if it was never saved.
+        """
+
+        async with self.connection.execute(
+            "SELECT value FROM sync_state WHERE name = ?", (name,)
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        return row[0] if row else None
+
+    async def set_state(self, name: str, value: str) -> None:
+        """
+        Saves a value for the next sync.
+
+        Parameters
+        ----------
+        name : str
+            The name of the value.
+        value : str
+            The value, None to forget it.
+
+        Returns
+        -------
+        None
+        """
+
+        async with transaction(self.connection):
+            if value is None:
+                await self.connection.execute(
+                    "DELETE FROM sync_state WHERE name = ?", (name,)
+                )
+            else:
+                await self.connection.execute(
+                    """
+                    INSERT INTO sync_state (name, value, updated) VALUES (?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET value = excluded.value, updated = excluded.updated
+                    """,
+                    (name, value, time.time()),
+                )
+
+    async def sync(
+        self,
+        members: Iterable[str],
+        bots: Iterable[str],
+        mods: Iterable[str],
+        income: int,
+        force: bool = False,
+    ) -> dict:
+        """
+        Brings the users table in line with the followers of the channel.
+
+        Followers missing from the table are added, the follower flag of the
+        others is set or cleared, and known bots and mods are flagged.
+
+        Parameters
+        ----------
+        members : Iterable[str]
+            The followers of the channel.
+        bots : Iterable[str]
+            The known bots.
+        mods : Iterable[str]
+            The mods of the channel.
+        income : int
+            The balance of the new users.
+        force : bool
+            If True, the sync runs even if nothing changed since the last one.
+
+        Returns
+        -------
+        dict
+            The number of users added and updated, and whether the sync was
+            skipped.
+        """
+
+        start = time.perf_counter()
+        members, bots, mods = set(members), set(bots), set(mods)
+
+        digest = hashlib.sha1()
+        for name, usernames in (("members", members), ("bots", bots), ("mods", mods)):
+            digest.update(name.encode())
+            for username in sorted(usernames):
+                digest.update(b"\0" + username.encode())
+        digest = digest.hexdigest()
+
+        if not force and await self.get_state("followers_digest") == digest:
+            self.logger.debug("Followers unchanged since the last sync.")
+            return {"added": 0, "updated": 0, "skipped": True}
+
+        await self.store.flush()
+
+        async with self.connection.execute(
+            "SELECT username, follower, bot, mod FROM users"
+        ) as cursor:
+            existing = {
+                username: (bool(follower), bool(bot), bool(mod))
+                for username, follower, bot, mod in await cursor.fetchall()
+            }
+
+        added = []
+        updated = []
+
+        for username in members:
+            if username not in existing:
+                added.append(self.new_user(username, income, username in bots, username in mods))
+
+        for username, flags in existing.items():
+            wanted = (
+                username in members,
+                flags[1] or username in bots,
+                flags[2] or username in mods,
+            )
+            if wanted != flags:
+                updated.append(
+                    {
+                        **self.new_user(username, income, wanted[1], wanted[2]),
+                        "follower": wanted[0],
+                    }
+                )
+
+        async def record():
+            await self.ledger.append(
+                [(row["username"], income, "opening", None) for row in added]
+            )
+
+        await self.store.upsert(added + updated, ["follower", "bot", "mod"], record)
+
+        await self.set_state("followers_digest", digest)
+
+        self.logger.info(
+            f"Synced {len(members)} followers: {len(added)} added, {len(updated)} updated "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms."
+        )
+        return {"added": len(added), "updated": len(updated), "skipped": False}
+
+    async def apply(
+        self, added: Iterable[str], removed: Iterable[str], income: int
+    ) -> int:
+        """
+        Applies a known change of followers without a full sync.
+
+        Parameters
+        ----------
+        added : Iterable[str]
+            The new followers.
+        removed : Iterable[str]
+            The users that stopped following.
+        income : int
+            The balance of the users that are not in the table yet.
+
+        Returns
+        -------
+        int
+            The number of users written.
+        """
+
+        added, removed = set(added), set(removed) - set(added)
+        if not added and not removed:
+            return 0
+
+        usernames = tuple(added | removed)
+        async with self.connection.execute(
+            f"SELECT username FROM users WHERE username IN ({', '.join('?' * len(usernames))})",
+            usernames,
+        ) as cursor:
+            known = {row[0] for row in await cursor.fetchall()}
+
+        # Existing users keep their balance, the upsert only touches the flag,
+        # and users that stopped following are not created
+        rows = [self.new_user(username, income) for username in added]
+        rows += [
+            {**self.new_user(username, income), "follower": False}
+            for username in removed & known
+        ]
+
+        async def record():
+            await self.ledger.append(
+                [(username, income, "opening", None) for username in added - known]
+            )
+
+        written = await self.store.upsert(rows, ["follower"], record)
+
+        # The saved digest no longer matches the users table
+        await self.set_state("followers_digest", None)
+        return written
+
+    @staticmethod
+    def new_user(
+        username: str, income: int, bot: bool = False, mod: bool = False
+    ) -> dict:
+        """
+        Builds the row of a new follower.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        income : int
+            The starting balance.
+        bot : bool
+            True if the user is a known bot.
+        mod : bool
+            True if the user is a mod.
+
+        Returns
+        -------
+        dict
+            The row, with every field of the users table but the id.
+        """
+
+        return {
+            "username": username,
+            "income": income,
+            "message_count": 0,
+            "bot": bot,
+            "follower": True,
+            "subscriber": False,
+            "mod": mod,
+            "gamble_lock": "unlocked",
+            "roll_lock": "unlocked",
+            "rpg_lock": "unlocked",
+            "sfx_lock": "unlocked",
+            "slots_lock": "unlocked",
+            "ban_time": None,
+            "warning": 0,
+        }
@@ -0,0 +1,232 @@
+from typing import Awaitable, Callable, Union
+
+import asyncio
+import dataclasses
+import random
+import re
+
+
+class TemplateError(ValueError):
+    def __init__(self, message: str, position: int) -> None:
+        """
+        Initializes a new template error.
+
+        Parameters
+        ----------
+        message : str
+            The description of the error.
+        position : int
+            The offset of the error in the template source.
+
+        Returns
+        -------
+        None
+        """
+
+        super().__init__(f"{message} (at character {position + 1})")
+        self.position = position
+
+
+class FetchError(TemplateError):
+    """
+    Raised when the body of a $url placeholder could not be fetched.
+    """
+
+
+@dataclasses.dataclass(frozen=True)
+class Literal:
+    text: str
+
+
+@dataclasses.dataclass(frozen=True)
+class Random:
+    low: int
+    high: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Url:
+    url: str
+    position: int = dataclasses.field(default=0, compare=False)
+
+
+Segment = Union[Literal, Random, Url]
+
+PLACEHOLDER = re.compile(r"\$(url|random)\(")
+
+
+class Template:
+    def __init__(self, source: str, segments: list[Segment]) -> None:
+        """
+        Initializes a compiled command template.
+
+        Parameters
+        ----------
+        source : str
+            The template source, i.e. the description of the command.
+        segments : list[Segment]
+            The literal segments and placeholders of the template.
+
+        Returns
+        -------
+        None
+        """
+
+        self.source = source
+        self.segments = segments
+
+    @classmethod
+    def compile(cls, source: str) -> "Template":
+        """
+        Parses a template source once.
+
+        The supported placeholders are $random(low, high), replaced by a
+        random integer between low and high, and $url(address), replaced by
+        the body of the page. Anything else is kept as is.
+
+        Parameters
+        ----------
+        source : str
+            The template source.
+
+        Returns
+        -------
+        Template
+            The compiled template.
+
+        Raises
+        ------
+        TemplateError
+            If a placeholder is not closed or its arguments are invalid.
+        """
+
+        segments = []
+        position = 0
+
+        for match in PLACEHOLDER.finditer(source):
+            # Placeholders nested in the arguments of a previous one
+            if match.start() < position:
+                continue
+
+            end = cls._find_closing(source, match.end(), match.start())
+
+            if match.start() > position:
+                segments.append(Literal(source[position : match.start()]))
+
+            argument = source[match.end() : end]
+            if match.group(1) == "url":
+                segments.append(cls._parse_url(argument, match.end()))
+            else:
+                segments.append(cls._parse_random(argument, match.end()))
+
+            position = end + 1
+
+        if position < len(source):
+            segments.append(Literal(source[position:]))
+
+        return cls(source, segments)
+
+    @staticmethod
+    def _find_closing(source: str, start: int, placeholder: int) -> int:
+        """
+        Finds the parenthesis closing a placeholder, nested ones included.
+        """
+
+        depth = 1
+        for index in range(start, len(source)):
+            if source[index] == "(":
+                depth += 1
+            elif source[index] == ")":
+                depth -= 1
+                if depth == 0:
+                    return index
+
+        raise TemplateError("unclosed placeholder", placeholder)
+
+    @staticmethod
+    def _parse_url(argument: str, position: int) -> Url:
+        """
+        Parses the argument of a $url placeholder.
+        """
+
+        url = argument.strip()
+        if not url.startswith(("http://", "https://")):
+            raise TemplateError(f"invalid url: {url!r}", position)
+
+        return Url(url, position)
+
+    @staticmethod
+    def _parse_random(argument: str, position: int) -> Random:
+        """
+        Parses the arguments of a $random placeholder.
+        """
+
+        values = [value.strip() for value in argument.split(",")]
+        if len(values) != 2:
+            raise TemplateError(
+                f"$random takes 2 arguments, {len(values)} given", position
+            )
+
+        try:
+            low, high = int(values[0]), int(values[1])
+        except ValueError:
+            raise TemplateError(f"invalid values: {argument}, must be integers", position)
+
+        if low > high:
+            raise TemplateError(f"invalid values: {low}, must be lower than {high}", position)
+
+        return Random(low, high)
+
+    @property
+    def is_static(self) -> bool:
+        """
+        Tells if the template renders to the same text every time.
+        """
+
+        return all(isinstance(segment, Literal) for segment in self.segments)
+
+    async def render(self, fetch: Callable[[str], Awaitable[str]]) -> str:
+        """
+        Renders the template.
+
+        The $url placeholders are fetched concurrently.
+
+        Parameters
+        ----------
+        fetch : Callable[[str], Awaitable[str]]
+            The coroutine function getting the body of a URL.
+
+        Returns
+        -------
+        str
+            The rendered text.
+
+        Raises
+        ------
+        FetchError
+            If a URL could not be fetched, e.g. a connection error or a
+            timeout.
+        """
+
+        async def get(segment: Url) -> str:
+            try:
+                return await fetch(segment.url)
+            except Exception as e:
+                raise FetchError(
+                    f"could not fetch {segment.url!r}: {str(e) or type(e).__name__}",
+                    segment.position,
+                ) from e
+
+        urls = [segment for segment in self.segments if isinstance(segment, Url)]
+        bodies = iter(await asyncio.gather(*(get(segment) for segment in urls)))
+
+        parts = []
+        for segment in self.segments:
+            if isinstance(segment, Literal):
+                parts.append(segment.text)
+            elif isinstance(segment, Random):
+                parts.append(str(random.randint(segment.low, segment.high)))
+            else:
+                parts.append(next(bodies).strip())
+
+        return "".join(parts)
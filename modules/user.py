@@ -1,15 +1,27 @@
+from modules.database import transaction
+from modules.ledger import Ledger
 from modules.logger import Logger
+from modules.members import ChannelMembers
+from modules.sync import FollowerSync
+from modules.bots import BotList
+from modules.cache import TTLCache
+from modules.cooldown import LOCK_COLUMNS
 from modules.channel import ChannelCog
+from modules.http import HttpClient
 
 from twitchio.ext import commands
 
 import os
-import aiohttp
+import asyncio
 import aiosqlite
-from dataclasses import dataclass
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from typing import Awaitable, Callable
 
 
-@dataclass
+@dataclass(slots=True)
 class User:
     # User settings
     id: int
@@ -35,13 +47,550 @@ class User:
     warning: int
 
 
+USER_FIELDS = [field.name for field in fields(User)]
+
+# DecAPI answers errors with a 200 and a plain text message. They are matched
+# from the start of the answer, so a game name containing "error" or
+# "invalid" is not taken for one
+DECAPI_ERROR = re.compile(
+    r"""
+    (?:user|channel)\ not\ found\b
+    | no\ user\ with\ the\ name\b
+    | an\ error\ occurred\b
+    | error\ from\ twitch\ api\b
+    | invalid\ (?:token|username|channel)\b
+    | a\ (?:user|username|channel|channel\ name)\ has\ to\ be\ specified\b
+    | [a-z0-9_]+\ does\ not\ follow\ [a-z0-9_]+$
+    """,
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def is_decapi_error(text: str) -> bool:
+    """
+    Checks if a DecAPI answer is an error message.
+
+    Parameters
+    ----------
+    text : str
+        The answer.
+
+    Returns
+    -------
+    bool
+        True if the answer is an error message, False otherwise.
+    """
+    return not text or DECAPI_ERROR.match(text.strip()) is not None
+
+
+class UserStore:
+    def __init__(
+        self,
+        connection: aiosqlite.Connection,
+        capacity: int = 5000,
+        flush_interval: float = 5.0,
+    ) -> None:
+        """
+        Initializes a new user store object.
+
+        Users are loaded from the database the first time they are asked for
+        and kept in memory, the least recently used ones are evicted once the
+        store holds more than capacity users. Changes are only applied to the
+        cached user and written back to the database in batches every
+        flush_interval seconds.
+
+        Parameters
+        ----------
+        connection : aiosqlite.Connection
+            The connection to the database.
+        capacity : int
+            The maximum number of users kept in memory.
+        flush_interval : float
+            The time in seconds between two write backs.
+
+        Returns
+        -------
+        None
+        """
+
+        self.connection = connection
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.logger = Logger(__name__)
+
+        self.users = OrderedDict()  # username -> User
+        self.dirty = {}  # username -> set of changed fields
+        self.evicted = {}  # username -> User, evicted before being written back
+
+        self._task = None
+        self._closing = False
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        """
+        Starts the background write back task if it is not already running.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """
+        Stops the background task and writes back the remaining changes.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+        await self.flush()
+
+    async def get(self, username: str) -> User:
+        """
+        Gets a user, from memory if possible.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        User
+            The user, None if the user does not exist.
+        """
+
+        user = self.users.get(username)
+        if user is not None:
+            self.users.move_to_end(username)
+            return user
+
+        user = self.evicted.pop(username, None)
+
+        if user is None:
+            # Read in a unit of work, the cache never keeps a row of a
+            # transaction that is rolled back afterwards
+            async with transaction(self.connection), self.connection.execute(
+                """
+                SELECT * FROM users WHERE username = ?
+            """,
+                (username,),
+            ) as cursor:
+                result = await cursor.fetchone()
+
+            if result is None:
+                return None
+
+            # Another coroutine may have loaded the user in the meantime
+            if username in self.users:
+                return self.users[username]
+
+            user = User(*result)
+
+        self.put(user)
+        return user
+
+    def put(self, user: User) -> None:
+        """
+        Adds a user to the store.
+
+        Parameters
+        ----------
+        user : User
+            The user.
+
+        Returns
+        -------
+        None
+        """
+
+        self.users[user.username] = user
+        self.users.move_to_end(user.username)
+
+        while len(self.users) > self.capacity:
+            username, evicted = self.users.popitem(last=False)
+            if username in self.dirty:
+                self.evicted[username] = evicted
+
+    async def update(self, username: str, **values) -> User:
+        """
+        Changes fields of a user, the change is written back later.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        **values
+            The fields to change and their new values.
+
+        Returns
+        -------
+        User
+            The updated user, None if the user does not exist.
+        """
+
+        user = await self.get(username)
+        if user is None:
+            return None
+
+        for key, value in values.items():
+            setattr(user, key, value)
+
+        self.dirty.setdefault(username, set()).update(values)
+        return user
+
+    def apply(self, username: str, **values) -> None:
+        """
+        Sets fields of a cached user that are already saved in the database.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        **values
+            The fields and their saved values.
+
+        Returns
+        -------
+        None
+        """
+
+        user = self.users.get(username) or self.evicted.get(username)
+        if user is None:
+            return
+
+        for key, value in values.items():
+            setattr(user, key, value)
+
+        changed = self.dirty.get(username)
+        if changed is not None:
+            changed.difference_update(values)
+            if not changed:
+                del self.dirty[username]
+
+    def discard(self, username: str) -> None:
+        """
+        Removes a user from the store without writing it back.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+
+        Returns
+        -------
+        None
+        """
+
+        self.users.pop(username, None)
+        self.evicted.pop(username, None)
+        self.dirty.pop(username, None)
+
+    async def flush(self) -> int:
+        """
+        Writes every changed user back to the database in one transaction.
+
+        Users are grouped by the set of fields that changed, each group is
+        written with a single executemany.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of users written.
+        """
+
+        async with self._lock:
+            return await self._write()
+
+    async def increment(
+        self,
+        usernames: list[str],
+        key: str,
+        amount: int,
+        on_update: Callable[[list[str]], Awaitable[None]] = None,
+    ) -> list[str]:
+        """
+        Adds an amount to a field of many users with a single UPDATE.
+
+        The usernames are staged in a temporary table and joined by the
+        UPDATE, so the cost does not depend on the number of round-trips.
+        Pending changes are written back first and the cached users are
+        updated the same way, they stay in sync with the database.
+
+        Parameters
+        ----------
+        usernames : list[str]
+            The usernames.
+        key : str
+            The field to increment, e.g. "income".
+        amount : int
+            The amount to add.
+        on_update : Callable[[list[str]], Awaitable[None]]
+            Called with the updated usernames inside the transaction, its
+            writes are committed or rolled back together with the UPDATE.
+
+        Returns
+        -------
+        list[str]
+            The usernames that were updated.
+        """
+
+        if key not in USER_FIELDS:
+            raise ValueError(f"Unknown user field: {key}")
+
+        async with self._lock:
+            await self._write()
+
+            async with transaction(self.connection):
+                await self.connection.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS staged_users (username TEXT PRIMARY KEY)"
+                )
+                await self.connection.execute("DELETE FROM staged_users")
+                await self.connection.executemany(
+                    "INSERT OR IGNORE INTO staged_users (username) VALUES (?)",
+                    ((username,) for username in usernames),
+                )
+                async with self.connection.execute(
+                    f"UPDATE users SET {key} = {key} + ? WHERE username IN (SELECT username FROM staged_users) RETURNING username",
+                    (amount,),
+                ) as cursor:
+                    updated = [row[0] for row in await cursor.fetchall()]
+                await self.connection.execute("DELETE FROM staged_users")
+
+                if on_update is not None:
+                    await on_update(updated)
+
+            for username in updated:
+                user = self.users.get(username)
+                if user is not None:
+                    setattr(user, key, getattr(user, key) + amount)
+
+        return updated
+
+    async def upsert(
+        self,
+        rows: list[dict],
+        keys: list[str],
+        on_update: Callable[[], Awaitable[None]] = None,
+    ) -> int:
+        """
+        Inserts many users, or updates some fields of the existing ones.
+
+        Every row is written by a single executemany in one transaction, the
+        cached users are updated the same way.
+
+        Parameters
+        ----------
+        rows : list[dict]
+            The users to write, with a value for every field but the id.
+        keys : list[str]
+            The fields updated when the user already exists.
+        on_update : Callable[[], Awaitable[None]]
+            Called inside the transaction, its writes are committed or rolled
+            back together with the users.
+
+        Returns
+        -------
+        int
+            The number of rows written.
+        """
+
+        if not rows:
+            return 0
+
+        columns = [key for key in USER_FIELDS if key != "id"]
+        for key in keys:
+            if key not in columns:
+                raise ValueError(f"Unknown user field: {key}")
+
+        async with self._lock:
+            await self._write()
+
+            async with transaction(self.connection):
+                await self.connection.executemany(
+                    f"""
+                    INSERT INTO users ({', '.join(columns)})
+                    VALUES ({', '.join(':' + column for column in columns)})
+                    ON CONFLICT (username) DO UPDATE SET {', '.join(f'{key} = excluded.{key}' for key in keys)}
+                    """,
+                    rows,
+                )
+
+                if on_update is not None:
+                    await on_update()
+
+            for row in rows:
+                user = self.users.get(row["username"])
+                if user is not None:
+                    for key in keys:
+                        setattr(user, key, row[key])
+
+        return len(rows)
+
+    async def _write(self) -> int:
+        """
+        Writes the changed users back, the caller must hold the lock.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        int
+            The number of users written.
+        """
+
+        if not self.dirty:
+            return 0
+
+        dirty, self.dirty = self.dirty, {}
+        evicted, self.evicted = self.evicted, {}
+        start = time.perf_counter()
+
+        groups = {}
+        for username, changed in dirty.items():
+            user = self.users.get(username) or evicted.get(username)
+            if user is None:
+                continue
+
+            keys = tuple(sorted(changed))
+            groups.setdefault(keys, []).append(
+                tuple(getattr(user, key) for key in keys) + (username,)
+            )
+
+        try:
+            async with transaction(self.connection):
+                for keys, rows in groups.items():
+                    await self.connection.executemany(
+                        f"UPDATE users SET {', '.join(f'{key} = ?' for key in keys)} WHERE username = ?",
+                        rows,
+                    )
+        except Exception as e:
+            self.logger.error(f"Error while writing back {len(dirty)} users: {e}")
+
+            # Keep the changes so the next flush tries again
+            for username, changed in dirty.items():
+                self.dirty.setdefault(username, set()).update(changed)
+            for username, user in evicted.items():
+                if username not in self.users:
+                    self.evicted.setdefault(username, user)
+            return 0
+
+        self.logger.debug(
+            f"Wrote back {len(dirty)} users in {(time.perf_counter() - start) * 1000:.1f} ms."
+        )
+        return len(dirty)
+
+    async def _run(self) -> None:
+        """
+        Writes back the changed users until the store is closed.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+            await self.flush()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of users kept in memory.
+        """
+
+        return len(self.users)
+
+
 class UserCog(commands.Cog):
-    def __init__(self, channel: ChannelCog, connection: aiosqlite.Connection):
-        self.bots = []
+    def __init__(
+        self,
+        channel: ChannelCog,
+        connection: aiosqlite.Connection,
+        http: HttpClient = None,
+    ):
         self.mods = []
         self.connection = connection
         self.channel = channel
+        self.http = http or HttpClient()
+        self.bot_list = BotList(self.http)
+
+        # DecAPI lookups, a raid spamming the same command sends one request
+        self.followage_cache = TTLCache(ttl=300, is_negative=is_decapi_error)
+        self.followdate_cache = TTLCache(ttl=86400, is_negative=is_decapi_error)
+        self.game_cache = TTLCache(ttl=300, is_negative=is_decapi_error)
+        self.avatar_cache = TTLCache(ttl=3600, is_negative=is_decapi_error)
         self.logger = Logger(__name__)
+        self.store = UserStore(connection)
+        self.ledger = Ledger(connection)
+        self.sync = FollowerSync(connection, self.store, self.ledger)
+
+    async def __ainit__(self) -> None:
+        """
+        Starts writing back the user changes and the ledger.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        self.store.start()
+        self.ledger.start()
+
+    async def __aclose__(self) -> None:
+        """
+        Writes back the pending user changes and ledger rows.
+
+        Parameters
+        ----------
+        None
+
+        Returns
+        -------
+        None
+        """
+
+        await self.store.close()
+        await self.ledger.close()
 
     async def get_mods_from_channel(self) -> None:
         """
@@ -55,16 +604,17 @@ class UserCog(commands.Cog):
         -------
         None
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://tmi.twitch.tv/group/user/{self.channel.streamer_channel}/chatters") as response:
-                json_file = await response.json()
+        json_file = await self.http.get_json(f"https://tmi.twitch.tv/group/user/{self.channel.streamer_channel}/chatters")
 
         if json_file:
             self.mods = json_file["chatters"]["moderators"]
 
-    async def get_bots(self) -> None:
+    async def get_bots(self) -> BotList:
         """
-        Gets a list of all bots from TwitchInsights.
+        Gets the list of all bots from TwitchInsights.
+
+        The list saved on disk is used at once, it is only downloaded here
+        on the first start, the refresh routine of the bot keeps it current.
 
         Parameters
         ----------
@@ -72,14 +622,19 @@ class UserCog(commands.Cog):
 
         Returns
         -------
-        None
+        BotList
+            The known bots.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://api.twitchinsights.net/v1/bots/all") as response:
-                json_file = await response.json()
+        if not self.bot_list.names:
+            await self.bot_list.load()
 
-        if json_file:
-            self.bots = [x[0] for x in json_file["bots"]]
+        try:
+            if not self.bot_list.names:
+                await self.bot_list.refresh()
+        except Exception as e:
+            self.logger.error(f"Error while refreshing the bot list: {e}")
+
+        return self.bot_list
 
     async def is_bot(self, username: str) -> bool:
         """
@@ -96,13 +651,7 @@ class UserCog(commands.Cog):
             bool
                 True if the user is a bot,False otherwise.
         """
-        if self.bots is None:
-            await self.get_bots()
-
-        if username in self.bots:
-            return True
-        else:
-            return False
+        return username in self.bot_list
 
     async def create_table(self):
         """
@@ -141,20 +690,10 @@ class UserCog(commands.Cog):
         await self.connection.commit()
 
     async def get_user(self, username: str) -> User:
-        async with self.connection.execute(
-            """
-            SELECT * FROM users WHERE username = ?
-        """,
-            (username,),
-        ) as cursor:
-            result = await cursor.fetchone()
-
-        if result is None:
-            return None
-
-        return User(*result)
+        return await self.store.get(username)
 
     async def get_user_by_id(self, id: int) -> User:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE id = ?
@@ -169,6 +708,7 @@ class UserCog(commands.Cog):
         return User(*result)
 
     async def get_all_users(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users
@@ -182,6 +722,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_users_with_no_roles(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE bot = 0 AND follower = 0 AND subscriber = 0 AND mod = 0
@@ -195,6 +736,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_all_usernames(self) -> list[str]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT username FROM users
@@ -208,6 +750,7 @@ class UserCog(commands.Cog):
         return [user[0] for user in result]
 
     async def get_user_bots(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE bot = 1
@@ -226,6 +769,7 @@ class UserCog(commands.Cog):
         return user.income
 
     async def get_followers(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE follower = 1
@@ -238,7 +782,19 @@ class UserCog(commands.Cog):
 
         return [User(*user) for user in result]
 
+    async def get_follower_usernames(self) -> list[str]:
+        await self.store.flush()
+        async with self.connection.execute(
+            """
+            SELECT username FROM users WHERE follower = 1
+        """
+        ) as cursor:
+            result = await cursor.fetchall()
+
+        return [user[0] for user in result]
+
     async def get_subscribers(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE subscriber = 1
@@ -252,6 +808,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_banned(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE ban_time IS NOT NULL
@@ -265,6 +822,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_warned(self) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE warning > 0
@@ -278,6 +836,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_banned_by_time(self, time: str) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE ban_time = ?
@@ -292,6 +851,7 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def get_warned_by_amount(self, amount: int) -> list[User]:
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT * FROM users WHERE warning = ?
@@ -306,128 +866,318 @@ class UserCog(commands.Cog):
         return [User(*user) for user in result]
 
     async def add_user(self, username: str) -> None:
-        await self.connection.execute(
-            """
-            INSERT INTO users (
-                username,
-                income,
-                message_count,
-                bot,
-                follower,
-                subscriber,
-                mod,
-                gamble_lock,
-                roll_lock,
-                rpg_lock,
-                sfx_lock,
-                slots_lock,
-                ban_time,
-                warning
+        async with transaction(self.connection):
+            async with self.connection.execute(
+                """
+                INSERT OR IGNORE INTO users (
+                    username,
+                    income,
+                    message_count,
+                    bot,
+                    follower,
+                    subscriber,
+                    mod,
+                    gamble_lock,
+                    roll_lock,
+                    rpg_lock,
+                    sfx_lock,
+                    slots_lock,
+                    ban_time,
+                    warning
+                    )
+                VALUES (
+                    ?,
+                    ?,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    'unlocked',
+                    'unlocked',
+                    'unlocked',
+                    'unlocked',
+                    'unlocked',
+                    NULL,
+                    0
                 )
-            VALUES (
-                ?,
-                ?,
+            """,
+                (
+                    username,
+                    self.channel.channel.income,
+                ),
+            ) as cursor:
+                id = cursor.lastrowid
+                added = cursor.rowcount > 0
+
+            # The opening row is written with the user, so the ledger ids
+            # follow the order in which balances were committed
+            if added:
+                await self.ledger.append(
+                    [(username, self.channel.channel.income, "opening", None)]
+                )
+
+        # The user was added by a concurrent call
+        if not added:
+            return
+
+        self.store.put(
+            User(
+                id,
+                username,
+                self.channel.channel.income,
+                0,
                 0,
                 0,
                 0,
                 0,
+                "unlocked",
+                "unlocked",
+                "unlocked",
+                "unlocked",
+                "unlocked",
+                None,
                 0,
-                'unlocked',
-                'unlocked',
-                'unlocked',
-                'unlocked',
-                'unlocked',
-                NULL,
-                0
             )
-        """,
-            (
-                username,
-                self.channel.channel.income,
-            ),
         )
-        await self.connection.commit()
 
     async def delete_user(self, username: str) -> None:
-        await self.connection.execute(
-            """
-            DELETE FROM users WHERE username = ?
-        """,
-            (username,),
-        )
-        await self.connection.commit()
+        async with transaction(self.connection):
+            await self.connection.execute(
+                """
+                DELETE FROM users WHERE username = ?
+            """,
+                (username,),
+            )
+        self.store.discard(username)
 
     async def update_user(self, user: User) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET 
-                income = ?,
-                message_count = ?,
-                bot = ?,
-                follower = ?,
-                subscriber = ?,
-                mod = ?,
-                gamble_lock = ?,
-                roll_lock = ?,
-                rpg_lock = ?,
-                sfx_lock = ?,
-                slots_lock = ?,
-                ban_time = ?,
-                warning = ?
-            WHERE username = ?
-        """,
-            (
-                user.income,
-                user.message_count,
-                user.bot,
-                user.follower,
-                user.subscriber,
-                user.mod,
-                user.gamble_lock,
-                user.roll_lock,
-                user.rpg_lock,
-                user.sfx_lock,
-                user.slots_lock,
-                user.ban_time,
-                user.warning,
-                user.username,
-            ),
+        await self.store.update(
+            user.username,
+            **{
+                key: getattr(user, key)
+                for key in USER_FIELDS
+                if key not in ("id", "username", "income")
+            },
         )
-        await self.connection.commit()
+
+        # Balances are never written back late, see adjust_balance. The edit
+        # is measured against the committed balance, not the cache
+        async with transaction(self.connection):
+            await self.connection.execute(
+                """
+                INSERT INTO ledger (username, delta, reason, game, timestamp)
+                SELECT username, :income - income, 'edit', NULL, :timestamp
+                FROM users WHERE username = :username AND income != :income
+            """,
+                {
+                    "username": user.username,
+                    "income": user.income,
+                    "timestamp": time.time(),
+                },
+            )
+            await self.connection.execute(
+                "UPDATE users SET income = ? WHERE username = ?",
+                (user.income, user.username),
+            )
+            self.store.apply(user.username, income=user.income)
 
     async def update_user_mod(self, username: str, mod: bool) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET mod = ? WHERE username = ?
-        """,
-            (mod, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, mod=mod)
         self.logger.debug(f"Updated {username} to mod: {mod}")
 
-    async def update_user_income(self, username: str, income: int) -> None:
-        balance = await self.get_balance(username)
-        income += balance
+    async def get_locks(self) -> dict[tuple[str, str], str]:
+        """
+        Gets the cooldowns saved in the lock columns.
 
-        if income < 0:
-            income = 0
+        Parameters
+        ----------
+        None
 
-        await self.connection.execute(
-            """
-            UPDATE users SET income = ? WHERE username = ?
-        """,
-            (income, username),
+        Returns
+        -------
+        dict[tuple[str, str], str]
+            The saved value by username and cooldown key, users without any
+            lock are left out.
+        """
+        keys = list(LOCK_COLUMNS)
+        columns = [LOCK_COLUMNS[key] for key in keys]
+
+        async with self.connection.execute(
+            f"""
+            SELECT username, {', '.join(columns)} FROM users
+            WHERE {' OR '.join(f"COALESCE({column}, 'unlocked') != 'unlocked'" for column in columns)}
+        """
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        return {
+            (row[0], key): value
+            for row in rows
+            for key, value in zip(keys, row[1:])
+            if value not in (None, "unlocked")
+        }
+
+    async def save_locks(self, locks: dict[tuple[str, str], str]) -> int:
+        """
+        Saves cooldowns in the lock columns, one executemany per column.
+
+        Parameters
+        ----------
+        locks : dict[tuple[str, str], str]
+            The value to save by username and cooldown key.
+
+        Returns
+        -------
+        int
+            The number of locks saved.
+        """
+        if not locks:
+            return 0
+
+        by_column = {}
+        for (username, key), value in locks.items():
+            by_column.setdefault(LOCK_COLUMNS[key], []).append((value, username))
+
+        async with transaction(self.connection):
+            for column, rows in by_column.items():
+                await self.connection.executemany(
+                    f"UPDATE users SET {column} = ? WHERE username = ?", rows
+                )
+
+        for column, rows in by_column.items():
+            for value, username in rows:
+                self.store.apply(username, **{column: value})
+
+        self.logger.debug(f"Saved {len(locks)} locks.")
+        return len(locks)
+
+    async def update_user_income(
+        self, username: str, income: int, reason: str = "adjust", game: str = None
+    ) -> None:
+        await self.adjust_balance(username, income, floor=True, reason=reason, game=game)
+
+    async def adjust_balance(
+        self,
+        username: str,
+        amount: int,
+        floor: bool = False,
+        required: int = None,
+        reason: str = "adjust",
+        game: str = None,
+    ) -> int:
+        """
+        Adds an amount to the balance of a user.
+
+        The ledger row is written first, its delta is the amount really
+        applied once the floor is taken into account, then the balance is
+        changed by a conditional UPDATE of that same delta. Both statements
+        check the required balance and run in one transaction, so the ledger
+        never misses a change and concurrent commands can not lose an update.
+
+        Parameters
+        ----------
+        username : str
+            The username.
+        amount : int
+            The amount to add, negative to remove coins.
+        floor : bool
+            If True, the balance does not go below 0.
+        required : int
+            The balance the user must at least have, None to skip the check.
+        reason : str
+            Why the balance changes, recorded in the ledger.
+        game : str
+            The game that changes the balance, if any.
+
+        Returns
+        -------
+        int
+            The new balance, None if the user does not exist or does not have
+            the required balance.
+        """
+        values = {
+            "username": username,
+            "amount": amount,
+            "floor": floor,
+            "required": required,
+            "reason": reason,
+            "game": game,
+            "timestamp": time.time(),
+        }
+
+        async with transaction(self.connection):
+            # RETURNING only gives the new balance, so the amount really
+            # applied by the floor is worked out by the ledger row itself
+            async with self.connection.execute(
+                """
+                INSERT INTO ledger (username, delta, reason, game, timestamp)
+                SELECT username, delta, :reason, :game, :timestamp FROM (
+                    SELECT username, CASE WHEN :floor THEN MAX(-income, :amount) ELSE :amount END AS delta
+                    FROM users
+                    WHERE username = :username
+                    AND (:required IS NULL OR income >= :required)
+                )
+                WHERE delta != 0
+                RETURNING delta
+            """,
+                values,
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            values["amount"] = row[0] if row is not None else 0
+
+            async with self.connection.execute(
+                """
+                UPDATE users
+                SET income = income + :amount
+                WHERE username = :username
+                AND (:required IS NULL OR income >= :required)
+                RETURNING income
+            """,
+                values,
+            ) as cursor:
+                result = await cursor.fetchone()
+
+            if result is None:
+                return None
+
+            self.store.apply(username, income=result[0])
+
+        return result[0]
+
+    async def pay_income(self, usernames: list[str], amount: int) -> int:
+        """
+        Credits the same amount to many users at once.
+
+        Parameters
+        ----------
+        usernames : list[str]
+            The usernames to credit.
+        amount : int
+            The amount credited to every user.
+
+        Returns
+        -------
+        int
+            The number of users credited.
+        """
+        start = time.perf_counter()
+        async def record(credited: list[str]) -> None:
+            await self.ledger.append(
+                [(username, amount, "income", None) for username in credited]
+            )
+
+        # The ledger rows are written in the transaction of the UPDATE
+        credited = await self.store.increment(usernames, "income", amount, record)
+
+        self.logger.info(
+            f"Paid {amount} to {len(credited)} users in {(time.perf_counter() - start) * 1000:.1f} ms."
         )
-        await self.connection.commit()
+        return len(credited)
 
     async def update_user_bot(self, username: str, bot: bool) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET bot = ? WHERE username = ?
-        """,
-            (bot, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, bot=bot)
         self.logger.debug(f"Updated {username} to bot: {bot}")
 
     async def update_user_follower(self, username: str, follower: bool) -> None:
@@ -437,120 +1187,52 @@ class UserCog(commands.Cog):
             if follower == status.follower:
                 return
 
-            await self.connection.execute(
-                """
-                UPDATE users SET follower = ? WHERE username = ?
-            """,
-                (follower, username),
-            )
-
-            await self.connection.commit()
+            await self.store.update(username, follower=follower)
             self.logger.debug(f"Updated {username} to follower: {follower}")
         except Exception as e:
             self.logger.error(f"An error occurred while updating user follower: {e}")
 
     async def update_user_subscriber(self, username: str, subscriber: bool) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET subscriber = ? WHERE username = ?
-        """,
-            (subscriber, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, subscriber=subscriber)
 
     async def update_user_gamble_lock(self, username: str, gamble_lock: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET gamble_lock = ? WHERE username = ?
-        """,
-            (gamble_lock, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, gamble_lock=gamble_lock)
 
     async def update_user_roll_lock(self, username: str, roll_lock: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET roll_lock = ? WHERE username = ?
-        """,
-            (roll_lock, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, roll_lock=roll_lock)
 
     async def update_user_rpg_lock(self, username: str, rpg_lock: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET rpg_lock = ? WHERE username = ?
-        """,
-            (rpg_lock, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, rpg_lock=rpg_lock)
 
     async def update_user_sfx_lock(self, username: str, sfx_lock: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET sfx_lock = ? WHERE username = ?
-        """,
-            (sfx_lock, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, sfx_lock=sfx_lock)
 
     async def update_user_slots_lock(self, username: str, slots_lock: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET slots_lock = ? WHERE username = ?
-        """,
-            (slots_lock, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, slots_lock=slots_lock)
 
     async def update_user_ban_time(self, username: str, ban_time: str) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET ban_time = ? WHERE username = ?
-        """,
-            (ban_time, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, ban_time=ban_time)
 
     async def update_user_warning(self, username: str, warning: int) -> None:
-        await self.connection.execute(
-            """
-            UPDATE users SET warning = ? WHERE username = ?
-        """,
-            (warning, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, warning=warning)
 
-    async def update_user_database(self, channel_members: list[str]) -> None:
+    async def update_user_database(self, channel_members: ChannelMembers) -> dict:
         """
         Updates the user database.
 
         Parameters
         ----------
-        channel_members : list[str]
-            A list of all users in the channel.
+        channel_members : ChannelMembers
+            The followers of the channel.
 
         Returns
         -------
-        None
+        dict
+            The number of users added and updated.
         """
-        usernames = await self.get_all_usernames()
-
-        for username in channel_members:
-            if username not in usernames:
-                await self.add_user(username)
-                await self.update_user_follower(username, True)
-                self.logger.info(f"Added {username} to the database.")
-
-        for username in usernames:
-            if username not in channel_members:
-                await self.update_user_follower(username, False)
-
-            if username in self.bots:
-                await self.update_user_bot(username, True)
-
-            if username in self.mods:
-                await self.update_user_mod(username, True)
+        return await self.sync.sync(
+            channel_members, self.bot_list.names, self.mods, self.channel.channel.income
+        )
 
     async def get_followage(self, username: str) -> str:
         """
@@ -566,10 +1248,10 @@ class UserCog(commands.Cog):
         str
             The followage of the user.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://beta.decapi.me/twitch/followage/{self.channel.channel.streamer_channel}/{username}?token={os.getenv('DECAPI_SECRET_TOKEN')}") as response:
-                followage = await response.text()
-
+        followage = await self.followage_cache.get(
+            username,
+            lambda: self.http.get_text(f"https://beta.decapi.me/twitch/followage/{self.channel.channel.streamer_channel}/{username}?token={os.getenv('DECAPI_SECRET_TOKEN')}"),
+        )
 
         return followage
     
@@ -587,9 +1269,45 @@ class UserCog(commands.Cog):
         str
             The followdate of the user.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://decapi.me/twitch/followed/{self.channel.channel.streamer_channel}/{username}?token={os.getenv('DECAPI_SECRET_TOKEN')}") as response:
-                followdate = await response.text()
+        followdate = await self.followdate_cache.get(
+            username, lambda: self.fetch_followdate(username)
+        )
+
+        return followdate
+
+    async def fetch_followdate(self, username: str) -> str:
+        """
+        Gets the followdate of a user from the database, or from DecAPI.
+
+        A follow date never changes, the ones DecAPI returns are saved so
+        they survive restarts.
+
+        Parameters
+        ----------
+        username : str
+            The username to check.
+
+        Returns
+        -------
+        str
+            The followdate of the user.
+        """
+        async with self.connection.execute(
+            "SELECT followdate FROM followdate WHERE username = ?", (username,)
+        ) as cursor:
+            result = await cursor.fetchone()
+
+        if result is not None:
+            return result[0]
+
+        followdate = await self.http.get_text(f"https://decapi.me/twitch/followed/{self.channel.channel.streamer_channel}/{username}?token={os.getenv('DECAPI_SECRET_TOKEN')}")
+
+        if not is_decapi_error(followdate):
+            async with transaction(self.connection):
+                await self.connection.execute(
+                    "INSERT OR REPLACE INTO followdate (username, followdate, fetched) VALUES (?, ?, ?)",
+                    (username, followdate, time.time()),
+                )
 
         return followdate
 
@@ -608,9 +1326,10 @@ class UserCog(commands.Cog):
             The last game played by the user.
         '''
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://decapi.me/twitch/game/{username}") as response:
-                game = await response.text()
+        game = await self.game_cache.get(
+            username,
+            lambda: self.http.get_text(f"https://decapi.me/twitch/game/{username}"),
+        )
 
         return game
 
@@ -627,6 +1346,7 @@ class UserCog(commands.Cog):
         str
             The top chatter.
         """
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT username FROM users ORDER BY message_count DESC LIMIT 1
@@ -653,13 +1373,7 @@ class UserCog(commands.Cog):
         None
         """
         user = await self.get_user(username)
-        await self.connection.execute(
-            """
-            UPDATE users SET message_count = ? WHERE username = ?
-        """,
-            (user.message_count + 1, username),
-        )
-        await self.connection.commit()
+        await self.store.update(username, message_count=user.message_count + 1)
 
     # get top5 chatters with numbers of messages (dict)
     async def get_top5_chatters(self) -> dict[str, int]:
@@ -675,6 +1389,7 @@ class UserCog(commands.Cog):
         dict[str,int]
             The top 5 chatters.
         """
+        await self.store.flush()
         async with self.connection.execute(
             """
             SELECT username,message_count FROM users ORDER BY message_count DESC LIMIT 5
@@ -705,7 +1420,7 @@ class UserCog(commands.Cog):
         """
         followers = await self.get_followers()
         subscribers = await self.get_subscribers()
-        bots = await self.get_bots()
+        bots = await self.get_user_bots()
         users = await self.get_all_users()
 
         return {
@@ -729,8 +1444,9 @@ class UserCog(commands.Cog):
         str
             The avatar of the user.
         """
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"https://decapi.me/twitch/avatar/{username}") as response:
-                avatar = await response.text()
+        avatar = await self.avatar_cache.get(
+            username,
+            lambda: self.http.get_text(f"https://decapi.me/twitch/avatar/{username}"),
+        )
 
         return avatar
@@ -0,0 +1,87 @@
+import sys
+import os
+import unittest
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.allocator import IdAllocator
+from modules.batch import BatchWriter
+
+
+class TestBatchWriter(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute("CREATE TABLE message (id INTEGER PRIMARY KEY, content TEXT)")
+        self.writer = BatchWriter(
+            self.connection,
+            "INSERT INTO message (content) VALUES (?)",
+            batch_size=10,
+            flush_interval=0.05,
+            max_pending=25,
+        )
+        self.writer.start()
+
+    async def count(self):
+        async with self.connection.execute("SELECT COUNT(*) FROM message") as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def test_001_close_flushes_pending_rows(self):
+        for i in range(5):
+            await self.writer.put((f"message {i}",))
+
+        await self.writer.close()
+        self.assertEqual(await self.count(), 5)
+        self.assertEqual(len(self.writer), 0)
+
+    async def test_002_backpressure_keeps_buffer_bounded(self):
+        for i in range(500):
+            await self.writer.put((f"message {i}",))
+            self.assertLessEqual(len(self.writer), self.writer.max_pending)
+
+        await self.writer.close()
+        self.assertEqual(await self.count(), 500)
+        self.assertEqual(self.writer.written, 500)
+
+    async def asyncTearDown(self):
+        await self.writer.close()
+        await self.connection.close()
+
+
+class TestIdAllocator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute(
+            "CREATE TABLE message (id INTEGER PRIMARY KEY AUTOINCREMENT, content TEXT)"
+        )
+
+    async def test_001_ids_follow_existing_rows(self):
+        for i in range(3):
+            await self.connection.execute("INSERT INTO message (content) VALUES (?)", (str(i),))
+        await self.connection.execute("DELETE FROM message WHERE id = 3")
+        await self.connection.commit()
+
+        ids = IdAllocator(self.connection, "message")
+        self.assertEqual(await ids.seed(), 3)
+        self.assertEqual([ids.next() for _ in range(3)], [4, 5, 6])
+
+    async def test_002_batched_ids_survive_reseed(self):
+        ids = IdAllocator(self.connection, "message")
+        await ids.seed()
+
+        writer = BatchWriter(self.connection, "INSERT INTO message (id, content) VALUES (?, ?)")
+        for i in range(10):
+            await writer.put((ids.next(), str(i)))
+        await writer.flush()
+
+        restarted = IdAllocator(self.connection, "message")
+        self.assertEqual(await restarted.seed(), 10)
+        self.assertEqual(restarted.next(), 11)
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
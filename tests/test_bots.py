@@ -0,0 +1,69 @@
+import sys
+import os
+import unittest
+import tempfile
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.bots import BotList
+from modules.http import HttpClient
+
+
+class TestBotList(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = 0
+
+        async def handler(request):
+            self.requests += 1
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304)
+            return web.json_response(
+                {"bots": [["Nightbot", 10, 1], ["streamelements", 5, 2]]},
+                headers={"ETag": '"v1"'},
+            )
+
+        app = web.Application()
+        app.router.add_get("/bots", handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "bots.json")
+        self.http = HttpClient()
+        self.bots = BotList(self.http, self.path)
+        self.bots.URL = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/bots"
+
+    async def test_001_refresh_and_lookup(self):
+        self.assertTrue(await self.bots.refresh())
+        self.assertIn("NightBot", self.bots)
+        self.assertNotIn("doggo", self.bots)
+
+        # Fresh list, nothing is requested
+        self.assertFalse(await self.bots.refresh())
+        self.assertEqual(self.requests, 1)
+
+        # Forced check, the ETag answers 304
+        self.assertFalse(await self.bots.refresh(force=True))
+        self.assertEqual(self.requests, 2)
+
+    async def test_002_load_from_disk(self):
+        await self.bots.refresh()
+
+        bots = BotList(self.http, self.path)
+        await bots.load()
+        self.assertEqual(bots.names, {"nightbot", "streamelements"})
+        self.assertEqual(bots.etag, '"v1"')
+        self.assertFalse(bots.stale)
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.runner.cleanup()
+        self.directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
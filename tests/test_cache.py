@@ -0,0 +1,94 @@
+import sys
+import os
+import unittest
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.cache import TTLCache
+from modules.user import is_decapi_error
+
+
+class TestTTLCache(unittest.IsolatedAsyncioTestCase):
+    async def test_001_single_flight(self):
+        cache = TTLCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "1 year"
+
+        results = await asyncio.gather(*(cache.get("doggo", fetch) for _ in range(30)))
+
+        self.assertEqual(results, ["1 year"] * 30)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(await cache.get("doggo", fetch), "1 year")
+        self.assertEqual(len(calls), 1)
+
+    async def test_002_negative_caching(self):
+        cache = TTLCache(negative_ttl=0.05, is_negative=lambda value: "not found" in value)
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            raise ConnectionError("upstream down")
+
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                await cache.get("doggo", fail)
+        self.assertEqual(len(calls), 1)
+
+        async def missing():
+            calls.append(1)
+            return "User not found"
+
+        await cache.get("ghost", missing)
+        await asyncio.sleep(0.06)
+        await cache.get("ghost", missing)
+        self.assertEqual(len(calls), 3)
+        with self.assertRaises(ConnectionError):
+            await cache.get("doggo", fail)
+        self.assertEqual(len(calls), 4)
+
+    async def test_003_first_caller_cancelled(self):
+        cache = TTLCache()
+
+        async def fetch():
+            await asyncio.sleep(0.02)
+            return "1 year"
+
+        first = asyncio.create_task(cache.get("doggo", fetch))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(cache.get("doggo", fetch))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        self.assertEqual(await second, "1 year")
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+
+    async def test_004_capacity(self):
+        cache = TTLCache(capacity=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+
+        self.assertEqual(list(cache.entries), ["b", "c"])
+
+
+    async def test_005_decapi_errors(self):
+        for text in (
+            "",
+            "User not found: doggo",
+            "doggo does not follow fumi",
+            "Error from Twitch API: 500 - Internal Server Error",
+            "An error occurred retrieving the followage",
+        ):
+            self.assertTrue(is_decapi_error(text), text)
+
+        for text in ("2 years, 3 months", "Terror in the Error Zone", "Invalid Entry Simulator"):
+            self.assertFalse(is_decapi_error(text), text)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,56 @@
+import sys
+import os
+import unittest
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.chat import ChatScheduler, Priority
+
+
+class TestChatScheduler(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.lines = []
+
+        async def send(content):
+            self.lines.append(content)
+
+        self.chat = ChatScheduler(send, limit=2, window=0.1, dedupe_window=0.05)
+
+    async def test_001_priority_and_coalescing(self):
+        self.chat.put("ad", Priority.AD)
+        self.chat.put("doggo won", Priority.GAME)
+        self.chat.put("fumi won", Priority.GAME)
+        self.chat.put("warned", Priority.MODERATION)
+        self.chat.start()
+        await asyncio.sleep(0.15)
+
+        self.assertEqual(self.lines, ["warned", "doggo won | fumi won", "ad"])
+        self.assertEqual(self.chat.coalesced, 1)
+        await self.chat.close()
+
+    async def test_002_rate_window(self):
+        self.chat.start()
+        for i in range(3):
+            self.chat.put("x" * 400 + str(i))
+            await asyncio.sleep(0.01)
+
+        await asyncio.sleep(0.03)
+        self.assertEqual(len(self.lines), 2)
+        self.assertEqual(self.chat.metrics()["depth"]["reply"], 1)
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(self.lines), 3)
+        await self.chat.close()
+
+    async def test_003_deduplication(self):
+        self.assertTrue(self.chat.put("doggo is not following the channel."))
+        self.assertFalse(self.chat.put("doggo is not following the channel."))
+        await asyncio.sleep(0.06)
+        self.assertTrue(self.chat.put("doggo is not following the channel."))
+        self.assertEqual(self.chat.deduplicated, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import sys
+import os
+import unittest
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.cmd import CmdCog
+
+
+class TestCmdRegistry(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        self.cmd = CmdCog(self.connection, None)
+        await self.cmd.create_table()
+        await self.cmd.__ainit__()
+
+    async def used(self, name):
+        async with self.connection.execute("SELECT used FROM cmd WHERE name = ?", (name,)) as cursor:
+            return (await cursor.fetchone())[0]
+
+    async def test_001_registry_loaded(self):
+        cmd = await self.cmd.get_cmd("balance")
+        self.assertEqual(cmd.category, "economy")
+        self.assertTrue(await self.cmd.is_cmd_exists("balance"))
+        self.assertIsNone(await self.cmd.get_cmd("missing"))
+
+        other = CmdCog(self.connection, None)
+        await other.load()
+        self.assertEqual(await other.get_all_cmds(), await self.cmd.get_all_cmds())
+
+    async def test_002_usage_flushed(self):
+        for _ in range(3):
+            await self.cmd.increment_usage("balance")
+
+        self.assertEqual((await self.cmd.get_cmd("balance")).used, 3)
+        self.assertEqual(await self.used("balance"), 0)
+
+        self.assertEqual(await self.cmd.flush_usage(), 1)
+        self.assertEqual(await self.used("balance"), 3)
+        self.assertEqual(await self.cmd.flush_usage(), 0)
+
+    async def test_003_usage_kept_on_update(self):
+        await self.cmd.increment_usage("balance")
+        await self.cmd.flush_usage()
+        await self.cmd.increment_usage("balance")
+
+        await self.cmd.update_cmd(
+            "balance",
+            {"name": "coins", "description": "Your coins", "cost": "0", "category": "economy"},
+        )
+        self.assertEqual((await self.cmd.get_cmd("coins")).used, 2)
+
+        await self.cmd.flush_usage()
+        self.assertEqual(await self.used("coins"), 2)
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
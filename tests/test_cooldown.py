@@ -0,0 +1,84 @@
+import sys
+import os
+import unittest
+import asyncio
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.cooldown import Cooldowns
+from modules.user import UserCog
+
+
+class TestCooldowns(unittest.IsolatedAsyncioTestCase):
+    async def test_001_check(self):
+        cooldowns = Cooldowns()
+
+        self.assertEqual(cooldowns.check("doggo", "slots", 0), 0)
+        self.assertEqual(len(cooldowns), 0)
+
+        self.assertEqual(cooldowns.check("doggo", "slots", 0.05), 0)
+        self.assertGreater(cooldowns.check("doggo", "slots", 0.05), 0)
+        self.assertEqual(cooldowns.check("fumi", "slots", 0.05), 0)
+        self.assertEqual(cooldowns.check("doggo", "gamble", 0.05), 0)
+
+        await asyncio.sleep(0.06)
+        cooldowns.prune()
+        self.assertEqual(len(cooldowns), 0)
+        self.assertEqual(cooldowns.check("doggo", "slots", 0.05), 0)
+
+        # A failed command gives the cooldown back
+        cooldowns.reset("doggo", "slots")
+        self.assertEqual(cooldowns.check("doggo", "slots", 0.05), 0)
+        self.assertNotEqual(cooldowns.pop_changes()[("doggo", "slots")], "unlocked")
+        cooldowns.reset("doggo", "slots")
+        self.assertEqual(cooldowns.pop_changes(), {("doggo", "slots"): "unlocked"})
+
+    async def test_002_token_bucket(self):
+        cooldowns = Cooldowns(rate=20, burst=2)
+
+        self.assertTrue(cooldowns.allow("doggo"))
+        self.assertTrue(cooldowns.allow("doggo"))
+        self.assertFalse(cooldowns.allow("doggo"))
+        self.assertTrue(cooldowns.allow("fumi"))
+
+        await asyncio.sleep(0.06)
+        self.assertTrue(cooldowns.allow("doggo"))
+
+    async def test_003_saved_in_lock_columns(self):
+        connection = await aiosqlite.connect(":memory:")
+        await connection.execute(
+            """
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE, income INTEGER, message_count INTEGER,
+                bot BOOLEAN, follower BOOLEAN, subscriber BOOLEAN, mod BOOLEAN,
+                gamble_lock TEXT, roll_lock TEXT, rpg_lock TEXT, sfx_lock TEXT,
+                slots_lock TEXT, ban_time TEXT, warning INTEGER
+            )
+            """
+        )
+        await connection.executemany(
+            "INSERT INTO users (username, income, slots_lock, gamble_lock) VALUES (?, 100, 'unlocked', 'unlocked')",
+            [("doggo",), ("fumi",)],
+        )
+        await connection.commit()
+        cog = UserCog(None, connection)
+
+        cooldowns = Cooldowns()
+        cooldowns.check("doggo", "slots", 60)
+        cooldowns.check("fumi", "gamble", 60)
+        self.assertEqual(await cog.save_locks(cooldowns.pop_changes()), 2)
+        self.assertEqual(cooldowns.pop_changes(), {})
+
+        restored = Cooldowns()
+        self.assertEqual(restored.restore(await cog.get_locks()), 2)
+        self.assertGreater(restored.remaining("doggo", "slots"), 0)
+        self.assertEqual(restored.remaining("doggo", "gamble"), 0)
+
+        await connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import sys
+import os
+import unittest
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.cmd import CmdCog
+from modules.counters import UsageCounters
+from modules.migrations import Migrator
+
+
+class TestUsageCounters(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await CmdCog(self.connection, None).create_table()
+        await Migrator(self.connection, "cmd").migrate()
+        self.counters = UsageCounters(self.connection, flush_interval=0.01)
+
+    async def test_001_flush_aggregates(self):
+        for _ in range(5):
+            self.counters.hit("cmd", "balance")
+        self.counters.hit("sfx", "honk")
+
+        self.assertEqual(await self.counters.flush(), 2)
+        self.counters.hit("cmd", "balance", 2)
+        await self.counters.flush()
+
+        async with self.connection.execute("SELECT kind, name, count FROM usage ORDER BY kind") as cursor:
+            self.assertEqual(await cursor.fetchall(), [("cmd", "balance", 7), ("sfx", "honk", 1)])
+
+    async def test_002_totals_include_pending(self):
+        self.counters.hit("game", "slots", 3)
+        await self.counters.flush()
+        self.counters.hit("game", "slots")
+        self.counters.hit("game", "gamble")
+
+        self.assertEqual(await self.counters.totals("game"), {"slots": 4, "gamble": 1})
+
+        histogram = await self.counters.histogram("game", "slots", hours=3)
+        self.assertEqual([entry["count"] for entry in histogram], [0, 0, 4])
+
+    async def test_003_background_flush(self):
+        self.counters.start()
+        self.counters.hit("cmd", "help")
+        await self.counters.close()
+        self.assertEqual(len(self.counters), 0)
+        self.assertEqual(await self.counters.totals("cmd"), {"help": 1})
+
+    async def test_004_cmd_uses_counted_once(self):
+        cmd = CmdCog(self.connection, None, self.counters)
+        await cmd.__ainit__()
+
+        await cmd.increment_usage("balance")
+        await self.counters.flush()
+        await cmd.increment_usage("balance")
+        self.assertEqual(len(cmd.usage), 0)
+
+        result = await cmd.update_cmd(
+            "balance",
+            {"name": "coins", "description": "Your coins", "cost": "0", "category": "economy"},
+        )
+        self.assertIn("success", result)
+        self.assertEqual((await cmd.get_cmd("coins")).used, 2)
+        self.assertEqual(await self.counters.totals("cmd"), {"coins": 2})
+
+        other = CmdCog(self.connection, None, self.counters)
+        await other.load()
+        self.assertEqual((await other.get_cmd("coins")).used, 2)
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import sys
+import os
+import unittest
+import asyncio
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.database import transaction
+
+
+class TestUnitOfWork(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute("CREATE TABLE item (name TEXT)")
+        await self.connection.commit()
+
+    async def get_names(self):
+        async with self.connection.execute("SELECT name FROM item ORDER BY name") as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def test_001_rollback_on_error(self):
+        with self.assertRaises(ValueError):
+            async with transaction(self.connection):
+                await self.connection.execute("INSERT INTO item VALUES ('a')")
+                raise ValueError("boom")
+
+        self.assertEqual(await self.get_names(), [])
+        self.assertFalse(self.connection.in_transaction)
+
+    async def test_002_nested_savepoint(self):
+        async with transaction(self.connection):
+            await self.connection.execute("INSERT INTO item VALUES ('a')")
+
+            with self.assertRaises(ValueError):
+                async with transaction(self.connection):
+                    await self.connection.execute("INSERT INTO item VALUES ('b')")
+                    raise ValueError("boom")
+
+        self.assertEqual(await self.get_names(), ["a"])
+
+    async def test_003_tasks_are_serialized(self):
+        async def insert(name):
+            async with transaction(self.connection):
+                await self.connection.execute("INSERT INTO item VALUES (?)", (name,))
+                await asyncio.sleep(0)
+                if name == "b":
+                    raise ValueError("boom")
+
+        results = await asyncio.gather(
+            insert("a"), insert("b"), insert("c"), return_exceptions=True
+        )
+
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(await self.get_names(), ["a", "c"])
+
+    async def test_004_foreign_transaction_is_not_committed(self):
+        await self.connection.execute("INSERT INTO item VALUES ('a')")
+
+        with self.assertRaises(RuntimeError):
+            async with transaction(self.connection):
+                pass
+
+        await self.connection.rollback()
+        self.assertEqual(await self.get_names(), [])
+
+    async def test_005_child_task_does_not_deadlock(self):
+        async def insert():
+            async with transaction(self.connection):
+                await self.connection.execute("INSERT INTO item VALUES ('b')")
+
+        with self.assertRaises(RuntimeError):
+            async with transaction(self.connection):
+                await asyncio.wait_for(asyncio.create_task(insert()), 1.0)
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,52 @@
+import sys
+import os
+import unittest
+import asyncio
+from aiohttp import web
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.http import HttpClient
+
+
+class TestHttpClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.active = 0
+        self.peak = 0
+
+        async def handler(request):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            await asyncio.sleep(0.01)
+            self.active -= 1
+            return web.json_response({"path": request.path})
+
+        app = web.Application()
+        app.router.add_get("/{name}", handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        self.url = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        self.http = HttpClient(host_limits={"127.0.0.1": 2})
+
+    async def test_001_shared_session(self):
+        session = self.http.get_session()
+        self.assertEqual(await self.http.get_json(f"{self.url}/doggo"), {"path": "/doggo"})
+        self.assertIs(self.http.get_session(), session)
+
+    async def test_002_host_limit(self):
+        results = await asyncio.gather(
+            *(self.http.get_text(f"{self.url}/{i}") for i in range(6))
+        )
+        self.assertEqual(len(results), 6)
+        self.assertLessEqual(self.peak, 2)
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.runner.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,59 @@
+import sys
+import os
+import unittest
+import asyncio
+import time
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.ledger import Ledger
+from modules.migrations import Migrator
+
+
+class TestLedger(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, income INTEGER)"
+        )
+        await self.connection.execute(
+            "INSERT INTO users (username, income) VALUES ('doggo', 100)"
+        )
+        await self.connection.commit()
+        await Migrator(self.connection, "user").migrate()
+        self.ledger = Ledger(self.connection)
+
+    async def test_001_opening_balance(self):
+        self.assertEqual(await self.ledger.balance_as_of("doggo", time.time()), 100)
+        self.assertEqual(await self.ledger.balance_as_of("doggo", 0), 0)
+
+    async def test_002_snapshot_and_tail(self):
+        await self.ledger.record("doggo", -30, "slots", "slots")
+        first = await self.ledger.snapshot()
+        await asyncio.sleep(0.01)
+        middle = time.time()
+        await asyncio.sleep(0.01)
+
+        await self.ledger.record("doggo", 50, "income")
+        second = await self.ledger.snapshot()
+        self.assertIsNone(await self.ledger.snapshot())
+        await self.ledger.record("doggo", 5, "award")
+
+        self.assertGreater(second, first)
+        self.assertEqual(await self.ledger.balance_as_of("doggo", middle), 70)
+        self.assertEqual(await self.ledger.balance_as_of("doggo", time.time()), 125)
+
+        async with self.connection.execute(
+            "SELECT balance FROM balance_snapshot_entry WHERE snapshot_id = ?", (second,)
+        ) as cursor:
+            self.assertEqual((await cursor.fetchone())[0], 120)
+
+    async def asyncTearDown(self):
+        await self.ledger.close()
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,64 @@
+import sys
+import os
+import unittest
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+import numpy as np
+
+from modules.loudness import LoudnessIndex, measure
+
+
+def sine(amplitude, seconds=2.0, channels=(0, 1)):
+    wave = np.sin(2 * np.pi * 997 * np.arange(int(48000 * seconds)) / 48000) * amplitude
+    samples = np.zeros((len(wave), 2), dtype=np.int16)
+    for channel in channels:
+        samples[:, channel] = (wave * 32767).astype(np.int16)
+    return samples
+
+
+class TestLoudness(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = LoudnessIndex(self.directory.name, ffmpeg="/nonexistent/ffmpeg")
+
+    async def test_001_measure(self):
+        # Reference of BS.1770: a full scale 997 Hz sine on one channel
+        result = measure(sine(1.0, channels=(0,)))
+        self.assertAlmostEqual(result["loudness"], -3.01, places=1)
+        self.assertAlmostEqual(result["gain"], -13.0, places=1)
+
+        # A quiet sound is raised up to the peak ceiling
+        result = measure(sine(0.1))
+        self.assertAlmostEqual(result["loudness"], -20.0, places=1)
+        self.assertAlmostEqual(result["gain"], 4.0, places=1)
+
+        self.assertEqual(measure(np.zeros((100, 2), dtype=np.int16))["gain"], 0.0)
+
+    async def test_002_saved_gain(self):
+        self.assertEqual(await self.index.gain("missing"), 1.0)
+
+        result = await self.index.analyze("abc", sine(0.1).tobytes())
+        self.assertTrue(os.path.exists(self.index.path("abc")))
+
+        index = LoudnessIndex(self.directory.name)
+        self.assertAlmostEqual(await index.gain("abc"), 10 ** (result["gain"] / 20))
+
+    async def test_003_reanalyze_needs_ffmpeg(self):
+        index = LoudnessIndex(self.directory.name)
+        index.ffmpeg = None
+        with self.assertRaises(RuntimeError):
+            await index.reanalyze()
+
+        with open(os.path.join(self.directory.name, "abc"), "wb") as file:
+            file.write(b"not a sound")
+        self.assertEqual(await self.index.reanalyze(workers=1), 0)
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.members import ChannelMembers
+
+
+class TestChannelMembers(unittest.TestCase):
+    def test_001_membership(self):
+        members = ChannelMembers(["Doggo", "fumi"])
+
+        self.assertIn("doggo", members)
+        self.assertTrue(members.add("lurker"))
+        self.assertFalse(members.add("Lurker"))
+        self.assertTrue(members.discard("fumi"))
+        self.assertNotIn("fumi", members)
+        self.assertEqual(len(members), 2)
+
+    def test_002_diff_and_replace(self):
+        members = ChannelMembers(["doggo", "fumi"])
+
+        self.assertEqual(members.diff(["fumi", "ghost"]), ({"doggo"}, {"ghost"}))
+        self.assertEqual(members.replace(["fumi", "lurker"]), ({"lurker"}, {"doggo"}))
+        self.assertEqual(sorted(members), ["fumi", "lurker"])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
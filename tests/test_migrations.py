@@ -0,0 +1,70 @@
+import sys
+import os
+import unittest
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.migrations import MIGRATIONS, Migrator
+
+
+class TestMigrator(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT, income INTEGER)"
+        )
+        await self.connection.executemany(
+            "INSERT INTO users (username, income) VALUES (?, ?)",
+            [("doggo", 10), ("doggo", 20), ("fumi", 30)],
+        )
+        await self.connection.commit()
+
+    async def test_001_upgrade_in_place(self):
+        migrator = Migrator(self.connection, "user")
+        self.assertEqual(await migrator.get_version(), 0)
+
+        version = await migrator.migrate()
+        self.assertEqual(version, MIGRATIONS["user"][-1][0])
+        self.assertEqual(await migrator.get_version(), version)
+
+        async with self.connection.execute(
+            "SELECT username, income FROM users ORDER BY id"
+        ) as cursor:
+            # The coins of the duplicate are kept
+            self.assertEqual(await cursor.fetchall(), [("doggo", 30), ("fumi", 30)])
+
+        with self.assertRaises(Exception):
+            await self.connection.execute(
+                "INSERT INTO users (username, income) VALUES ('doggo', 0)"
+            )
+
+    async def test_002_migrate_twice(self):
+        first = await Migrator(self.connection, "user").migrate()
+        second = await Migrator(self.connection, "user").migrate()
+        self.assertEqual(first, second)
+
+    async def test_003_command_uses_kept(self):
+        await self.connection.execute(
+            "CREATE TABLE cmd (id INTEGER PRIMARY KEY, name TEXT, description TEXT, used INTEGER)"
+        )
+        await self.connection.executemany(
+            "INSERT INTO cmd (name, description, used) VALUES (?, ?, ?)",
+            [("hug", "first", 3), ("hug", "second", 4), ("pat", "only", 1)],
+        )
+        await self.connection.commit()
+
+        await Migrator(self.connection, "cmd").migrate()
+
+        async with self.connection.execute(
+            "SELECT name, description, used FROM cmd ORDER BY id"
+        ) as cursor:
+            self.assertEqual(await cursor.fetchall(), [("hug", "first", 7), ("pat", "only", 1)])
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
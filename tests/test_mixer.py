@@ -0,0 +1,77 @@
+import sys
+import os
+import unittest
+import asyncio
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+import numpy as np
+
+from modules.mixer import Mixer, Voice
+
+
+class Stream:
+    def __init__(self):
+        self.blocks = []
+        self.closed = False
+
+    def write(self, data):
+        self.blocks.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def pcm(value, frames):
+    return np.full((frames, 2), value, dtype=np.int16).tobytes()
+
+
+class TestMixer(unittest.IsolatedAsyncioTestCase):
+    async def test_001_sum_and_volume(self):
+        mixer = Mixer(Stream, block=4)
+        first = Voice(mixer)
+        second = Voice(mixer)
+        first.samples = np.frombuffer(pcm(1000, 6), dtype=np.int16).reshape(-1, 2)
+        second.samples = np.frombuffer(pcm(1000, 2), dtype=np.int16).reshape(-1, 2)
+        second.gain = 0.5
+        mixer.voices = [first, second]
+
+        block = np.frombuffer(mixer.mix(), dtype=np.int16).reshape(-1, 2)
+        self.assertEqual(block[:, 0].tolist(), [1500, 1500, 1000, 1000])
+        self.assertEqual(mixer.voices, [first])
+
+        block = np.frombuffer(mixer.mix(), dtype=np.int16).reshape(-1, 2)
+        self.assertEqual(block[:, 0].tolist(), [1000, 1000, 0, 0])
+        self.assertIsNone(mixer.mix())
+
+    async def test_002_limiter(self):
+        mixer = Mixer(Stream, block=4)
+        for _ in range(3):
+            voice = Voice(mixer)
+            voice.samples = np.frombuffer(pcm(20000, 8), dtype=np.int16).reshape(-1, 2)
+            mixer.voices.append(voice)
+
+        block = np.frombuffer(mixer.mix(), dtype=np.int16)
+        self.assertLessEqual(int(block.max()), 32767)
+        self.assertGreater(int(block.max()), 30000)
+        self.assertEqual(mixer.limited, 1)
+        self.assertLess(mixer.limiter_gain, 1.0)
+
+    async def test_003_play_and_stop(self):
+        stream = Stream()
+        done = threading.Event()
+        mixer = Mixer(lambda: stream, block=4)
+        voice = Voice(mixer, done.set)
+
+        voice.play(pcm(100, 1000), 100)
+        voice.stop()
+        self.assertTrue(await asyncio.to_thread(done.wait, 1.0))
+
+        mixer.close()
+        self.assertTrue(stream.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
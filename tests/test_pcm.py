@@ -0,0 +1,61 @@
+import sys
+import os
+import unittest
+import asyncio
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.pcm import PCMCache
+
+
+class TestPCMCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = PCMCache(self.directory.name, budget=2048, ffmpeg="/nonexistent/ffmpeg")
+
+        # Decoded files left by a previous run
+        for key, size in (("a", 1024), ("b", 1024), ("c", 1024)):
+            with open(self.cache.path(key), "wb") as file:
+                file.write(key.encode() * size)
+
+    async def test_001_mapped_and_evicted(self):
+        first, second = await asyncio.gather(self.cache.get("a", "a.mp3"), self.cache.get("a", "a.mp3"))
+        self.assertIs(first, second)
+
+        await self.cache.get("b", "b.mp3")
+        await self.cache.get("a", "a.mp3")
+        await self.cache.get("c", "c.mp3")
+
+        self.assertEqual(list(self.cache.entries), ["a", "c"])
+        self.assertEqual(self.cache.size, 2048)
+
+        # The evicted mapping is still readable by its players
+        self.assertEqual(second[:4], b"aaaa")
+
+    async def test_002_decode_error(self):
+        with self.assertRaises(RuntimeError):
+            await self.cache.get("missing", "missing.mp3")
+
+    async def test_003_empty_file(self):
+        open(self.cache.path("empty"), "wb").close()
+
+        with self.assertRaises(RuntimeError):
+            await self.cache.get("empty", "empty.mp3")
+
+        self.assertNotIn("empty", self.cache.entries)
+
+        # A decoder producing no samples is a decode error too
+        self.cache.ffmpeg = "true"
+        with self.assertRaises(RuntimeError):
+            await self.cache.get("empty", "empty.mp3")
+        self.assertFalse(os.path.exists(f"{self.cache.path('empty')}.tmp"))
+
+    async def asyncTearDown(self):
+        self.cache.entries.clear()
+        self.directory.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
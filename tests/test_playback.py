@@ -0,0 +1,80 @@
+import sys
+import os
+import unittest
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.playback import PlaybackScheduler, Policy
+
+
+class Player:
+    def __init__(self, soundcard):
+        self.soundcard = soundcard
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class TestPlaybackScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_001_free_list_and_lanes(self):
+        playback = PlaybackScheduler(Player, size=2, policy=Policy.DROP)
+
+        first = await playback.acquire("speakers")
+        second = await playback.acquire("speakers")
+        self.assertIsNone(await playback.acquire("speakers"))
+        self.assertIsNotNone(await playback.acquire("headset"))
+
+        playback.release("speakers", first)
+        self.assertIs(await playback.acquire("speakers"), first)
+        self.assertEqual(playback.lanes["speakers"].created, 2)
+        self.assertEqual(playback.dropped, 1)
+        self.assertIsNot(first, second)
+
+    async def test_002_queue_by_priority(self):
+        playback = PlaybackScheduler(Player, size=1, max_queue=2, max_wait=1.0)
+        player = await playback.acquire("speakers")
+
+        low = asyncio.create_task(playback.acquire("speakers", priority=5))
+        high = asyncio.create_task(playback.acquire("speakers", priority=1))
+        await asyncio.sleep(0)
+        self.assertIsNone(await playback.acquire("speakers"))
+
+        playback.release("speakers", player)
+        self.assertIs(await high, player)
+        self.assertFalse(low.done())
+
+        playback.release("speakers", player)
+        self.assertIs(await low, player)
+        self.assertGreater(playback.metrics()["wait_max"], 0)
+
+    async def test_003_wait_timeout(self):
+        playback = PlaybackScheduler(Player, size=1, max_wait=0.01)
+        player = await playback.acquire("speakers")
+
+        self.assertIsNone(await playback.acquire("speakers"))
+        self.assertEqual(playback.lanes["speakers"].waiters, [])
+
+        playback.release("speakers", player)
+        self.assertEqual(list(playback.lanes["speakers"].free), [player])
+
+    async def test_004_replace(self):
+        playback = PlaybackScheduler(Player, size=1, policy=Policy.REPLACE)
+        player = await playback.acquire("speakers", priority=1)
+
+        replacing = asyncio.create_task(playback.acquire("speakers", priority=1))
+        await asyncio.sleep(0)
+        self.assertTrue(player.stopped)
+
+        # Nothing left to replace until the stopped play ends
+        self.assertIsNone(await playback.acquire("speakers", priority=1))
+
+        playback.release("speakers", player)
+        self.assertIs(await replacing, player)
+        self.assertEqual(playback.replaced, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import sys
+import os
+import unittest
+import asyncio
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.migrations import Migrator
+from modules.user import UserCog, UserStore
+
+
+class TestUserStore(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        await self.connection.execute(
+            """
+            CREATE TABLE users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE, income INTEGER, message_count INTEGER,
+                bot BOOLEAN, follower BOOLEAN, subscriber BOOLEAN, mod BOOLEAN,
+                gamble_lock TEXT, roll_lock TEXT, rpg_lock TEXT, sfx_lock TEXT,
+                slots_lock TEXT, ban_time TEXT, warning INTEGER
+            )
+            """
+        )
+        await self.connection.executemany(
+            "INSERT INTO users (username, income, message_count, bot, follower, subscriber, mod, warning) VALUES (?, 100, 0, 0, 1, 0, 0, 0)",
+            [("doggo",), ("fumi",), ("lurker",)],
+        )
+        await self.connection.commit()
+        await Migrator(self.connection, "user").migrate()
+        self.store = UserStore(self.connection)
+
+    async def get_incomes(self):
+        async with self.connection.execute("SELECT username, income FROM users ORDER BY username") as cursor:
+            return dict(await cursor.fetchall())
+
+    async def test_001_write_back(self):
+        await self.store.update("doggo", message_count=5)
+        self.assertEqual(await self.store.flush(), 1)
+
+        async with self.connection.execute("SELECT message_count FROM users WHERE username = 'doggo'") as cursor:
+            self.assertEqual((await cursor.fetchone())[0], 5)
+
+    async def test_002_increment_keeps_pending_changes(self):
+        await self.store.update("doggo", income=150)
+
+        updated = await self.store.increment(["doggo", "fumi", "fumi", "ghost"], "income", 10)
+
+        self.assertEqual(sorted(updated), ["doggo", "fumi"])
+        self.assertEqual((await self.store.get("doggo")).income, 160)
+        self.assertEqual(await self.get_incomes(), {"doggo": 160, "fumi": 110, "lurker": 100})
+
+    async def test_003_adjust_balance(self):
+        cog = UserCog(None, self.connection)
+        cog.store = self.store
+        await self.store.get("doggo")
+
+        balances = await asyncio.gather(
+            *(cog.adjust_balance("doggo", -30, required=30) for _ in range(4))
+        )
+
+        self.assertEqual(sorted(balances, key=str), [10, 40, 70, None])
+        self.assertEqual((await self.store.get("doggo")).income, 10)
+        self.assertEqual(await cog.adjust_balance("doggo", -50, floor=True), 0)
+        self.assertIsNone(await cog.adjust_balance("ghost", 10))
+
+        # Written in the same transaction, without waiting for a flush
+        async with self.connection.execute(
+            "SELECT delta FROM ledger WHERE username = 'doggo' AND reason != 'opening' ORDER BY id"
+        ) as cursor:
+            self.assertEqual([row[0] for row in await cursor.fetchall()], [-30, -30, -30, -10])
+
+    async def test_004_pay_income(self):
+        cog = UserCog(None, self.connection)
+        cog.store = self.store
+
+        self.assertEqual(await cog.pay_income(["doggo", "fumi", "ghost"], 25), 2)
+
+        async with self.connection.execute(
+            "SELECT username, delta FROM ledger WHERE reason = 'income' ORDER BY username"
+        ) as cursor:
+            self.assertEqual(await cursor.fetchall(), [("doggo", 25), ("fumi", 25)])
+
+    async def asyncTearDown(self):
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,82 @@
+import sys
+import os
+import unittest
+import aiosqlite
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.migrations import Migrator
+from modules.user import UserCog
+
+
+class TestFollowerSync(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.connection = await aiosqlite.connect(":memory:")
+        self.cog = UserCog(None, self.connection)
+        await self.cog.create_table()
+        await Migrator(self.connection, "user").migrate()
+        self.sync = self.cog.sync
+
+    async def get_flags(self):
+        async with self.connection.execute(
+            "SELECT username, income, follower, bot, mod FROM users ORDER BY username"
+        ) as cursor:
+            return await cursor.fetchall()
+
+    async def test_001_full_sync(self):
+        result = await self.sync.sync(["doggo", "fumi", "nightbot"], ["nightbot"], [], 100)
+        self.assertEqual(result, {"added": 3, "updated": 0, "skipped": False})
+
+        await self.cog.adjust_balance("doggo", 50)
+        result = await self.sync.sync(["doggo", "lurker"], ["nightbot"], ["doggo"], 100)
+        self.assertEqual(result, {"added": 1, "updated": 3, "skipped": False})
+
+        self.assertEqual(
+            await self.get_flags(),
+            [
+                ("doggo", 150, 1, 0, 1),
+                ("fumi", 100, 0, 0, 0),
+                ("lurker", 100, 1, 0, 0),
+                ("nightbot", 100, 0, 1, 0),
+            ],
+        )
+
+        result = await self.sync.sync(["lurker", "doggo"], ["nightbot"], ["doggo"], 100)
+        self.assertTrue(result["skipped"])
+
+    async def test_002_apply(self):
+        await self.sync.sync(["doggo"], [], [], 100)
+        await self.cog.store.get("doggo")
+
+        self.assertEqual(await self.sync.apply(["fumi"], ["doggo", "ghost"], 100), 2)
+        self.assertFalse((await self.cog.store.get("doggo")).follower)
+        self.assertEqual(
+            [row[0] for row in await self.get_flags() if row[2]], ["fumi"]
+        )
+        self.assertIsNone(await self.sync.get_state("followers_digest"))
+
+    async def test_003_ledger_follows_balances(self):
+        await self.sync.sync(["doggo", "fumi"], [], [], 100)
+        await self.sync.apply(["lurker"], [], 100)
+
+        user = await self.cog.store.get("doggo")
+        await self.cog.adjust_balance("doggo", 20)
+        user.income = 150
+        await self.cog.update_user(user)
+
+        async with self.connection.execute(
+            "SELECT users.username, income, SUM(delta) FROM users JOIN ledger USING (username) GROUP BY users.username ORDER BY users.username"
+        ) as cursor:
+            self.assertEqual(
+                await cursor.fetchall(),
+                [("doggo", 150, 150), ("fumi", 100, 100), ("lurker", 100, 100)],
+            )
+
+    async def asyncTearDown(self):
+        await self.cog.ledger.close()
+        await self.connection.close()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,60 @@
+import sys
+import os
+import unittest
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+from modules.template import FetchError, Literal, Random, Template, TemplateError, Url
+
+
+class TestTemplate(unittest.IsolatedAsyncioTestCase):
+    def test_001_compile(self):
+        template = Template.compile("Roll: $random(1, 6) from $url(https://a.test/x?(y)), $foo")
+        self.assertEqual(
+            template.segments,
+            [
+                Literal("Roll: "),
+                Random(1, 6),
+                Literal(" from "),
+                Url("https://a.test/x?(y)"),
+                Literal(", $foo"),
+            ],
+        )
+        self.assertTrue(Template.compile("plain text").is_static)
+
+    def test_002_errors(self):
+        for source in ("$random(6, 1)", "$random(1)", "$random(a, b)", "$url(https://a", "$url(ftp://a)"):
+            with self.assertRaises(TemplateError):
+                Template.compile(source)
+
+    async def test_003_render_concurrently(self):
+        active = peak = 0
+
+        async def fetch(url):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return f"<{url[-1]}>\n"
+
+        template = Template.compile("$url(https://a.test/1) and $url(https://a.test/2) $random(3, 3)")
+        self.assertEqual(await template.render(fetch), "<1> and <2> 3")
+        self.assertEqual(peak, 2)
+
+    async def test_004_fetch_error(self):
+        async def fetch(url):
+            raise asyncio.TimeoutError()
+
+        template = Template.compile("Quote: $url(https://a.test/1)")
+        with self.assertRaises(TemplateError) as context:
+            await template.render(fetch)
+
+        self.assertIsInstance(context.exception, FetchError)
+        self.assertEqual(context.exception.position, 12)
+
+
+if __name__ == '__main__':
+    unittest.main()